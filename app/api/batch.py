@@ -0,0 +1,34 @@
+"""Helpers for the `:batch` bulk endpoints.
+
+A batch is validated as a whole before anything is written: every item is
+checked, failures are collected with their index, and if any item fails the
+whole batch is rejected. Otherwise all items are written in one transaction.
+"""
+from typing import Any, Callable, Dict, Iterable, List, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+# Upper bound on items per batch request
+MAX_BATCH_SIZE = 10000
+
+
+def check_batch_size(items: List[Any]) -> None:
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(items)} items (max {MAX_BATCH_SIZE})")
+
+
+def validate_batch(items: Iterable[T], check: Callable[[T], None]) -> None:
+    """Run check on every item; if any raise HTTPException, reject the batch with all errors"""
+    errors: List[Dict[str, Any]] = []
+    for index, item in enumerate(items):
+        try:
+            check(item)
+        except HTTPException as e:
+            errors.append({"index": index, "status_code": e.status_code, "detail": e.detail})
+    if errors:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Batch rejected; no items were written", "errors": errors},
+        )
@@ -0,0 +1,241 @@
+"""Content-negotiated compression of table responses, with a cache of compressed bodies.
+
+Table rows are repetitive JSON that compresses 10x or more. Table endpoints
+pick an encoding from Accept-Encoding (zstd, then br, then gzip, as far as
+the client accepts them and the codec is installed) and compress their
+stream as it is produced. The first min_size bytes are buffered to decide:
+a shorter body is sent uncompressed, since compressing it saves less than
+it costs, and as it does not depend on Accept-Encoding then, without
+Accept-Encoding in Vary. Headers naming the representation, like a table's
+ETag, are computed from the encoding actually applied.
+
+A full table read is cached once compressed, keyed by table id, version
+(updated_at), representation and encoding, so a popular table is read and
+compressed once per version rather than on every request. Caching a table's
+new version drops its older ones, and the least recently used bodies are
+evicted beyond max_bytes. Bodies larger than a quarter of the cache stay
+uncached.
+
+gzip is always available; zstd needs the zstandard package and br the
+brotli package, both in the "compression" extra.
+"""
+import zlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from ..core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+BROTLI = "br"
+
+# Compressor objects with compress(data) -> bytes and flush() -> bytes, by encoding
+_COMPRESSORS: Dict[str, Callable[[], Any]] = {
+    GZIP: lambda: zlib.compressobj(6, zlib.DEFLATED, 31),  # wbits 31: gzip container
+}
+if zstandard is not None:
+    _COMPRESSORS[ZSTD] = lambda: zstandard.ZstdCompressor(level=3).compressobj()
+if brotli is not None:
+    class _BrotliCompressor:
+        def __init__(self):
+            self._compressor = brotli.Compressor(quality=5)
+
+        def compress(self, data: bytes) -> bytes:
+            return self._compressor.process(data)
+
+        def flush(self) -> bytes:
+            return self._compressor.finish()
+
+    _COMPRESSORS[BROTLI] = _BrotliCompressor
+
+# Preferred first when the client accepts several equally
+PREFERENCE = (ZSTD, BROTLI, GZIP)
+
+# (table_id, version, representation, encoding)
+BodyKey = Tuple[int, str, str, str]
+
+
+def available_encodings() -> List[str]:
+    return [encoding for encoding in PREFERENCE if encoding in _COMPRESSORS]
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """The encoding to use for a request's Accept-Encoding, or None for identity"""
+    if not accept_encoding:
+        return None
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(encoding, wildcard), -rank, encoding)
+        for rank, encoding in enumerate(available_encodings())
+    ]
+    quality, _, encoding = max(candidates, default=(0.0, 0, None))
+    return encoding if quality > 0 else None
+
+
+def request_encoding(request: Request) -> Optional[str]:
+    return negotiate(request.headers.get("accept-encoding"))
+
+
+class CompressedBodyCache:
+    """LRU of compressed response bodies bounded by total size, with hit and miss counters"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[BodyKey, bytes]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: BodyKey) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: BodyKey, body: bytes) -> None:
+        if len(body) > self.max_bytes // 4:
+            return
+        table_id, version = key[0], key[1]
+        with self._lock:
+            # Older versions of the table are never read again
+            for stale in [k for k in self._entries if k[0] == table_id and k[1] != version]:
+                self.size -= len(self._entries.pop(stale))
+            self.size -= len(self._entries.pop(key, b""))
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "encodings": available_encodings(),
+            }
+
+
+compressed_bodies = CompressedBodyCache(settings.table_compression_cache_mb * 1024 * 1024)
+
+
+async def _compress(head: List[bytes], rest: AsyncIterator[bytes], encoding: str, key: Optional[BodyKey]) -> AsyncIterator[bytes]:
+    compressor = _COMPRESSORS[encoding]()
+    chunks: List[bytes] = []
+
+    def emit(data: bytes) -> bytes:
+        if key is not None:
+            chunks.append(data)
+        return data
+
+    for part in head:
+        data = compressor.compress(part)
+        if data:
+            yield emit(data)
+    async for part in rest:
+        data = compressor.compress(part)
+        if data:
+            yield emit(data)
+    yield emit(compressor.flush())
+    # Only reached when the whole body was sent
+    if key is not None:
+        compressed_bodies.put(key, b"".join(chunks))
+
+
+async def _chain(head: List[bytes], rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    for part in head:
+        yield part
+    async for part in rest:
+        yield part
+
+
+async def compressed_response(
+    parts: AsyncIterator[bytes],
+    encoding: Optional[str],
+    *,
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+    key: Optional[BodyKey] = None,
+    min_size: Optional[int] = None,
+    encoded_headers: Optional[Callable[[Optional[str]], Dict[str, str]]] = None,
+) -> Response:
+    """Stream parts, compressed with encoding if the body reaches min_size bytes.
+
+    With a key, a cached body is served without consuming parts, and a body
+    compressed in full is cached for the next request. encoded_headers
+    returns the headers that depend on the encoding applied (None for
+    identity).
+    """
+    def response_headers(applied: Optional[str], varies: bool = True) -> Dict[str, str]:
+        result = dict(headers or {})
+        if varies:
+            result["Vary"] = ", ".join(filter(None, [result.get("Vary"), "Accept-Encoding"]))
+        if encoded_headers is not None:
+            result.update(encoded_headers(applied))
+        if applied is not None:
+            result["Content-Encoding"] = applied
+        return result
+
+    if encoding is None:
+        return StreamingResponse(parts, media_type=media_type, headers=response_headers(None))
+    if key is not None:
+        body = compressed_bodies.get(key)
+        if body is not None:
+            await parts.aclose()
+            return Response(body, media_type=media_type, headers=response_headers(encoding))
+
+    threshold = settings.table_compression_min_bytes if min_size is None else min_size
+    head: List[bytes] = []
+    size = 0
+    async for part in parts:
+        head.append(part)
+        size += len(part)
+        if size >= threshold:
+            break
+    else:
+        # Too small to be worth compressing, whatever the client accepts
+        return Response(b"".join(head), media_type=media_type, headers=response_headers(None, varies=False))
+    return StreamingResponse(_compress(head, parts, encoding, key), media_type=media_type, headers=response_headers(encoding))
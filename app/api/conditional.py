@@ -0,0 +1,86 @@
+"""Conditional GET for single resources, based on their updated_at.
+
+Every write bumps a resource's updated_at, so (table, id, updated_at) names a
+version of it. Reads send a strong ETag derived from that version, plus
+Last-Modified and `Cache-Control: no-cache` so clients revalidate on every
+poll. A request with If-None-Match (or, without it, If-Modified-Since) is
+answered by selecting only the updated_at column; when the client's copy is
+current it gets a 304 without the resource or its rows being loaded or
+serialized.
+
+Endpoints with several representations of a resource (JSON and NDJSON)
+pass a variant, so each representation has its own ETag, and may accept
+the tags of other variants the client could hold for the same request.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Sequence, Type
+
+from fastapi import Request, Response
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+def etag(kind: str, id: int, updated_at: datetime, variant: str = "") -> str:
+    digest = hashlib.sha1(f"{updated_at.isoformat()}:{variant}".encode()).hexdigest()[:16]
+    return f'"{kind}-{id}-{digest}"'
+
+
+def version_headers(kind: str, id: int, updated_at: datetime, variant: str = "") -> Dict[str, str]:
+    return {
+        "ETag": etag(kind, id, updated_at, variant),
+        "Last-Modified": format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+
+def _etag_matches(if_none_match: str, current: str) -> bool:
+    # If-None-Match uses weak comparison
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or current in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def is_not_modified(request: Request, kind: str, id: int, updated_at: datetime, variant: str = "") -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag(kind, id, updated_at, variant))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return updated_at.replace(microsecond=0, tzinfo=timezone.utc) <= since
+
+
+async def not_modified(
+    request: Request,
+    session: AsyncSession,
+    model: Type[SQLModel],
+    id: int,
+    variant: str = "",
+    alternatives: Sequence[str] = (),
+) -> Optional[Response]:
+    """A 304 response if the request is conditional and the client has the current version, else None.
+
+    The client's copy may be of variant or of any of the alternatives.
+    """
+    if "if-none-match" not in request.headers and "if-modified-since" not in request.headers:
+        return None
+    updated_at = (await session.exec(select(model.updated_at).where(model.id == id))).first()
+    if updated_at is None:
+        return None  # Let the endpoint report the missing resource
+    kind = model.__tablename__
+    for candidate in (variant, *alternatives):
+        if is_not_modified(request, kind, id, updated_at, candidate):
+            return Response(status_code=304, headers=version_headers(kind, id, updated_at, candidate))
+    return None
+
+
+def set_version_headers(response: Response, resource: SQLModel, variant: str = "") -> None:
+    response.headers.update(version_headers(type(resource).__tablename__, resource.id, resource.updated_at, variant))
@@ -0,0 +1,52 @@
+"""Keyset (cursor) pagination shared by the list endpoints.
+
+Pages are ordered by primary key. The `next_cursor` for a full page is an
+opaque token encoding the last id returned; passing it back as `cursor`
+fetches the rows after it with an indexed `id > last_id` seek, so deep pages
+cost the same as the first and concurrent inserts cannot shift them.
+`skip` remains as an offset-based fallback when no cursor is given.
+"""
+import base64
+import binascii
+import json
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return last_id
+
+
+def paginate(query, id_column, *, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Apply keyset pagination when a cursor is given, offset pagination otherwise"""
+    query = query.order_by(id_column)
+    if cursor:
+        return query.where(id_column > decode_cursor(cursor)).limit(limit)
+    return query.offset(skip).limit(limit)
+
+
+def next_cursor(items: List[Any], limit: int) -> Optional[str]:
+    """Cursor for the page after `items`, or None when this was the last page"""
+    if not items or len(items) < limit:
+        return None
+    return encode_cursor(items[-1].id)
+
+
+def set_next_cursor(response: Response, items: List[Any], limit: int) -> None:
+    cursor = next_cursor(items, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,75 @@
+"""Fast JSON encoding of responses built from database rows.
+
+A FastAPI endpoint returning a model validates it against its response_model,
+converts it with jsonable_encoder and then encodes it with the json module,
+walking every value three times. For rows read from the database the
+validation is redundant, and for tables the walk over their data dominates
+the request's CPU time. Endpoints returning rows therefore return
+json_response(), which encodes the rows directly with orjson (datetimes
+natively, SQLModel rows through their fields) and skips response_model
+processing; response_model is still declared for the OpenAPI schema.
+FastJSONResponse is also the application's default response class.
+
+orjson is a dependency, but without it dumps() falls back to the json module.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the json module
+    orjson = None
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        # Shallow: nested rows and lists are encoded as they are, without copies
+        return {name: getattr(value, name) for name in value.__fields__}
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits, which the json module encodes
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def dumps_html_safe(value: Any) -> str:
+    """JSON for embedding in a <script> element of a template, like Jinja's tojson filter"""
+    return (
+        dumps(value).decode()
+        .replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
+        .replace("'", "\\u0027")
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> FastJSONResponse:
+    """Encode content directly, keeping the headers set on the endpoint's injected response"""
+    headers: Dict[str, str] = {}
+    if response is not None:
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
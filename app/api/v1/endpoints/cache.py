@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from typing import Any, Dict
+
+from ....crud.metadata_cache import metadata_cache
+from ....execution.cache import result_cache
+from ...compression import compressed_bodies
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+@router.get("/", response_model=Dict[str, Any])
+async def read_cache_stats():
+    """Size, hit ratio and eviction counters of the in-process caches"""
+    return {
+        "metadata": metadata_cache.stats(),
+        "results": result_cache.stats(),
+        "compressed_tables": compressed_bodies.stats(),
+    }
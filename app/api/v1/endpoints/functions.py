@@ -1,103 +1,143 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Dict, Any, Optional, Set
+from datetime import datetime
 from ....models.function_def import FunctionDef
 from ....models.object_schema import ObjectSchema
-from ....core.database import get_session
+from ....models.test_case import TestCase
+from ....models.submission import Submission
+from ....core.database import get_async_session
+from ....execution.runner import run_matrix
+from ....execution.revalidate import revalidate
+from ....crud import dependencies
+from ....crud.metadata_cache import metadata_cache
+from ...pagination import paginate, set_next_cursor
+from ...responses import json_response
+from ...conditional import not_modified, set_version_headers
+from ...batch import check_batch_size, validate_batch
 
 router = APIRouter(prefix="/functions", tags=["functions"])
 
-@router.post("/", response_model=FunctionDef)
-def create_function(*, session: Session = Depends(get_session), function: FunctionDef):
-    # Verify that all referenced object schemas exist
+def referenced_schema_ids(functions: List[FunctionDef]) -> Set[int]:
+    return {
+        obj_id
+        for function in functions
+        for obj_id in [*function.input_schemas.values(), *function.output_schemas.values()]
+    }
+
+def check_schema_refs(function: FunctionDef, known_schema_ids: Set[int]):
+    """Raise a 404 if the function references an object schema that does not exist"""
     for input_obj_id in function.input_schemas.values():
-        if not session.get(ObjectSchema, input_obj_id):
+        if input_obj_id not in known_schema_ids:
             raise HTTPException(
                 status_code=404,
                 detail=f"Input object schema with id {input_obj_id} not found"
             )
     
     for output_obj_id in function.output_schemas.values():
-        if not session.get(ObjectSchema, output_obj_id):
+        if output_obj_id not in known_schema_ids:
             raise HTTPException(
                 status_code=404,
                 detail=f"Output object schema with id {output_obj_id} not found"
             )
-    
+
+@router.post("/", response_model=FunctionDef)
+async def create_function(*, session: AsyncSession = Depends(get_async_session), function: FunctionDef):
+    # Verify that all referenced object schemas exist
+    known_schema_ids = set(await metadata_cache.get_many(session, ObjectSchema, referenced_schema_ids([function])))
+    check_schema_refs(function, known_schema_ids)
     
     session.add(function)
-    session.commit()
-    session.refresh(function)
-    return function
+    await session.commit()
+    await session.refresh(function)
+    return json_response(function)
+
+@router.post(":batch", response_model=List[FunctionDef])
+async def create_functions(*, session: AsyncSession = Depends(get_async_session), functions: List[FunctionDef]):
+    """Create many functions in a single transaction, rejecting the batch if any item is invalid"""
+    check_batch_size(functions)
+    known_schema_ids = set(await metadata_cache.get_many(session, ObjectSchema, referenced_schema_ids(functions)))
+    validate_batch(functions, lambda function: check_schema_refs(function, known_schema_ids))
+    
+    session.add_all(functions)
+    await session.commit()
+    return json_response(functions)
 
 @router.get("/", response_model=List[FunctionDef])
-def read_functions(
+async def read_functions(
     *,
-    session: Session = Depends(get_session),
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
 ):
-    query = select(FunctionDef)
-    functions = session.exec(query.offset(skip).limit(limit)).all()
-    return functions
+    query = paginate(select(FunctionDef), FunctionDef.id, skip=skip, limit=limit, cursor=cursor)
+    functions = (await session.exec(query)).all()
+    set_next_cursor(response, functions, limit)
+    return json_response(functions, response)
 
 @router.get("/{function_id}", response_model=FunctionDef)
-def read_function(*, session: Session = Depends(get_session), function_id: int):
-    function = session.get(FunctionDef, function_id)
+async def read_function(
+    *,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    function_id: int
+):
+    unchanged = await not_modified(request, session, FunctionDef, function_id)
+    if unchanged:
+        return unchanged
+    function = await session.get(FunctionDef, function_id)
     if not function:
         raise HTTPException(status_code=404, detail="Function not found")
-    return function
+    set_version_headers(response, function)
+    return json_response(function, response)
 
 @router.put("/{function_id}", response_model=FunctionDef)
-def update_function(
+async def update_function(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     function_id: int,
     function_update: FunctionDef
 ):
-    function = session.get(FunctionDef, function_id)
+    function = await session.get(FunctionDef, function_id)
     if not function:
         raise HTTPException(status_code=404, detail="Function not found")
     
     # Verify that all referenced object schemas exist
-    for input_obj_id in function_update.input_schemas.values():
-        if not session.get(ObjectSchema, input_obj_id):
-            raise HTTPException(
-                status_code=404,
-                detail=f"Input object schema with id {input_obj_id} not found"
-            )
-    
-    for output_obj_id in function_update.output_schemas.values():
-        if not session.get(ObjectSchema, output_obj_id):
-            raise HTTPException(
-                status_code=404,
-                detail=f"Output object schema with id {output_obj_id} not found"
-            )
+    known_schema_ids = set(await metadata_cache.get_many(session, ObjectSchema, referenced_schema_ids([function_update])))
+    check_schema_refs(function_update, known_schema_ids)
     
     # Update function attributes
     function_data = function_update.dict(exclude_unset=True)
     for key, value in function_data.items():
         setattr(function, key, value)
+    function.updated_at = datetime.utcnow()
     
     session.add(function)
-    session.commit()
-    session.refresh(function)
-    return function
+    # Its test cases now depend on the objects of the new schemas
+    await session.run_sync(dependencies.reindex_dependents, (), [function_id])
+    await session.commit()
+    await session.refresh(function)
+    await revalidate(session, functions=[function_id])
+    return json_response(function)
 
 @router.delete("/{function_id}")
-def delete_function(*, session: Session = Depends(get_session), function_id: int):
-    function = session.get(FunctionDef, function_id)
+async def delete_function(*, session: AsyncSession = Depends(get_async_session), function_id: int):
+    function = await session.get(FunctionDef, function_id)
     if not function:
         raise HTTPException(status_code=404, detail="Function not found")
     
-    session.delete(function)
-    session.commit()
+    await session.delete(function)
+    await session.commit()
     return {"ok": True}
 
 @router.post("/{function_id}/validate")
-def validate_function(*, session: Session = Depends(get_session), function_id: int):
+async def validate_function(*, session: AsyncSession = Depends(get_async_session), function_id: int):
     """Validate function implementation and schema compatibility"""
-    function = session.get(FunctionDef, function_id)
+    function = await session.get(FunctionDef, function_id)
     if not function:
         raise HTTPException(status_code=404, detail="Function not found")
     
@@ -117,3 +157,39 @@ def validate_function(*, session: Session = Depends(get_session), function_id: i
     if not function.output_schemas:
         raise HTTPException(status_code=400, detail="Function needs at least one output schema")
     
+
+@router.post("/{function_id}/run-all")
+async def run_all_test_cases(*, session: AsyncSession = Depends(get_async_session), function_id: int):
+    """Run every test case of a function against every submission, returning a pass/fail matrix"""
+    function = await session.get(FunctionDef, function_id)
+    if not function:
+        raise HTTPException(status_code=404, detail="Function not found")
+    
+    test_cases = (await session.exec(
+        select(TestCase).where(TestCase.function_id == function_id).order_by(TestCase.id)
+    )).all()
+    submissions = (await session.exec(
+        select(Submission).where(Submission.function_id == function_id).order_by(Submission.id)
+    )).all()
+    runs = await run_matrix(session, test_cases, submissions)
+    
+    # matrix[submission_id][test_case_id] describes one run
+    matrix: Dict[int, Dict[int, Dict[str, Any]]] = {submission.id: {} for submission in submissions}
+    summary: Dict[str, int] = {}
+    for run in runs:
+        matrix[run.submission_id][run.test_case_id] = {
+            "run_id": run.id,
+            "status": run.status,
+            "passed": run.passed,
+            "cached": run.cached,
+        }
+        summary[run.status] = summary.get(run.status, 0) + 1
+    
+    return {
+        "function_id": function_id,
+        "test_case_ids": [test_case.id for test_case in test_cases],
+        "submission_ids": [submission.id for submission in submissions],
+        "matrix": matrix,
+        "summary": summary,
+        "all_passed": bool(runs) and all(run.passed for run in runs)
+    }
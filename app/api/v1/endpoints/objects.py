@@ -1,51 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 from ....models.object_schema import ObjectSchema
-from ....core.database import get_session
+from ....core.database import get_async_session
+from ....execution.revalidate import revalidate
+from ...pagination import paginate, set_next_cursor
+from ...responses import json_response
+from ...conditional import not_modified, set_version_headers
+from ...batch import check_batch_size, validate_batch
 
 router = APIRouter(prefix="/objects", tags=["objects"])
 
+
+def check_comparison_settings(object: ObjectSchema):
+    """Raise if key columns or tolerances refer to unknown attributes, or a tolerance is not a non-negative number"""
+    unknown = [column for column in [*object.key_columns, *object.tolerances] if column not in object.attributes]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Key columns and tolerances reference unknown attributes: {unknown}")
+    for column, tolerance in object.tolerances.items():
+        if isinstance(tolerance, bool) or not isinstance(tolerance, (int, float)) or tolerance < 0:
+            raise HTTPException(status_code=400, detail=f"Tolerance for {column} must be a non-negative number")
+
 @router.post("/", response_model=ObjectSchema)
-def create_object(*, session: Session = Depends(get_session), object: ObjectSchema):
+async def create_object(*, session: AsyncSession = Depends(get_async_session), object: ObjectSchema):
+    check_comparison_settings(object)
     session.add(object)
-    session.commit()
-    session.refresh(object)
-    return object
+    await session.commit()
+    await session.refresh(object)
+    return json_response(object)
+
+@router.post(":batch", response_model=List[ObjectSchema])
+async def create_objects(*, session: AsyncSession = Depends(get_async_session), objects: List[ObjectSchema]):
+    """Create many objects in a single transaction"""
+    check_batch_size(objects)
+    validate_batch(objects, check_comparison_settings)
+    session.add_all(objects)
+    await session.commit()
+    return json_response(objects)
 
 @router.get("/", response_model=List[ObjectSchema])
-def read_objects(*, session: Session = Depends(get_session), skip: int = 0, limit: int = 100):
-    objects = session.exec(select(ObjectSchema).offset(skip).limit(limit)).all()
-    return objects
+async def read_objects(
+    *,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
+    query = paginate(select(ObjectSchema), ObjectSchema.id, skip=skip, limit=limit, cursor=cursor)
+    objects = (await session.exec(query)).all()
+    set_next_cursor(response, objects, limit)
+    return json_response(objects, response)
 
 @router.get("/{object_id}", response_model=ObjectSchema)
-def read_object(*, session: Session = Depends(get_session), object_id: int):
-    object = session.get(ObjectSchema, object_id)
+async def read_object(
+    *,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    object_id: int
+):
+    unchanged = await not_modified(request, session, ObjectSchema, object_id)
+    if unchanged:
+        return unchanged
+    object = await session.get(ObjectSchema, object_id)
     if not object:
         raise HTTPException(status_code=404, detail="Object not found")
-    return object
+    set_version_headers(response, object)
+    return json_response(object, response)
 
 @router.put("/{object_id}", response_model=ObjectSchema)
-def update_object(*, session: Session = Depends(get_session), object_id: int, object_update: ObjectSchema):
-    db_object = session.get(ObjectSchema, object_id)
+async def update_object(*, session: AsyncSession = Depends(get_async_session), object_id: int, object_update: ObjectSchema):
+    db_object = await session.get(ObjectSchema, object_id)
     if not db_object:
         raise HTTPException(status_code=404, detail="Object not found")
     
     # Update object attributes
     for field, value in object_update.dict(exclude_unset=True).items():
         setattr(db_object, field, value)
+    check_comparison_settings(db_object)
+    # Compiled row validators are cached by (id, updated_at)
+    db_object.updated_at = datetime.utcnow()
     
     session.add(db_object)
-    session.commit()
-    session.refresh(db_object)
-    return db_object
+    await session.commit()
+    await session.refresh(db_object)
+    await revalidate(session, objects=[object_id])
+    return json_response(db_object)
 
 @router.delete("/{object_id}")
-def delete_object(*, session: Session = Depends(get_session), object_id: int):
-    object = session.get(ObjectSchema, object_id)
+async def delete_object(*, session: AsyncSession = Depends(get_async_session), object_id: int):
+    object = await session.get(ObjectSchema, object_id)
     if not object:
         raise HTTPException(status_code=404, detail="Object not found")
     
-    session.delete(object)
-    session.commit()
+    await session.delete(object)
+    await session.commit()
     return {"ok": True}
@@ -0,0 +1,165 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, AsyncIterator, Dict, List, Optional
+from ....models.test_run import TestRun, RUN_FINISHED_STATUSES
+from ....models.submission import Submission
+from ....core.database import get_async_session
+from ....execution.events import EVENT_FINISHED, Event, Subscription, run_event, run_events
+from ....execution.queue import queue_stats
+from ...pagination import paginate, set_next_cursor
+from ...responses import dumps, json_response
+
+router = APIRouter(prefix="/runs", tags=["runs"])
+
+# Seconds between keep-alive comments on an idle event stream
+EVENTS_HEARTBEAT_SECONDS = 15.0
+# Seconds between reads of a followed run's status, which catch runs finished by another process
+RUN_POLL_SECONDS = 5.0
+
+
+def _sse(event: Event) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {dumps(event).decode()}\n\n"
+
+
+async def _stream_events(
+    subscription: Subscription, snapshot: Optional[Event], session: Optional[AsyncSession] = None
+) -> AsyncIterator[str]:
+    """Stream a subscription as Server-Sent Events; a stream following one run ends when it finishes.
+
+    Events only come from runs executed in this process, so a followed run's
+    status is also read from the database between events, with session.
+    """
+    async with subscription:
+        if snapshot is not None:
+            yield _sse(snapshot)
+            if snapshot["event"] == EVENT_FINISHED:
+                return
+        while True:
+            event = await subscription.get(RUN_POLL_SECONDS if snapshot is not None else EVENTS_HEARTBEAT_SECONDS)
+            if event is None:
+                if snapshot is not None:
+                    run = await session.get(TestRun, snapshot["run_id"], populate_existing=True)
+                    await session.close()
+                    if run is None:
+                        return  # Deleted
+                    if run.status in RUN_FINISHED_STATUSES:
+                        yield _sse(run_event(EVENT_FINISHED, run, id=0))
+                        return
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse(event)
+            if snapshot is not None and event["event"] == EVENT_FINISHED:
+                return
+
+@router.get("/", response_model=List[TestRun])
+async def read_runs(
+    *,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    test_case_id: Optional[int] = None,
+    submission_id: Optional[int] = None,
+    status: Optional[str] = None
+):
+    query = select(TestRun)
+    if test_case_id:
+        query = query.where(TestRun.test_case_id == test_case_id)
+    if submission_id:
+        query = query.where(TestRun.submission_id == submission_id)
+    if status:
+        query = query.where(TestRun.status == status)
+    query = paginate(query, TestRun.id, skip=skip, limit=limit, cursor=cursor)
+    runs = (await session.exec(query)).all()
+    set_next_cursor(response, runs, limit)
+    return json_response(runs, response)
+
+@router.get("/queue", response_model=Dict[str, Any])
+async def read_queue_stats(*, session: AsyncSession = Depends(get_async_session)):
+    """Execution queue depth and wait/run latency of recent runs"""
+    return await queue_stats(session)
+
+@router.get("/events")
+async def stream_run_events(
+    *,
+    session: AsyncSession = Depends(get_async_session),
+    run_id: Optional[int] = None,
+    test_case_id: Optional[int] = None,
+    submission_id: Optional[int] = None
+):
+    """Server-Sent Events for runs queued, started, progressing and finished, optionally filtered.
+
+    Following a single run_id starts with a "snapshot" of the run (or its
+    "finished" event if it is already done) and ends once it finishes, also
+    when a separate queue worker executes it.
+    """
+    subscription = run_events.subscribe(
+        run_ids=[run_id] if run_id is not None else [],
+        test_case_ids=[test_case_id] if test_case_id is not None else [],
+        submission_ids=[submission_id] if submission_id is not None else [],
+    )
+    snapshot = None
+    if run_id is not None:
+        # Subscribed first, so an outcome recorded after this read is still delivered
+        run = await session.get(TestRun, run_id)
+        if not run:
+            subscription.close()
+            raise HTTPException(status_code=404, detail="Run not found")
+        snapshot = run_event(EVENT_FINISHED if run.status in RUN_FINISHED_STATUSES else "snapshot", run, id=0)
+    # Release the connection; the stream may stay open for a long time
+    await session.close()
+    return StreamingResponse(
+        _stream_events(subscription, snapshot, session),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/events/stats", response_model=Dict[str, Any])
+async def read_run_event_stats():
+    """Event stream subscribers and events published and dropped"""
+    return run_events.stats()
+
+@router.get("/usage", response_model=List[Dict[str, Any]])
+async def read_run_usage(
+    *,
+    session: AsyncSession = Depends(get_async_session),
+    function_id: Optional[int] = None,
+    test_case_id: Optional[int] = None
+):
+    """Resource usage of executed (not cached) runs per submission, heaviest peak memory first"""
+    query = (
+        select(
+            TestRun.submission_id,
+            func.count(),
+            func.avg(TestRun.wall_time),
+            func.max(TestRun.wall_time),
+            func.avg(TestRun.cpu_time),
+            func.max(TestRun.cpu_time),
+            func.max(TestRun.peak_rss_mb),
+            func.avg(TestRun.rows_per_second),
+            func.min(TestRun.rows_per_second),
+        )
+        .where(TestRun.cached == False)  # noqa: E712
+        .where(TestRun.wall_time.is_not(None))
+        .group_by(TestRun.submission_id)
+        .order_by(func.max(TestRun.peak_rss_mb).desc(), TestRun.submission_id)
+    )
+    if function_id:
+        query = query.join(Submission, Submission.id == TestRun.submission_id).where(Submission.function_id == function_id)
+    if test_case_id:
+        query = query.where(TestRun.test_case_id == test_case_id)
+    fields = (
+        "submission_id", "runs", "avg_wall_time", "max_wall_time", "avg_cpu_time", "max_cpu_time",
+        "max_peak_rss_mb", "avg_rows_per_second", "min_rows_per_second",
+    )
+    return [dict(zip(fields, row)) for row in (await session.exec(query)).all()]
+
+@router.get("/{run_id}", response_model=TestRun)
+async def read_run(*, session: AsyncSession = Depends(get_async_session), run_id: int):
+    run = await session.get(TestRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return json_response(run)
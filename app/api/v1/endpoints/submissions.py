@@ -0,0 +1,91 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+
+from ....models.submission import Submission
+from ....models.function_def import FunctionDef
+from ....models.test_run import TestRun
+from ....core.database import get_async_session
+from ....crud.metadata_cache import metadata_cache
+from ...pagination import paginate, set_next_cursor
+from ...responses import json_response
+
+router = APIRouter(prefix="/submissions", tags=["submissions"])
+
+
+def check_code(code: str):
+    """Reject code that does not compile, so it fails here rather than in every run"""
+    try:
+        compile(code, "<submission>", "exec")
+    except SyntaxError as e:
+        raise HTTPException(status_code=400, detail=f"Submission code does not compile: {e}")
+
+@router.post("/", response_model=Submission)
+async def create_submission(*, session: AsyncSession = Depends(get_async_session), submission: Submission):
+    if not await metadata_cache.get(session, FunctionDef, submission.function_id):
+        raise HTTPException(status_code=404, detail="Function not found")
+    check_code(submission.code)
+
+    session.add(submission)
+    await session.commit()
+    await session.refresh(submission)
+    return json_response(submission)
+
+@router.get("/", response_model=List[Submission])
+async def read_submissions(
+    *,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    function_id: Optional[int] = None
+):
+    query = select(Submission)
+    if function_id:
+        query = query.where(Submission.function_id == function_id)
+    query = paginate(query, Submission.id, skip=skip, limit=limit, cursor=cursor)
+    submissions = (await session.exec(query)).all()
+    set_next_cursor(response, submissions, limit)
+    return json_response(submissions, response)
+
+@router.get("/{submission_id}", response_model=Submission)
+async def read_submission(*, session: AsyncSession = Depends(get_async_session), submission_id: int):
+    submission = await session.get(Submission, submission_id)
+    if not submission:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return json_response(submission)
+
+@router.put("/{submission_id}", response_model=Submission)
+async def update_submission(*, session: AsyncSession = Depends(get_async_session), submission_id: int, submission_update: Submission):
+    db_submission = await session.get(Submission, submission_id)
+    if not db_submission:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    if submission_update.function_id != db_submission.function_id and not await metadata_cache.get(
+        session, FunctionDef, submission_update.function_id
+    ):
+        raise HTTPException(status_code=404, detail="Function not found")
+    check_code(submission_update.code)
+
+    for field, value in submission_update.dict(exclude_unset=True).items():
+        setattr(db_submission, field, value)
+    db_submission.updated_at = datetime.utcnow()
+
+    session.add(db_submission)
+    await session.commit()
+    await session.refresh(db_submission)
+    return json_response(db_submission)
+
+@router.delete("/{submission_id}")
+async def delete_submission(*, session: AsyncSession = Depends(get_async_session), submission_id: int):
+    submission = await session.get(Submission, submission_id)
+    if not submission:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    # Its runs reference it
+    await session.exec(delete(TestRun).where(TestRun.submission_id == submission_id))
+    await session.delete(submission)
+    await session.commit()
+    return {"ok": True}
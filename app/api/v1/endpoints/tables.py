@@ -1,105 +1,498 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import List, Dict, Any, Optional
-from ....models.table_data import TableData
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Tuple
+from datetime import datetime
+from ....models.table_data import TableData, TableDataCreate, TableDataRead, TableDataSummary
 from ....models.object_schema import ObjectSchema
-from ....core.database import get_session
+from ....crud import table_rows, dependencies
+from ....crud.metadata_cache import metadata_cache
+from ....core.database import get_async_session
+from ....core.validators import get_validator
+from ....core.table_formats import (
+    CSV_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE, CSVImport, FormatError, SnapshotParser, SnapshotWriter, encode_csv,
+)
+from ....execution.revalidate import revalidate
+from ...pagination import paginate, next_cursor, NEXT_CURSOR_HEADER
+from ...conditional import not_modified, version_headers
+from ...batch import check_batch_size, validate_batch
+from ...responses import dumps, json_response
+from ...compression import compressed_response, request_encoding
 import json
 
 router = APIRouter(prefix="/tables", tags=["tables"])
 
-class ValidationError(Exception):
-    pass
+# Rows committed per transaction when streaming NDJSON into a table
+INGEST_BATCH_SIZE = 1000
+# Cap on per-line errors echoed back, so a bad upload cannot grow the response unboundedly
+MAX_REPORTED_ERRORS = 1000
 
-@router.post("/", response_model=TableData)
-def create_table(*, session: Session = Depends(get_session), table: TableData):
+def validate_rows(rows: List[Dict[str, Any]], object_schema: ObjectSchema):
+    """Validate rows against the object schema, raising a 400 on the first bad row"""
+    error = get_validator(object_schema).first_error(rows)
+    if error:
+        raise HTTPException(status_code=400, detail=error[1])
+
+async def iter_lines(stream):
+    """Split an async byte stream into lines without buffering more than one partial line"""
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson")
+
+# Fields stored on the tables row itself; anything but "data" can be listed without touching row chunks
+SUMMARY_FIELDS = ("id",) + tuple(name for name in TableDataSummary.__fields__ if name != "id")
+TABLE_FIELDS = SUMMARY_FIELDS + ("data",)
+
+def parse_fields(fields: str) -> List[str]:
+    """Parse a comma-separated `fields=` projection; the id is always included"""
+    selected = ["id"]
+    for name in (part.strip() for part in fields.split(",")):
+        if name and name not in selected:
+            selected.append(name)
+    unknown = [name for name in selected if name not in TABLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown table fields: {', '.join(unknown)}")
+    return selected
+
+def wants_ndjson(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in NDJSON_MEDIA_TYPES)
+
+def export_format(request: Request) -> Optional[str]:
+    """CSV_MEDIA_TYPE or COLUMNAR_MEDIA_TYPE if the client asks for a bulk export format"""
+    accept = request.headers.get("accept", "")
+    for media_type in (COLUMNAR_MEDIA_TYPE, CSV_MEDIA_TYPE):
+        if media_type in accept:
+            return media_type
+    return None
+
+async def _stream_rows_ndjson(session: AsyncSession, table: TableData, start: int = 0, stop: Optional[int] = None) -> AsyncIterator[bytes]:
+    async for batch in table_rows.aiter_row_batches(session, table, start, stop):
+        yield b"".join(dumps(row) + b"\n" for row in batch)
+
+async def _stream_rows_json(session: AsyncSession, table: TableData, start: int = 0, stop: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Stream rows as a JSON array, one storage chunk per write"""
+    yield b"["
+    first = True
+    async for batch in table_rows.aiter_row_batches(session, table, start, stop):
+        if batch:
+            # A chunk is encoded in one call, as an array without its brackets
+            yield (b"" if first else b",") + dumps(batch)[1:-1]
+            first = False
+    yield b"]"
+
+async def _stream_rows_csv(session: AsyncSession, table: TableData, start: int = 0, stop: Optional[int] = None) -> AsyncIterator[bytes]:
+    yield encode_csv([], table.columns, header=True)
+    async for batch in table_rows.aiter_row_batches(session, table, start, stop):
+        yield encode_csv(batch, table.columns)
+
+async def _stream_rows_columnar(session: AsyncSession, table: TableData, start: int = 0, stop: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Stream rows as a columnar snapshot, one batch per storage chunk"""
+    writer = SnapshotWriter(table.columns)
+    yield writer.header()
+    async for batch in table_rows.aiter_row_batches(session, table, start, stop):
+        if batch:
+            yield writer.batch(batch)
+    yield writer.footer()
+
+def _table_header(table: TableData, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """The TableDataRead fields of a table (or the selected ones), except data"""
+    return {
+        name: getattr(table, name)
+        for name in TableDataRead.__fields__
+        if name != "data" and (not fields or name in fields)
+    }
+
+async def _stream_table_json(session: AsyncSession, table: TableData, fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+    """Stream a table in the TableDataRead shape (or a projection of it) without materialising its rows"""
+    header = dumps(_table_header(table, fields))
+    yield header[:-1] + b',"data":'
+    async for part in _stream_rows_json(session, table):
+        yield part
+    yield b"}"
+
+async def _encoded(value: Dict[str, Any]) -> AsyncIterator[bytes]:
+    yield dumps(value)
+
+async def _stream_tables(items: List[AsyncIterator[bytes]], ndjson: bool) -> AsyncIterator[bytes]:
+    """Stream encoded tables as a JSON array, or one per line for NDJSON"""
+    if ndjson:
+        for item in items:
+            async for part in item:
+                yield part
+            yield b"\n"
+        return
+    yield b"["
+    for i, item in enumerate(items):
+        if i:
+            yield b","
+        async for part in item:
+            yield part
+    yield b"]"
+
+@router.post("/", response_model=TableDataRead)
+async def create_table(*, session: AsyncSession = Depends(get_async_session), table: TableDataCreate):
     # Verify that the referenced object exists
-    object_schema = session.get(ObjectSchema, table.object_id)
+    object_schema = await metadata_cache.get(session, ObjectSchema, table.object_id)
     if not object_schema:
         raise HTTPException(status_code=404, detail="Referenced object schema not found")
-    
+
     # Validate data against the object schema
-    try:
-        for row in table.data:
-            # Check for extra fields not in schema
-            extra_fields = set(row.keys()) - set(object_schema.attributes.keys())
-            if extra_fields:
-                raise ValidationError(f"Extra fields found in data: {extra_fields}")
-            
-            # Here you would validate each row against the object schema
-            for field, value in row.items():
-                if field not in object_schema.attributes:
-                    raise ValidationError(f"Field {field} not in schema attributes")
-    except ValidationError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    
-    session.add(table)
-    session.commit()
-    session.refresh(table)
-    return table
+    validate_rows(table.data, object_schema)
+
+    db_table = TableData.from_orm(table)
+    session.add(db_table)
+    await session.flush()
+    await session.run_sync(table_rows.replace_rows, db_table, table.data)
+    await session.commit()
+    await session.refresh(db_table)
+    return json_response(await session.run_sync(table_rows.to_read_model, db_table, table.data))
 
-@router.get("/", response_model=List[TableData])
-def read_tables(
+@router.post(":batch", response_model=List[TableDataSummary])
+async def create_tables(*, session: AsyncSession = Depends(get_async_session), tables: List[TableDataCreate]):
+    """Create many tables in a single transaction, rejecting the batch if any item is invalid"""
+    check_batch_size(tables)
+    object_schemas = await metadata_cache.get_many(session, ObjectSchema, (table.object_id for table in tables))
+
+    def check(table: TableDataCreate):
+        object_schema = object_schemas.get(table.object_id)
+        if not object_schema:
+            raise HTTPException(status_code=404, detail="Referenced object schema not found")
+        validate_rows(table.data, object_schema)
+
+    validate_batch(tables, check)
+
+    db_tables = [TableData.from_orm(table) for table in tables]
+    session.add_all(db_tables)
+    await session.flush()
+
+    def write_rows(sync_session):
+        for db_table, table in zip(db_tables, tables):
+            table_rows.replace_rows(sync_session, db_table, table.data)
+
+    await session.run_sync(write_rows)
+    await session.commit()
+    return json_response([TableDataSummary.from_orm(db_table) for db_table in db_tables])
+
+@router.get("/", response_model=List[TableDataRead])
+async def read_tables(
     *,
-    session: Session = Depends(get_session),
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
     skip: int = 0,
     limit: int = 100,
-    object_id: Optional[int] = None
+    cursor: Optional[str] = None,
+    object_id: Optional[int] = None,
+    summary: bool = False,
+    fields: Optional[str] = None
 ):
-    query = select(TableData)
+    """List tables, streaming rows from storage as they are read.
+
+    `summary=true` returns only stored metadata (row_count, columns, ...) without
+    reading any rows; `fields=name,row_count` projects each table onto the given
+    fields, and only loads rows if `data` is among them.
+    Send `Accept: application/x-ndjson` to get one table per line instead of a JSON array.
+    Responses are compressed as negotiated by Accept-Encoding.
+    """
+    selected = parse_fields(fields) if fields else list(SUMMARY_FIELDS) if summary else None
+
+    if selected is not None and "data" not in selected:
+        # Select just the requested columns; row chunks are never read
+        query = select(*(getattr(TableData, name) for name in selected))
+    else:
+        query = select(TableData)
     if object_id:
         query = query.where(TableData.object_id == object_id)
-    tables = session.exec(query.offset(skip).limit(limit)).all()
-    return tables
+    query = paginate(query, TableData.id, skip=skip, limit=limit, cursor=cursor)
+    results = (await session.exec(query)).all()
+
+    if selected is not None and "data" not in selected:
+        items = [_encoded(row._asdict()) for row in results]
+    else:
+        items = [_stream_table_json(session, table, selected) for table in results]
+    ndjson = wants_ndjson(request)
+    cursor_after = next_cursor(results, limit)
+    return await compressed_response(
+        _stream_tables(items, ndjson),
+        request_encoding(request),
+        media_type=NDJSON_MEDIA_TYPES[0] if ndjson else "application/json",
+        headers={NEXT_CURSOR_HEADER: cursor_after} if cursor_after else None,
+    )
+
+@router.get("/{table_id}", response_model=TableDataRead)
+async def read_table(*, request: Request, session: AsyncSession = Depends(get_async_session), table_id: int):
+    """Read a table, streaming its rows from storage chunk by chunk.
 
-@router.get("/{table_id}", response_model=TableData)
-def read_table(*, session: Session = Depends(get_session), table_id: int):
-    table = session.get(TableData, table_id)
+    Send `Accept: application/x-ndjson` to get just the rows, one per line.
+    Conditional requests for an unchanged table get a 304 without reading any rows.
+    Responses are compressed as negotiated by Accept-Encoding, and a compressed
+    table is cached until its next change.
+    """
+    representation = "ndjson" if wants_ndjson(request) else "json"
+    encoding = request_encoding(request)
+
+    def variant(applied: Optional[str]) -> str:
+        # Each encoding is a representation of its own, with its own ETag
+        return f"{representation}+{applied}" if applied else representation
+
+    # A table too small to compress was sent as identity, whatever the client accepts
+    unchanged = await not_modified(request, session, TableData, table_id, variant(encoding), [variant(None)])
+    if unchanged:
+        unchanged.headers["Vary"] = "Accept, Accept-Encoding"
+        return unchanged
+    table = await session.get(TableData, table_id)
     if not table:
         raise HTTPException(status_code=404, detail="Table not found")
-    return table
 
-@router.put("/{table_id}", response_model=TableData)
-def update_table(*, session: Session = Depends(get_session), table_id: int, table_update: TableData):
-    table = session.get(TableData, table_id)
+    def encoded_headers(applied: Optional[str]) -> Dict[str, str]:
+        return version_headers(TableData.__tablename__, table.id, table.updated_at, variant(applied))
+
+    headers = {"Vary": "Accept"}
+    key = (table.id, table.updated_at.isoformat(), representation, encoding) if encoding else None
+    if representation == "ndjson":
+        return await compressed_response(
+            _stream_rows_ndjson(session, table),
+            encoding,
+            media_type=NDJSON_MEDIA_TYPES[0],
+            headers={**headers, "X-Row-Count": str(table.row_count)},
+            key=key,
+            encoded_headers=encoded_headers,
+        )
+    return await compressed_response(
+        _stream_table_json(session, table), encoding, media_type="application/json", headers=headers, key=key,
+        encoded_headers=encoded_headers,
+    )
+
+@router.get("/{table_id}/rows", response_model=List[Dict[str, Any]])
+async def read_table_rows(
+    *,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    table_id: int,
+    start: int = 0,
+    stop: Optional[int] = None
+):
+    """Read a range of rows, loading only the chunks that cover it.
+
+    Send `Accept: text/csv` or `Accept: application/vnd.functionsvalidated.columnar`
+    to export the rows as CSV or as a columnar snapshot (see core/table_formats.py),
+    streamed from storage chunk by chunk.
+    """
+    table = await session.get(TableData, table_id)
     if not table:
         raise HTTPException(status_code=404, detail="Table not found")
-    
-    # Verify that the referenced object exists
-    object_schema = session.get(ObjectSchema, table_update.object_id)
+    encoding = request_encoding(request)
+    media_type = export_format(request)
+    if media_type is not None:
+        stream = _stream_rows_csv if media_type == CSV_MEDIA_TYPE else _stream_rows_columnar
+        extension = "csv" if media_type == CSV_MEDIA_TYPE else "fvcol"
+        return await compressed_response(
+            stream(session, table, start, stop),
+            encoding,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="table-{table.id}.{extension}"'},
+        )
+    if wants_ndjson(request):
+        return await compressed_response(
+            _stream_rows_ndjson(session, table, start, stop), encoding, media_type=NDJSON_MEDIA_TYPES[0]
+        )
+    return await compressed_response(_stream_rows_json(session, table, start, stop), encoding, media_type="application/json")
+
+RejectRow = Callable[[int, str], None]
+
+async def _ndjson_rows(request: Request, reject: RejectRow) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    line_number = 0
+    async for line in iter_lines(request.stream()):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            reject(line_number, "Invalid JSON")
+            continue
+        if not isinstance(row, dict):
+            reject(line_number, "Row must be a JSON object")
+            continue
+        yield line_number, row
+
+async def _csv_rows(request: Request, records: CSVImport, reject: RejectRow) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    async for line in iter_lines(request.stream()):
+        record = records.feed(line.decode(errors="replace").rstrip("\r"))
+        if record is None:
+            continue
+        line_number, row, error = record
+        if error:
+            reject(line_number, error)
+        else:
+            yield line_number, row
+    record = records.close()
+    if record is not None:
+        reject(record[0], record[2] or "Invalid CSV record")
+
+async def _columnar_rows(request: Request) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    parser = SnapshotParser()
+    row_number = 0
+    try:
+        async for data in request.stream():
+            for batch in parser.feed(data):
+                for row in batch:
+                    row_number += 1
+                    yield row_number, row
+        parser.close()
+    except FormatError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid columnar snapshot: {e}")
+
+@router.post("/{table_id}/rows")
+async def append_table_rows(*, request: Request, session: AsyncSession = Depends(get_async_session), table_id: int):
+    """Append rows streamed as NDJSON (one JSON object per line), CSV or a columnar snapshot.
+
+    The body's Content-Type selects the format: `text/csv` (a header record,
+    then values converted to the object schema's types) or
+    `application/vnd.functionsvalidated.columnar`; anything else is NDJSON.
+    Rows are validated as they arrive and committed every INGEST_BATCH_SIZE rows;
+    invalid lines are skipped and reported by line number (the record's first
+    line for CSV, the row number for snapshots). A corrupt snapshot is a 400,
+    keeping the rows committed before it.
+    """
+    table = await session.get(TableData, table_id)
+    if not table:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    object_schema = await metadata_cache.get(session, ObjectSchema, table.object_id)
     if not object_schema:
         raise HTTPException(status_code=404, detail="Referenced object schema not found")
-    
-    # Validate data against the object schema
+
+    validator = get_validator(object_schema)
+    accepted = 0
+    errors = []
+    rejected = 0
+
+    def reject(line_number: int, error: str):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_number, "error": error})
+
+    async def flush(batch: List[Dict[str, Any]], line_numbers: List[int]) -> int:
+        # Validate the whole batch column by column, then commit the rows that passed
+        batch_errors = validator.errors(batch)
+        for i in sorted(batch_errors):
+            reject(line_numbers[i], batch_errors[i])
+        valid = [row for i, row in enumerate(batch) if i not in batch_errors]
+        if valid:
+            await session.run_sync(table_rows.append_rows, table, valid)
+            await session.commit()
+        return len(valid)
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(CSV_MEDIA_TYPE):
+        rows = _csv_rows(request, CSVImport(validator.types), reject)
+    elif content_type.startswith(COLUMNAR_MEDIA_TYPE):
+        rows = _columnar_rows(request)
+    else:
+        rows = _ndjson_rows(request, reject)
+
+    batch = []
+    line_numbers = []
+    async for line_number, row in rows:
+        batch.append(row)
+        line_numbers.append(line_number)
+        if len(batch) >= INGEST_BATCH_SIZE:
+            accepted += await flush(batch, line_numbers)
+            batch = []
+            line_numbers = []
+
+    if batch:
+        accepted += await flush(batch, line_numbers)
+    errors.sort(key=lambda error: error["line"])
+    if accepted:
+        await revalidate(session, tables=[table.id])
+
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors),
+        "row_count": table.row_count,
+    }
+
+@router.patch("/{table_id}/rows")
+async def update_table_rows(
+    *,
+    session: AsyncSession = Depends(get_async_session),
+    table_id: int,
+    start: int = 0,
+    rows: List[Dict[str, Any]]
+):
+    """Overwrite rows[start:start + len(rows)] without rewriting the rest of the table"""
+    table = await session.get(TableData, table_id)
+    if not table:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    object_schema = await metadata_cache.get(session, ObjectSchema, table.object_id)
+    if not object_schema:
+        raise HTTPException(status_code=404, detail="Referenced object schema not found")
+    validate_rows(rows, object_schema)
+
     try:
-        for row in table_update.data:
-            # Check for extra fields not in schema
-            extra_fields = set(row.keys()) - set(object_schema.attributes.keys())
-            if extra_fields:
-                raise ValidationError(f"Extra fields found in data: {extra_fields}")
-            
-            for field, value in row.items():
-                if field not in object_schema.attributes:
-                    raise ValidationError(f"Field {field} not in schema attributes")
-    except ValidationError as e:
+        await session.run_sync(table_rows.update_rows, table, start, rows)
+    except IndexError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    
+
+    await session.commit()
+    await revalidate(session, tables=[table.id])
+    return {"ok": True, "start": start, "updated": len(rows)}
+
+@router.put("/{table_id}", response_model=TableDataRead)
+async def update_table(*, session: AsyncSession = Depends(get_async_session), table_id: int, table_update: TableDataCreate):
+    table = await session.get(TableData, table_id)
+    if not table:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    # Verify that the referenced object exists
+    object_schema = await metadata_cache.get(session, ObjectSchema, table_update.object_id)
+    if not object_schema:
+        raise HTTPException(status_code=404, detail="Referenced object schema not found")
+
+    # Validate data against the object schema
+    validate_rows(table_update.data, object_schema)
+
     # Update table attributes
     table_data = table_update.dict(exclude_unset=True)
+    new_rows = table_data.pop("data", None)
+    object_changed = table.object_id != table_update.object_id
     for key, value in table_data.items():
         setattr(table, key, value)
-    
+    table.updated_at = datetime.utcnow()
+
+    if new_rows is not None:
+        await session.run_sync(table_rows.replace_rows, table, table_update.data)
+
     session.add(table)
-    session.commit()
-    session.refresh(table)
-    return table
+    if object_changed:
+        await session.run_sync(dependencies.reindex_dependents, [table.id])
+    await session.commit()
+    await session.refresh(table)
+    await revalidate(session, tables=[table.id])
+    return json_response(await session.run_sync(table_rows.to_read_model, table))
 
 @router.delete("/{table_id}")
-def delete_table(*, session: Session = Depends(get_session), table_id: int):
-    table = session.get(TableData, table_id)
+async def delete_table(*, session: AsyncSession = Depends(get_async_session), table_id: int):
+    table = await session.get(TableData, table_id)
     if not table:
         raise HTTPException(status_code=404, detail="Table not found")
-    
-    session.delete(table)
-    session.commit()
+
+    await session.run_sync(table_rows.delete_rows, table)
+    await session.delete(table)
+    await session.commit()
+    # Test cases still referencing the table now fail, which their new runs report
+    await revalidate(session, tables=[table_id])
     return {"ok": True}
@@ -1,21 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlmodel import Session, select
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlmodel import select, func, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Dict, Any, Optional, Set
 from datetime import datetime
 import json
 
 from ....models.test_case import TestCase
 from ....models.function_def import FunctionDef
 from ....models.table_data import TableData
-from ....core.database import get_session
+from ....models.submission import Submission
+from ....models.test_run import TestRun
+from ....core.database import get_async_session
+from ....execution.cache import result_cache
+from ....execution.runner import prepare_cases, cached_run
+from ....execution.events import EVENT_QUEUED, EVENT_FINISHED, publish_runs
+from ....crud import dependencies
+from ....crud.references import resolve
+from ....crud.metadata_cache import metadata_cache
+from ...pagination import paginate, set_next_cursor
+from ...responses import json_response
+from ...conditional import not_modified, set_version_headers
+from ...batch import check_batch_size, validate_batch
 
 router = APIRouter(prefix="/test-cases", tags=["test-cases"])
 
 
-@router.post("/", response_model=TestCase)
-def create_test_case(*, session: Session = Depends(get_session), test_case: TestCase):
+def check_test_case(test_case: TestCase, functions: Dict[int, FunctionDef], tables: Dict[int, TableData]):
+    """Raise if the test case references missing tables or tables that do not match its function's schemas"""
     # Verify that the function exists
-    function = session.get(FunctionDef, test_case.function_id)
+    function = functions.get(test_case.function_id)
     if not function:
         raise HTTPException(status_code=404, detail="Function not found")
     
@@ -26,7 +39,7 @@ def create_test_case(*, session: Session = Depends(get_session), test_case: Test
                 status_code=400,
                 detail=f"Input {input_name} not defined in function schema"
             )
-        table = session.get(TableData, table_id)
+        table = tables.get(table_id)
         if not table:
             raise HTTPException(
                 status_code=404,
@@ -45,7 +58,7 @@ def create_test_case(*, session: Session = Depends(get_session), test_case: Test
                 status_code=400,
                 detail=f"Output {output_name} not defined in function schema"
             )
-        table = session.get(TableData, table_id)
+        table = tables.get(table_id)
         if not table:
             raise HTTPException(
                 status_code=404,
@@ -56,18 +69,49 @@ def create_test_case(*, session: Session = Depends(get_session), test_case: Test
                 status_code=400,
                 detail=f"Expected output table {output_name} schema does not match function definition"
             )
+
+def referenced_table_ids(test_cases: List[TestCase]) -> Set[int]:
+    return {
+        table_id
+        for test_case in test_cases
+        for table_id in [*test_case.input_tables.values(), *test_case.expected_output_tables.values()]
+    }
+
+@router.post("/", response_model=TestCase)
+async def create_test_case(*, session: AsyncSession = Depends(get_async_session), test_case: TestCase):
+    functions = await metadata_cache.get_many(session, FunctionDef, [test_case.function_id])
+    tables = await metadata_cache.get_many(session, TableData, referenced_table_ids([test_case]))
+    check_test_case(test_case, functions, tables)
     
     session.add(test_case)
-    session.commit()
-    session.refresh(test_case)
-    return test_case
+    await session.flush()
+    await session.run_sync(dependencies.index_test_cases, [test_case])
+    await session.commit()
+    await session.refresh(test_case)
+    return json_response(test_case)
+
+@router.post(":batch", response_model=List[TestCase])
+async def create_test_cases(*, session: AsyncSession = Depends(get_async_session), test_cases: List[TestCase]):
+    """Create many test cases in a single transaction, rejecting the batch if any item is invalid"""
+    check_batch_size(test_cases)
+    functions = await metadata_cache.get_many(session, FunctionDef, (test_case.function_id for test_case in test_cases))
+    tables = await metadata_cache.get_many(session, TableData, referenced_table_ids(test_cases))
+    validate_batch(test_cases, lambda test_case: check_test_case(test_case, functions, tables))
+    
+    session.add_all(test_cases)
+    await session.flush()
+    await session.run_sync(dependencies.index_test_cases, test_cases)
+    await session.commit()
+    return json_response(test_cases)
 
 @router.get("/", response_model=List[TestCase])
-def read_test_cases(
+async def read_test_cases(
     *,
-    session: Session = Depends(get_session),
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     function_id: Optional[int] = None,
     status: Optional[str] = None
 ):
@@ -75,42 +119,127 @@ def read_test_cases(
     if function_id:
         query = query.where(TestCase.function_id == function_id)
     if status:
-        query = query.where(TestCase.last_status == status)
-    test_cases = session.exec(query.offset(skip).limit(limit)).all()
-    return test_cases
+        # Filter on the status of each test case's most recent run
+        latest = (
+            select(TestRun.test_case_id, func.max(TestRun.id).label("run_id"))
+            .group_by(TestRun.test_case_id)
+            .subquery()
+        )
+        query = (
+            query.join(latest, latest.c.test_case_id == TestCase.id)
+            .join(TestRun, TestRun.id == latest.c.run_id)
+            .where(TestRun.status == status)
+        )
+    query = paginate(query, TestCase.id, skip=skip, limit=limit, cursor=cursor)
+    test_cases = (await session.exec(query)).all()
+    set_next_cursor(response, test_cases, limit)
+    return json_response(test_cases, response)
+
+@router.get("/affected", response_model=List[TestCase])
+async def read_affected_test_cases(
+    *,
+    session: AsyncSession = Depends(get_async_session),
+    table_id: Optional[int] = None,
+    object_id: Optional[int] = None,
+    function_id: Optional[int] = None
+):
+    """Test cases that a change to the given table, object or function would re-run"""
+    test_case_ids = await session.run_sync(
+        dependencies.dependents,
+        [table_id] if table_id is not None else [],
+        [object_id] if object_id is not None else [],
+        [function_id] if function_id is not None else [],
+    )
+    test_cases = await resolve(session, TestCase, test_case_ids)
+    return json_response([test_cases[test_case_id] for test_case_id in sorted(test_cases)])
 
 @router.get("/{test_case_id}", response_model=TestCase)
-def read_test_case(*, session: Session = Depends(get_session), test_case_id: int):
-    test_case = session.get(TestCase, test_case_id)
+async def read_test_case(
+    *,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    test_case_id: int
+):
+    unchanged = await not_modified(request, session, TestCase, test_case_id)
+    if unchanged:
+        return unchanged
+    test_case = await session.get(TestCase, test_case_id)
     if not test_case:
         raise HTTPException(status_code=404, detail="Test case not found")
-    return test_case
+    set_version_headers(response, test_case)
+    return json_response(test_case, response)
 
 @router.post("/{test_case_id}/run")
 async def run_test(
     *,
-    background_tasks: BackgroundTasks,
-    session: Session = Depends(get_session),
-    test_case_id: int
+    session: AsyncSession = Depends(get_async_session),
+    test_case_id: int,
+    submission_id: Optional[int] = None
 ):
-    test_case = session.get(TestCase, test_case_id)
+    test_case = await session.get(TestCase, test_case_id)
     if not test_case:
         raise HTTPException(status_code=404, detail="Test case not found")
     
-    # Queue the test to run in the background
-    background_tasks.add_task(run_test_case, test_case_id, session)
+    # Run the given submission, or the latest one for the test case's function
+    if submission_id is None:
+        query = (
+            select(Submission)
+            .where(Submission.function_id == test_case.function_id)
+            .order_by(Submission.id.desc())
+            .limit(1)
+        )
+        submission = (await session.exec(query)).first()
+        if not submission:
+            raise HTTPException(status_code=400, detail="No submission exists for this test case's function")
+    else:
+        submission = await session.get(Submission, submission_id)
+        if not submission or submission.function_id != test_case.function_id:
+            raise HTTPException(status_code=404, detail="Submission not found for this test case's function")
+    
+    # An identical run (same code, table versions and parameters) has already been executed
+    [case] = await prepare_cases(session, [test_case])
+    key = case.result_key(submission)
+    outcome = result_cache.get(key) if key else None
+    if outcome is not None:
+        run = cached_run(test_case, submission, outcome)
+        session.add(run)
+        await session.commit()
+        publish_runs(EVENT_FINISHED, [run])
+        return {
+            "message": "Test result served from cache",
+            "test_case_id": test_case_id,
+            "run_id": run.id,
+            "cached": True,
+            "status": run.status,
+            "passed": run.passed,
+            "diff": run.diff
+        }
+    
+    # Queue consumers pick the run up from the test_runs table
+    run = TestRun(test_case_id=test_case.id, submission_id=submission.id)
+    session.add(run)
+    await session.commit()
+    publish_runs(EVENT_QUEUED, [run])
     
     return {
         "message": "Test execution queued",
-        "test_case_id": test_case_id
+        "test_case_id": test_case_id,
+        "run_id": run.id,
+        "cached": False,
+        # Server-Sent Events with the run's progress and outcome
+        "events_url": f"/api/v1/runs/events?run_id={run.id}"
     }
 
 @router.delete("/{test_case_id}")
-def delete_test_case(*, session: Session = Depends(get_session), test_case_id: int):
-    test_case = session.get(TestCase, test_case_id)
+async def delete_test_case(*, session: AsyncSession = Depends(get_async_session), test_case_id: int):
+    test_case = await session.get(TestCase, test_case_id)
     if not test_case:
         raise HTTPException(status_code=404, detail="Test case not found")
     
-    session.delete(test_case)
-    session.commit()
+    await session.run_sync(dependencies.unindex_test_case, test_case_id)
+    # Its runs reference it
+    await session.exec(delete(TestRun).where(TestRun.test_case_id == test_case_id))
+    await session.delete(test_case)
+    await session.commit()
     return {"ok": True}
@@ -0,0 +1,161 @@
+"""Application settings and database engine profiles.
+
+Settings are read from the environment (or a .env file). The engine profile
+decides how the SQLAlchemy engines are tuned: "sqlite" turns on WAL and the
+other connection pragmas, "postgres" sizes the connection pool and the asyncpg
+statement cache, and "default" leaves everything at SQLAlchemy's defaults.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from pydantic import BaseSettings
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class Settings(BaseSettings):
+    database_url: str = f"sqlite:///{Path('schema_process.db').absolute()}"
+    # Engine profile name; derived from database_url when unset
+    db_profile: Optional[str] = None
+    # Log every SQL statement (useful in development, expensive in production)
+    db_echo: bool = False
+
+    # SQLite profile
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64 * 1024  # Negative values are in KiB
+    sqlite_busy_timeout: int = 5000  # Milliseconds
+
+    # PostgreSQL profile
+    pg_pool_size: int = 10
+    pg_max_overflow: int = 20
+    pg_pool_pre_ping: bool = True
+    pg_pool_recycle: int = 1800  # Seconds
+    pg_statement_cache_size: int = 500
+
+    # Test execution; execution_workers defaults to every core this process may run on
+    execution_workers: Optional[int] = None
+    execution_default_timeout: float = 30.0  # Seconds of wall-clock time per run
+    execution_timeout_grace: float = 5.0  # Extra seconds before a stuck worker is killed
+    # Seconds a run may spend loading its inputs before it starts, and comparing its outputs after it ends
+    execution_load_timeout: float = 60.0
+    execution_compare_timeout: float = 60.0
+    # Workers are long-lived; each is replaced after this many runs, and the pool once a worker's RSS exceeds the limit
+    execution_worker_max_runs: int = 500
+    execution_worker_max_rss_mb: int = 1024
+    # Per-worker cache of compiled submissions
+    execution_module_cache_size: int = 32
+    # Input tables memory-mapped by every worker; the directory defaults to a private one under $XDG_RUNTIME_DIR or /dev/shm
+    execution_shared_tables_dir: Optional[str] = None
+    execution_shared_tables_mb: int = 1024
+    # Output comparison indexes at most this many rows per pass, bounding its memory
+    execution_compare_partition_rows: int = 250_000
+    # Outcomes of recent runs, keyed by a hash of their code, table versions and parameters
+    execution_result_cache_size: int = 1024
+    # Queue consumers started inside the API process (default: one per pool worker; 0 when using separate workers)
+    execution_queue_consumers: Optional[int] = None
+    execution_queue_poll_interval: float = 0.5  # Seconds between polls of an empty queue
+    # Extra seconds a claimed job's lease lasts beyond its timeout, and how often an abandoned job is retried
+    execution_job_lease: float = 60.0
+    execution_job_max_attempts: int = 3
+    # Queue runs of the test cases affected by each change to a table, object or function
+    revalidate_on_change: bool = True
+
+    # Cache of ObjectSchemas, FunctionDefs and table headers used for validation
+    metadata_cache_size: int = 4096
+    metadata_cache_ttl: float = 30.0  # Seconds
+    # Directory for broadcasting invalidations between processes on this host (e.g. uvicorn workers)
+    metadata_cache_broadcast_dir: Optional[str] = None
+
+    # Table responses shorter than this are sent uncompressed
+    table_compression_min_bytes: int = 1024
+    # Compressed bodies of whole tables, cached per table version and encoding
+    table_compression_cache_mb: int = 128
+
+    class Config:
+        env_file = ".env"
+
+
+@dataclass
+class EngineProfile:
+    name: str
+    engine_kwargs: Dict[str, Any] = field(default_factory=dict)
+    async_engine_kwargs: Dict[str, Any] = field(default_factory=dict)
+    # PRAGMA statements run on every new SQLite connection
+    pragmas: Dict[str, Any] = field(default_factory=dict)
+
+
+def _default_profile(settings: Settings) -> EngineProfile:
+    kwargs: Dict[str, Any] = {"echo": settings.db_echo}
+    sync_kwargs = dict(kwargs)
+    if settings.database_url.startswith("sqlite"):
+        # Allow SQLite usage across threads (common requirement for async frameworks)
+        sync_kwargs["connect_args"] = {"check_same_thread": False}
+    return EngineProfile("default", engine_kwargs=sync_kwargs, async_engine_kwargs=kwargs)
+
+
+def _sqlite_profile(settings: Settings) -> EngineProfile:
+    profile = _default_profile(settings)
+    profile.name = "sqlite"
+    profile.pragmas = {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "mmap_size": settings.sqlite_mmap_size,
+        "cache_size": settings.sqlite_cache_size,
+        "busy_timeout": settings.sqlite_busy_timeout,
+    }
+    return profile
+
+
+def _postgres_profile(settings: Settings) -> EngineProfile:
+    pool_kwargs = {
+        "echo": settings.db_echo,
+        "pool_size": settings.pg_pool_size,
+        "max_overflow": settings.pg_max_overflow,
+        "pool_pre_ping": settings.pg_pool_pre_ping,
+        "pool_recycle": settings.pg_pool_recycle,
+    }
+    return EngineProfile(
+        "postgres",
+        engine_kwargs=dict(pool_kwargs),
+        async_engine_kwargs=dict(
+            pool_kwargs,
+            connect_args={"prepared_statement_cache_size": settings.pg_statement_cache_size},
+        ),
+    )
+
+
+ENGINE_PROFILES = {
+    "default": _default_profile,
+    "sqlite": _sqlite_profile,
+    "postgres": _postgres_profile,
+}
+
+
+def get_engine_profile(settings: Settings, name: Optional[str] = None) -> EngineProfile:
+    """Build the named engine profile, or the one matching the database URL"""
+    name = name or settings.db_profile
+    if name is None:
+        scheme = settings.database_url.split(":", 1)[0].split("+")[0]
+        name = "postgres" if scheme in ("postgresql", "postgres") else "sqlite" if scheme == "sqlite" else "default"
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown database profile {name!r}; expected one of {sorted(ENGINE_PROFILES)}")
+    return ENGINE_PROFILES[name](settings)
+
+
+def apply_pragmas(engine: Engine, profile: EngineProfile) -> None:
+    """Run the profile's PRAGMA statements whenever the engine opens a connection"""
+    if not profile.pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in profile.pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+settings = Settings()
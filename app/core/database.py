@@ -1,15 +1,47 @@
 from sqlmodel import Session, create_engine
-from pathlib import Path
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from .config import settings, get_engine_profile, apply_pragmas
 
-# Create database URL
-sqlite_file = Path("schema_process.db")
-sqlite_url = f"sqlite:///{sqlite_file.absolute()}"
+# Async drivers for each sync URL scheme we support
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """Swap the driver in a sync database URL for its async counterpart"""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme.split("+")[0], scheme) + sep + rest
+
+def to_sync_url(url: str) -> str:
+    """Swap an async driver in a database URL back to the default sync driver"""
+    scheme, sep, rest = url.partition("://")
+    return scheme.split("+")[0] + sep + rest
+
+# Engine tuning (pool sizes, SQLite pragmas, echo) comes from the configured profile
+profile = get_engine_profile(settings)
 
 # Create engine
-# Add connect_args to allow SQLite usage across threads (common requirement for async frameworks)
-engine = create_engine(sqlite_url, echo=True, connect_args={"check_same_thread": False})
+engine = create_engine(settings.database_url, **profile.engine_kwargs)
+apply_pragmas(engine, profile)
+
+# Async engine used by the API routers, so requests waiting on the database do not hold a worker thread
+async_engine = create_async_engine(to_async_url(settings.database_url), **profile.async_engine_kwargs)
+apply_pragmas(async_engine.sync_engine, profile)
 
 # Dependency for database session
 def get_session():
     with Session(engine) as session:
         yield session
+
+# Dependency for async database session
+# Objects stay loaded after commit, since lazy attribute refreshes are not possible under asyncio
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+def new_async_session() -> AsyncSession:
+    """A session for work outside a request, such as the execution queue consumers"""
+    return AsyncSession(async_engine, expire_on_commit=False)
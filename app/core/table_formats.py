@@ -0,0 +1,531 @@
+"""CSV and columnar binary encodings of table rows, for bulk export and import.
+
+CSV
+---
+The first record names the columns. On export, null and absent values are
+empty cells, booleans are `true`/`false`, and objects and arrays are JSON.
+On import an empty cell is null, and every other cell is converted to its
+column's type in the ObjectSchema (see core/validators.py). Columns the
+schema does not define are kept as text, so the validator rejects them like
+any other extra field.
+
+Columnar snapshot
+-----------------
+A snapshot can be written as a stream, one batch per storage chunk, and a
+reader that maps the file can reach any batch through the footer. All
+integers are little-endian:
+
+    magic     b"FVCOL1\\0\\0"
+    batch     b"BTCH", u32 meta length, meta, zero padding to 8 bytes, buffers
+    ...
+    footer    b"FOOT", u32 meta length, meta, zero padding to 8 bytes,
+              u64 offset of the footer, b"FVCOLEND"
+
+The meta sections are small UTF-8 JSON objects; the values themselves are
+never JSON, except in "json" columns. A batch's meta has "rows", "length"
+(the total size of its buffers) and "columns", a list of {"name", "type",
+"buffers": [[offset, length], ...]} with offsets relative to the batch's
+first buffer. Every buffer starts 8-byte aligned, so a mapped file's buffers
+can be viewed as arrays (e.g. numpy.frombuffer) without copying. The
+footer's meta has "columns", "row_count" and "batches" (the file offset of
+each batch).
+
+Each column has a presence buffer first, one uint8 per row: 0 where the row
+lacks the field, 1 for a value and 2 for null. Its value buffer is chosen per
+batch from the values it holds:
+
+- int64: an int64 per row (0 without a value)
+- float64: a float64 per row
+- bool: a uint8 per row
+- string: rows + 1 int64 offsets into a buffer of UTF-8 text
+- json: like string, with every value JSON-encoded (nested or mixed values)
+- null: no value buffer (no row has a value)
+"""
+import csv
+import io
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Row = Dict[str, Any]
+
+CSV_MEDIA_TYPE = "text/csv"
+COLUMNAR_MEDIA_TYPE = "application/vnd.functionsvalidated.columnar"
+
+MAGIC = b"FVCOL1\0\0"
+END = b"FVCOLEND"
+BATCH = b"BTCH"
+FOOTER = b"FOOT"
+
+ABSENT, PRESENT, NULL = 0, 1, 2
+
+_INT64_MIN, _INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+_SECTION = struct.Struct("<4sI")
+_TRAILER = struct.Struct("<Q8s")
+
+
+class FormatError(ValueError):
+    pass
+
+
+# CSV
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def encode_csv(rows: List[Row], columns: Sequence[str], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_csv_cell(row.get(column)) for column in columns] for row in rows)
+    return buffer.getvalue().encode()
+
+
+_BOOLEANS = {"true": True, "1": True, "yes": True, "false": False, "0": False, "no": False}
+
+
+def _parse_number(text: str) -> Any:
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _parse_boolean(text: str) -> bool:
+    return _BOOLEANS[text.strip().lower()]
+
+
+def _parse_any(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+# By the type names of core/validators.py
+_CSV_PARSERS = {
+    "integer": int,
+    "number": _parse_number,
+    "boolean": _parse_boolean,
+    "object": json.loads,
+    "array": json.loads,
+    "any": _parse_any,
+}
+
+
+class CSVRowParser:
+    """Turns CSV records into rows typed by an ObjectSchema's column types"""
+
+    def __init__(self, header: List[str], types: Dict[str, str]):
+        self.header = header
+        self.parsers = [_CSV_PARSERS.get(types.get(column, "string")) for column in header]
+
+    def parse(self, record: List[str]) -> Tuple[Optional[Row], Optional[str]]:
+        """A row, or None and an error for a record that cannot be converted"""
+        if len(record) != len(self.header):
+            return None, f"Expected {len(self.header)} fields, got {len(record)}"
+        row = {}
+        for column, parser, text in zip(self.header, self.parsers, record):
+            if text == "":
+                row[column] = None
+            elif parser is None:
+                row[column] = text
+            else:
+                try:
+                    row[column] = parser(text)
+                except (ValueError, KeyError):
+                    return None, f"Field {column} could not be parsed: {text!r}"
+        return row, None
+
+
+class CSVImport:
+    """Rows from the lines of a CSV document, typed by an ObjectSchema's column types.
+
+    A quoted value may span lines, so a record ends at the first line that
+    closes every quote. The first record is the header.
+    """
+
+    def __init__(self, types: Dict[str, str]):
+        self.types = types
+        self.parser: Optional[CSVRowParser] = None
+        self.line_number = 0
+        self._lines: List[str] = []
+        self._start = 0
+        self._quotes = 0
+
+    def feed(self, line: str) -> Optional[Tuple[int, Optional[Row], Optional[str]]]:
+        """Add a line; returns (line number, row, error) once it completes a data record"""
+        self.line_number += 1
+        if not self._lines:
+            self._start = self.line_number
+        self._lines.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return None
+        return self._record()
+
+    def close(self) -> Optional[Tuple[int, Optional[Row], Optional[str]]]:
+        """The last record, if its quotes were never closed"""
+        return self._record() if self._lines else None
+
+    def _record(self) -> Optional[Tuple[int, Optional[Row], Optional[str]]]:
+        text = "\n".join(self._lines)
+        self._lines = []
+        self._quotes = 0
+        if not text.strip():
+            return None
+        try:
+            [record] = csv.reader([text], strict=True)
+        except (csv.Error, ValueError):
+            return self._start, None, "Invalid CSV record"
+        if self.parser is None:
+            header = [column.strip().lstrip("\ufeff") for column in record]
+            self.parser = CSVRowParser(header, self.types)
+            return None
+        row, error = self.parser.parse(record)
+        return self._start, row, error
+
+
+# Columnar snapshot
+
+def _pad(size: int) -> int:
+    return -size % 8
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":  # pragma: no cover
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":  # pragma: no cover
+        values.byteswap()
+    return values
+
+
+def _column_type(values: List[Any]) -> str:
+    if not values:
+        return "null"
+    kinds = {type(value) for value in values}
+    if kinds == {bool}:
+        return "bool"
+    if kinds == {int} and _INT64_MIN <= min(values) and max(values) <= _INT64_MAX:
+        return "int64"
+    if kinds == {float}:
+        return "float64"
+    if kinds == {str}:
+        return "string"
+    return "json"
+
+
+def _text_buffers(texts: List[str]) -> List[bytes]:
+    encoded = [text.encode() for text in texts]
+    offsets = array("q", [0])
+    total = 0
+    for data in encoded:
+        total += len(data)
+        offsets.append(total)
+    return [_little_endian(offsets), b"".join(encoded)]
+
+
+def _encode_column(rows: List[Row], name: str) -> Tuple[str, List[bytes]]:
+    presence = bytearray(len(rows))
+    values = []
+    for i, row in enumerate(rows):
+        if name in row:
+            value = row[name]
+            if value is None:
+                presence[i] = NULL
+            else:
+                presence[i] = PRESENT
+                values.append(value)
+    kind = _column_type(values)
+    if kind == "null":
+        return kind, [bytes(presence)]
+    cells = [row[name] if flag == PRESENT else None for row, flag in zip(rows, presence)]
+    if kind == "bool":
+        return kind, [bytes(presence), bytes(bytearray(1 if cell else 0 for cell in cells))]
+    if kind == "int64":
+        return kind, [bytes(presence), _little_endian(array("q", (cell or 0 for cell in cells)))]
+    if kind == "float64":
+        return kind, [bytes(presence), _little_endian(array("d", (cell or 0.0 for cell in cells)))]
+    if kind == "string":
+        return kind, [bytes(presence), *_text_buffers([cell or "" for cell in cells])]
+    return kind, [bytes(presence), *_text_buffers([json.dumps(cell) if flag == PRESENT else "" for cell, flag in zip(cells, presence)])]
+
+
+def _section(tag: bytes, meta: Dict[str, Any]) -> bytes:
+    data = json.dumps(meta, separators=(",", ":")).encode()
+    header = _SECTION.pack(tag, len(data)) + data
+    return header + b"\0" * _pad(len(header))
+
+
+class SnapshotWriter:
+    """Encodes a snapshot piece by piece: header(), then batch() per batch of rows, then footer()"""
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+        self.offset = 0
+        self.row_count = 0
+        self.batches: List[int] = []
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def header(self) -> bytes:
+        return self._emit(MAGIC)
+
+    def batch(self, rows: List[Row]) -> bytes:
+        columns = []
+        buffers: List[bytes] = []
+        position = 0
+        for name in self.columns:
+            kind, parts = _encode_column(rows, name)
+            spans = []
+            for part in parts:
+                spans.append([position, len(part)])
+                buffers.append(part + b"\0" * _pad(len(part)))
+                position += len(buffers[-1])
+            columns.append({"name": name, "type": kind, "buffers": spans})
+        self.batches.append(self.offset)
+        self.row_count += len(rows)
+        section = _section(BATCH, {"rows": len(rows), "length": position, "columns": columns})
+        return self._emit(section + b"".join(buffers))
+
+    def footer(self) -> bytes:
+        offset = self.offset
+        meta = {"columns": self.columns, "row_count": self.row_count, "batches": self.batches}
+        return self._emit(_section(FOOTER, meta) + _TRAILER.pack(offset, END))
+
+
+def _decode_texts(offsets: array, data) -> List[str]:
+    data = bytes(data)
+    if data.isascii():
+        # Byte offsets are character offsets
+        text = data.decode()
+        return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+    return [data[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)]
+
+
+def _column_values(column: Dict[str, Any], buffers, count: int) -> Tuple[bytes, Sequence[Any]]:
+    """A column's presence flags and its value per row"""
+    name, kind = column["name"], column["type"]
+    spans = [buffers[offset:offset + length] for offset, length in column["buffers"]]
+    presence = bytes(spans[0])
+    if len(presence) != count:
+        raise FormatError(f"Column {name} has {len(presence)} rows, expected {count}")
+    if kind == "null":
+        values: Sequence[Any] = [None] * count
+    elif kind == "bool":
+        values = [flag == 1 for flag in bytes(spans[1])]
+    elif kind == "int64":
+        values = _from_little_endian("q", spans[1])
+    elif kind == "float64":
+        values = _from_little_endian("d", spans[1])
+    elif kind == "string":
+        values = _decode_texts(_from_little_endian("q", spans[1]), spans[2])
+    elif kind == "json":
+        values = [json.loads(text) if text else None for text in _decode_texts(_from_little_endian("q", spans[1]), spans[2])]
+    else:
+        raise FormatError(f"Unknown column type {kind}")
+    if len(values) != count:
+        raise FormatError(f"Column {name} has {len(values)} values, expected {count}")
+    return presence, values
+
+
+# Ways a batch's meta and buffers can fail to match, reported as a FormatError
+_DECODE_ERRORS = (KeyError, TypeError, ValueError, IndexError, struct.error)
+
+
+def decode_batch(meta: Dict[str, Any], buffers) -> List[Row]:
+    """Rows of a batch, given its meta and a buffer (or memoryview) of its buffers"""
+    count = meta["rows"]
+    try:
+        columns = [(column["name"], *_column_values(column, buffers, count)) for column in meta["columns"]]
+    except FormatError:
+        raise
+    except _DECODE_ERRORS as e:
+        raise FormatError(f"Corrupt columnar snapshot batch: {e!r}") from e
+    if columns and all(presence.count(PRESENT) == count for _, presence, _ in columns):
+        # Every row has a value in every column, the common case
+        names = [name for name, _, _ in columns]
+        return [dict(zip(names, row)) for row in zip(*(values for _, _, values in columns))]
+    rows: List[Row] = [{} for _ in range(count)]
+    for name, presence, values in columns:
+        for i, flag in enumerate(presence):
+            if flag == PRESENT:
+                rows[i][name] = values[i]
+            elif flag == NULL:
+                rows[i][name] = None
+    return rows
+
+
+def decode_column(meta: Dict[str, Any], buffers, name: str) -> List[Any]:
+    """One column of a batch without decoding the others; None where a row lacks it or holds null"""
+    count = meta["rows"]
+    try:
+        for column in meta["columns"]:
+            if column["name"] == name:
+                presence, values = _column_values(column, buffers, count)
+                return [value if flag == PRESENT else None for flag, value in zip(presence, values)]
+    except FormatError:
+        raise
+    except _DECODE_ERRORS as e:
+        raise FormatError(f"Corrupt columnar snapshot batch: {e!r}") from e
+    return [None] * count
+
+
+def _read_section(buffer, offset: int) -> Tuple[bytes, Dict[str, Any], int]:
+    """A section's tag, meta and the offset of its first buffer"""
+    try:
+        tag, size = _SECTION.unpack_from(buffer, offset)
+    except struct.error:
+        raise FormatError("Truncated columnar snapshot")
+    start = offset + _SECTION.size
+    try:
+        meta = json.loads(bytes(buffer[start:start + size]))
+    except ValueError:
+        raise FormatError("Corrupt section metadata")
+    if not isinstance(meta, dict):
+        raise FormatError("Corrupt section metadata")
+    end = start + size
+    return tag, meta, end + _pad(end)
+
+
+def _is_count(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _check_batch(meta: Dict[str, Any]) -> Dict[str, Any]:
+    if not (_is_count(meta.get("rows")) and _is_count(meta.get("length")) and isinstance(meta.get("columns"), list)):
+        raise FormatError("Corrupt columnar snapshot batch")
+    return meta
+
+
+def _check_footer(meta: Dict[str, Any]) -> Dict[str, Any]:
+    columns, batches = meta.get("columns"), meta.get("batches")
+    if not (
+        isinstance(columns, list) and all(isinstance(name, str) for name in columns)
+        and _is_count(meta.get("row_count"))
+        and isinstance(batches, list) and all(_is_count(offset) for offset in batches)
+    ):
+        raise FormatError("Corrupt columnar snapshot footer")
+    return meta
+
+
+class SnapshotReader:
+    """Random access to the batches of a complete snapshot, e.g. a mapped file"""
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        if bytes(self.buffer[:len(MAGIC)]) != MAGIC or len(self.buffer) < len(MAGIC) + _TRAILER.size:
+            raise FormatError("Not a columnar snapshot")
+        offset, end = _TRAILER.unpack_from(self.buffer, len(self.buffer) - _TRAILER.size)
+        if end != END:
+            raise FormatError("Truncated columnar snapshot")
+        tag, self.meta, _ = _read_section(self.buffer, offset)
+        if tag != FOOTER:
+            raise FormatError("Corrupt columnar snapshot footer")
+        _check_footer(self.meta)
+        self.columns: List[str] = self.meta["columns"]
+        self.row_count: int = self.meta["row_count"]
+
+    def __len__(self) -> int:
+        return len(self.meta["batches"])
+
+    def _batch(self, index: int) -> Tuple[Dict[str, Any], memoryview]:
+        tag, meta, start = _read_section(self.buffer, self.meta["batches"][index])
+        if tag != BATCH:
+            raise FormatError("Corrupt columnar snapshot batch")
+        _check_batch(meta)
+        return meta, self.buffer[start:start + meta["length"]]
+
+    def batch_rows(self, index: int) -> int:
+        """The number of rows in a batch, without decoding it"""
+        return self._batch(index)[0]["rows"]
+
+    def batch(self, index: int) -> List[Row]:
+        return decode_batch(*self._batch(index))
+
+    def column(self, index: int, name: str) -> List[Any]:
+        """One column of a batch (see decode_column)"""
+        return decode_column(*self._batch(index), name)
+
+    def release(self) -> None:
+        """Stop using the buffer, e.g. so a mapped file can be closed"""
+        self.buffer.release()
+
+    def __iter__(self) -> Iterator[List[Row]]:
+        for index in range(len(self)):
+            yield self.batch(index)
+
+
+class SnapshotParser:
+    """Incremental decoding of a snapshot as it arrives, e.g. from a request body.
+
+    feed() returns the batches completed by a piece of data; close() checks
+    that the footer arrived.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._started = False
+        self.finished = False
+
+    def feed(self, data: bytes) -> List[List[Row]]:
+        self._buffer += data
+        if self.finished:
+            return []
+        if not self._started:
+            if len(self._buffer) < len(MAGIC):
+                return []
+            if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+                raise FormatError("Not a columnar snapshot")
+            del self._buffer[:len(MAGIC)]
+            self._started = True
+        batches = []
+        while len(self._buffer) >= _SECTION.size:
+            tag, size = _SECTION.unpack_from(self._buffer, 0)
+            if tag == FOOTER:
+                self.finished = True
+                break
+            if tag != BATCH:
+                raise FormatError("Corrupt columnar snapshot batch")
+            header = _SECTION.size + size
+            header += _pad(header)
+            if len(self._buffer) < header:
+                break
+            _, meta, start = _read_section(self._buffer, 0)
+            _check_batch(meta)
+            if len(self._buffer) < start + meta["length"]:
+                break
+            view = memoryview(self._buffer)
+            try:
+                batches.append(decode_batch(meta, view[start:start + meta["length"]]))
+            finally:
+                view.release()
+            del self._buffer[:start + meta["length"]]
+        return batches
+
+    def close(self) -> None:
+        if not self.finished or len(self._buffer) < _SECTION.size:
+            raise FormatError("Truncated columnar snapshot")
+        _, size = _SECTION.unpack_from(self._buffer, 0)
+        footer = _SECTION.size + size
+        if len(self._buffer) != footer + _pad(footer) + _TRAILER.size or not self._buffer.endswith(END):
+            raise FormatError("Truncated columnar snapshot")
@@ -0,0 +1,166 @@
+"""Compiled row validators for ObjectSchema attributes.
+
+An ObjectSchema's attributes map each field either to a type name
+("string", "integer", ...) or to an example value whose Python type is used
+instead, e.g. {"sku": "PROD-XXX", "price": 0.00}. A string naming one of the
+types below or a common alias of one ("decimal", "varchar(20)") is read as a
+type name; any other string, e.g. "Gold", is an example string. Compiling the attributes once
+turns them into per-column checks that are applied to a batch of rows column by
+column. Compiled validators are cached by (object_id, updated_at), so any write
+to an ObjectSchema must bump its updated_at.
+"""
+import re
+from collections import OrderedDict
+from datetime import date, datetime
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..models.object_schema import ObjectSchema
+
+Row = Dict[str, Any]
+
+VALIDATOR_CACHE_SIZE = 256
+
+
+def _is_integer(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_datetime(value: Any) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_date(value: Any) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+TYPE_CHECKS: Dict[str, Optional[Callable[[Any], bool]]] = {
+    "string": lambda value: isinstance(value, str),
+    "integer": _is_integer,
+    "number": _is_number,
+    "boolean": lambda value: isinstance(value, bool),
+    "datetime": _is_datetime,
+    "date": _is_date,
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "any": None,
+}
+
+# Other spellings of the type names, e.g. from SQL or Python
+TYPE_ALIASES = {
+    "str": "string", "text": "string", "varchar": "string", "char": "string", "uuid": "string",
+    "int": "integer", "long": "integer", "bigint": "integer", "smallint": "integer",
+    "float": "number", "double": "number", "decimal": "number", "numeric": "number", "real": "number",
+    "bool": "boolean",
+    "timestamp": "datetime",
+    "dict": "object", "map": "object",
+    "list": "array",
+    "json": "any",
+}
+
+# A word with an optional size, such as "decimal" or "varchar(20)"; only known ones name a type
+_TYPE_NAME = re.compile(r"[a-z][a-z0-9_]*(\(.*\))?")
+
+
+def _type_name(spec: Any) -> str:
+    """Resolve an attribute spec (type name or example value) to a type name"""
+    if isinstance(spec, str):
+        name = spec.strip().lower()
+        if _TYPE_NAME.fullmatch(name):
+            name = name.partition("(")[0]
+            name = TYPE_ALIASES.get(name, name)
+            if name in TYPE_CHECKS:
+                return name
+        return "string"  # An example value such as "PROD-XXX" or "Gold"
+    if isinstance(spec, bool):
+        return "boolean"
+    if isinstance(spec, int):
+        return "integer"
+    if isinstance(spec, float):
+        return "number"
+    if isinstance(spec, dict):
+        return "object"
+    if isinstance(spec, list):
+        return "array"
+    return "any"
+
+
+class RowValidator:
+    """Validates rows against a fixed set of fields and value types.
+
+    Fields are optional and null values are accepted for every type; a row
+    fails if it has a field the schema does not define or a value of the wrong type.
+    """
+
+    def __init__(self, attributes: Dict[str, Any]):
+        self.fields = frozenset(attributes)
+        self.types = {field: _type_name(spec) for field, spec in attributes.items()}
+        self._checks = [
+            (field, type_name, TYPE_CHECKS[type_name])
+            for field, type_name in self.types.items()
+            if TYPE_CHECKS[type_name] is not None
+        ]
+
+    def errors(self, rows: List[Row]) -> Dict[int, str]:
+        """Return the first error for each invalid row, keyed by row index"""
+        errors: Dict[int, str] = {}
+        fields = self.fields
+        for i, row in enumerate(rows):
+            extra_fields = row.keys() - fields
+            if extra_fields:
+                errors[i] = f"Extra fields found in data: {extra_fields}"
+
+        for field, type_name, check in self._checks:
+            column = [row.get(field) for row in rows]
+            for i, value in enumerate(column):
+                if value is not None and not check(value) and i not in errors:
+                    errors[i] = f"Field {field} expected {type_name}, got {type(value).__name__}"
+        return errors
+
+    def first_error(self, rows: List[Row]) -> Optional[Tuple[int, str]]:
+        errors = self.errors(rows)
+        if not errors:
+            return None
+        index = min(errors)
+        return index, errors[index]
+
+
+_cache: "OrderedDict[Tuple[int, datetime], RowValidator]" = OrderedDict()
+_cache_lock = Lock()
+
+
+def compile_validator(attributes: Dict[str, Any]) -> RowValidator:
+    return RowValidator(attributes)
+
+
+def get_validator(object_schema: ObjectSchema) -> RowValidator:
+    """Return the compiled validator for an object schema, compiling it on first use"""
+    key = (object_schema.id, object_schema.updated_at)
+    with _cache_lock:
+        validator = _cache.get(key)
+        if validator is not None:
+            _cache.move_to_end(key)
+            return validator
+
+    validator = compile_validator(object_schema.attributes)
+    with _cache_lock:
+        _cache[key] = validator
+        while len(_cache) > VALIDATOR_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return validator
@@ -0,0 +1,112 @@
+"""Reverse index from tables, objects and functions to the test cases using them.
+
+A test case depends on its function, on its input and expected output
+tables, and on the object schemas of those tables and of the function's
+inputs and outputs. The index is rewritten for a test case whenever it is
+created, and for a function's or table's dependents whenever that function's
+schemas or that table's object change, so finding the test cases affected by
+a change is one indexed query rather than a scan of every test case's JSON
+table maps. None of these functions commit; callers own the transaction.
+
+Like table_rows, these take a sync Session; async callers use run_sync.
+"""
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy import or_
+from sqlmodel import Session, select, delete
+
+from ..models.function_def import FunctionDef
+from ..models.table_data import TableData
+from ..models.test_case import TestCase
+from ..models.test_case_dependency import (
+    TestCaseDependency, DEPENDS_ON_TABLE, DEPENDS_ON_OBJECT, DEPENDS_ON_FUNCTION,
+)
+
+# Test cases re-indexed per batch when rebuilding the whole index
+REBUILD_BATCH_SIZE = 500
+
+
+def _dependencies(test_case: TestCase, tables: Dict[int, TableData], functions: Dict[int, FunctionDef]) -> Set[tuple]:
+    table_ids = {*test_case.input_tables.values(), *test_case.expected_output_tables.values()}
+    deps = {(DEPENDS_ON_FUNCTION, test_case.function_id)}
+    deps.update((DEPENDS_ON_TABLE, table_id) for table_id in table_ids)
+    deps.update((DEPENDS_ON_OBJECT, tables[table_id].object_id) for table_id in table_ids if table_id in tables)
+    function = functions.get(test_case.function_id)
+    if function is not None:
+        deps.update((DEPENDS_ON_OBJECT, object_id) for object_id in function.input_schemas.values())
+        deps.update((DEPENDS_ON_OBJECT, object_id) for object_id in function.output_schemas.values())
+    return deps
+
+
+def _load(session: Session, model, ids: Iterable[int]) -> dict:
+    ids = set(ids)
+    if not ids:
+        return {}
+    return {row.id: row for row in session.exec(select(model).where(model.id.in_(ids)))}
+
+
+def index_test_cases(session: Session, test_cases: List[TestCase]) -> None:
+    """(Re)write the index entries of the given test cases. They must already have ids (flush first)."""
+    if not test_cases:
+        return
+    tables = _load(session, TableData, (
+        table_id
+        for test_case in test_cases
+        for table_id in [*test_case.input_tables.values(), *test_case.expected_output_tables.values()]
+    ))
+    functions = _load(session, FunctionDef, (test_case.function_id for test_case in test_cases))
+    session.exec(delete(TestCaseDependency).where(
+        TestCaseDependency.test_case_id.in_([test_case.id for test_case in test_cases])
+    ))
+    session.add_all(
+        TestCaseDependency(test_case_id=test_case.id, kind=kind, ref_id=ref_id)
+        for test_case in test_cases
+        for kind, ref_id in _dependencies(test_case, tables, functions)
+    )
+
+
+def unindex_test_case(session: Session, test_case_id: int) -> None:
+    session.exec(delete(TestCaseDependency).where(TestCaseDependency.test_case_id == test_case_id))
+
+
+def dependents(
+    session: Session,
+    tables: Iterable[int] = (),
+    objects: Iterable[int] = (),
+    functions: Iterable[int] = (),
+) -> Set[int]:
+    """Ids of the test cases depending on any of the given tables, objects or functions"""
+    conditions = [
+        (TestCaseDependency.kind == kind) & TestCaseDependency.ref_id.in_(ids)
+        for kind, ids in ((DEPENDS_ON_TABLE, set(tables)), (DEPENDS_ON_OBJECT, set(objects)), (DEPENDS_ON_FUNCTION, set(functions)))
+        if ids
+    ]
+    if not conditions:
+        return set()
+    query = select(TestCaseDependency.test_case_id).where(or_(*conditions)).distinct()
+    return set(session.exec(query))
+
+
+def reindex_dependents(session: Session, tables: Iterable[int] = (), functions: Iterable[int] = ()) -> None:
+    """Re-index the test cases of tables or functions whose references changed"""
+    test_case_ids = dependents(session, tables=tables, functions=functions)
+    index_test_cases(session, list(_load(session, TestCase, test_case_ids).values()))
+
+
+def rebuild_index(session: Session) -> None:
+    """Index every test case"""
+    last_id = 0
+    while True:
+        test_cases = session.exec(
+            select(TestCase).where(TestCase.id > last_id).order_by(TestCase.id).limit(REBUILD_BATCH_SIZE)
+        ).all()
+        if not test_cases:
+            return
+        index_test_cases(session, test_cases)
+        last_id = test_cases[-1].id
+
+
+def ensure_index(session: Session) -> None:
+    """Build the index of a database whose test cases were created before it existed"""
+    if session.exec(select(TestCaseDependency.id).limit(1)).first() is None:
+        rebuild_index(session)
@@ -0,0 +1,212 @@
+"""In-process cache of small, hot metadata rows: ObjectSchemas, FunctionDefs and TableData headers.
+
+Write endpoints look these up to validate every request (a table write needs
+its ObjectSchema, a test case write its FunctionDef and table headers), yet
+they rarely change. The cache holds detached copies of them in an LRU with a
+time-to-live, so most validations need no query at all. Cached rows are
+shared between requests and must be treated as read-only; endpoints that
+modify a row still load it through their session.
+
+Entries are invalidated by SQLAlchemy session hooks whenever a cached model is
+inserted, updated or deleted through the ORM, at flush and again after
+commit (so a concurrent miss cannot re-cache the pre-commit row). Row writes
+in crud/table_rows.py bump their TableData's updated_at through the ORM, so
+they are covered too. Other processes serving the same database (e.g. several
+uvicorn workers) are told about invalidations through a local broadcast
+channel when settings.metadata_cache_broadcast_dir is set; otherwise their
+copies expire after the TTL.
+"""
+import copy
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..core.config import settings
+from ..models.function_def import FunctionDef
+from ..models.object_schema import ObjectSchema
+from ..models.table_data import TableData
+from .references import resolve
+
+M = TypeVar("M", bound=SQLModel)
+Key = Tuple[str, int]
+
+CACHED_MODELS: Tuple[Type[SQLModel], ...] = (ObjectSchema, FunctionDef, TableData)
+_CACHED_TABLES = {model.__tablename__ for model in CACHED_MODELS}
+
+# Key under Session.info collecting keys invalidated by a transaction's flushes
+_PENDING_INVALIDATIONS = "metadata_cache_invalidations"
+
+
+class InvalidationChannel:
+    """Broadcast of invalidated keys between processes on one host, over Unix datagram sockets.
+
+    Every process binds a socket in a shared directory and sends invalidations
+    to all the other sockets there; sockets whose process is gone are removed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.path = self.directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        self._socket: Optional[socket.socket] = None
+
+    def start(self, on_message) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(str(self.path))
+        threading.Thread(target=self._receive, args=(self._socket, on_message), name="metadata-cache", daemon=True).start()
+
+    def _receive(self, sock: socket.socket, on_message) -> None:
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                return  # Closed
+            try:
+                on_message([tuple(key) for key in json.loads(data)])
+            except ValueError:
+                pass
+
+    def publish(self, keys: List[Key]) -> None:
+        if self._socket is None or not keys:
+            return
+        data = json.dumps(keys).encode()
+        for path in self.directory.glob("*.sock"):
+            if path == self.path:
+                continue
+            try:
+                self._socket.sendto(data, str(path))
+            except (ConnectionRefusedError, FileNotFoundError):
+                path.unlink(missing_ok=True)  # Its process has exited
+            except OSError:
+                pass  # Receiver busy; its copy expires after the TTL
+
+    def close(self) -> None:
+        sock, self._socket = self._socket, None
+        if sock is not None:
+            sock.close()
+            self.path.unlink(missing_ok=True)
+
+
+class MetadataCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.channel: Optional[InvalidationChannel] = None
+        self._entries: "OrderedDict[Key, Tuple[float, SQLModel]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get_many(self, session: AsyncSession, model: Type[M], ids: Iterable[int]) -> Dict[int, M]:
+        """Like resolve(): the rows of model with the given ids, keyed by id, querying only for misses"""
+        found: Dict[int, M] = {}
+        missing = set()
+        now = time.monotonic()
+        with self._lock:
+            for id in set(ids):
+                key = (model.__tablename__, id)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[id] = entry[1]
+                    self.hits += 1
+                else:
+                    missing.add(id)
+                    self.misses += 1
+        if missing:
+            rows = await resolve(session, model, missing)
+            with self._lock:
+                for id, row in rows.items():
+                    found[id] = self._put((model.__tablename__, id), row, now)
+        return found
+
+    async def get(self, session: AsyncSession, model: Type[M], id: int) -> Optional[M]:
+        return (await self.get_many(session, model, [id])).get(id)
+
+    def _put(self, key: Key, row: SQLModel, now: float) -> SQLModel:
+        detached = type(row)(**copy.deepcopy(row.dict()))
+        self._entries[key] = (now + self.ttl, detached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return detached
+
+    def invalidate(self, keys: Iterable[Key], broadcast: bool = True) -> None:
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+        if broadcast and self.channel is not None:
+            self.channel.publish(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def start_broadcast(self, directory: str) -> None:
+        """Share invalidations with the other processes using the same directory"""
+        self.channel = InvalidationChannel(directory)
+        self.channel.start(lambda keys: self.invalidate(keys, broadcast=False))
+
+    def stop_broadcast(self) -> None:
+        channel, self.channel = self.channel, None
+        if channel is not None:
+            channel.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "broadcast": self.channel is not None,
+            }
+
+
+metadata_cache = MetadataCache(settings.metadata_cache_size, settings.metadata_cache_ttl)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed(session: Session, flush_context) -> None:
+    keys = [
+        (row.__tablename__, row.id)
+        for row in (*session.new, *session.dirty, *session.deleted)
+        if getattr(row, "__tablename__", None) in _CACHED_TABLES and row.id is not None
+    ]
+    if keys:
+        metadata_cache.invalidate(keys, broadcast=False)
+        session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    keys = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if keys:
+        metadata_cache.invalidate(keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING_INVALIDATIONS, None)
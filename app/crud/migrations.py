@@ -0,0 +1,73 @@
+"""Startup upgrades for databases created by earlier versions of the schema.
+
+SQLModel.metadata.create_all only creates missing tables, so columns added to
+an existing table need upgrading here. Each upgrade checks the live schema
+first, runs in one transaction and is a no-op once applied.
+"""
+from typing import List
+
+from sqlalchemy import JSON, inspect, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from ..models.object_schema import ObjectSchema
+from ..models.table_data import TableData, DEFAULT_CHUNK_SIZE
+from . import table_rows
+
+
+def add_comparison_columns(engine: Engine) -> int:
+    """Add objects.key_columns and objects.tolerances; existing objects keep comparing whole rows exactly.
+
+    Returns the number of columns added.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(ObjectSchema.__tablename__)}
+    objects = engine.dialect.identifier_preparer.quote(ObjectSchema.__tablename__)
+    added = [
+        ("key_columns", "key_columns JSON NOT NULL DEFAULT '[]'"),
+        ("tolerances", "tolerances JSON NOT NULL DEFAULT '{}'"),
+    ]
+    missing = [definition for name, definition in added if name not in existing]
+    if missing:
+        with Session(engine) as session:
+            for definition in missing:
+                session.execute(text(f"ALTER TABLE {objects} ADD COLUMN {definition}"))
+            session.commit()
+    return len(missing)
+
+
+def migrate_inline_rows(engine: Engine) -> int:
+    """Move rows from the old tables.data JSON column into table_chunks, then drop the column.
+
+    Returns the number of tables whose rows were moved. table_chunks must
+    already exist (create_all runs first).
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(TableData.__tablename__)}
+    if "data" not in existing:
+        return 0
+    quote = engine.dialect.identifier_preparer.quote
+    tables = quote(TableData.__tablename__)
+    added = [
+        ("row_count", "row_count INTEGER NOT NULL DEFAULT 0"),
+        ("columns", f"{quote('columns')} JSON"),
+        ("chunk_size", f"chunk_size INTEGER NOT NULL DEFAULT {DEFAULT_CHUNK_SIZE}"),
+    ]
+    with Session(engine) as session:
+        for name, definition in added:
+            if name not in existing:
+                session.execute(text(f"ALTER TABLE {tables} ADD COLUMN {definition}"))
+        ids: List[int] = list(session.execute(text(f"SELECT id FROM {tables} ORDER BY id")).scalars())
+        old_rows = text(f"SELECT data FROM {tables} WHERE id = :id").columns(data=JSON)
+        for id in ids:
+            # One table's rows in memory at a time
+            rows = session.execute(old_rows, {"id": id}).scalar_one()
+            table = session.get(TableData, id)
+            table.columns = []
+            updated_at = table.updated_at
+            table_rows.replace_rows(session, table, rows or [])
+            # Moving rows does not make a new version of the table
+            table.updated_at = updated_at
+            session.flush()
+            session.expunge(table)
+        session.execute(text(f"ALTER TABLE {tables} DROP COLUMN data"))
+        session.commit()
+    return len(ids)
@@ -0,0 +1,31 @@
+"""Batched resolution of foreign references.
+
+Routers collect every id they need to check up front and resolve them with
+one `IN` query per model, instead of one `session.get` per reference, so a
+create or bulk create runs a constant number of queries however many
+references it carries.
+"""
+from typing import Dict, Iterable, Set, Type, TypeVar
+
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+M = TypeVar("M", bound=SQLModel)
+
+
+async def resolve(session: AsyncSession, model: Type[M], ids: Iterable[int]) -> Dict[int, M]:
+    """Load the rows of model with the given ids, keyed by id; missing ids are simply absent"""
+    ids = set(ids)
+    if not ids:
+        return {}
+    rows = (await session.exec(select(model).where(model.id.in_(ids)))).all()
+    return {row.id: row for row in rows}
+
+
+async def existing_ids(session: AsyncSession, model: Type[SQLModel], ids: Iterable[int]) -> Set[int]:
+    """Return which of the given ids exist, selecting only the primary key"""
+    ids = set(ids)
+    if not ids:
+        return set()
+    return set((await session.exec(select(model.id).where(model.id.in_(ids)))).all())
+
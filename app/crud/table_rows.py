@@ -0,0 +1,181 @@
+"""Chunked row storage for TableData.
+
+Rows are stored in fixed-size chunks (TableChunk) keyed by (table_id, chunk_index),
+so reading, appending or updating a range of rows only touches the chunks that
+cover that range. None of these functions commit; callers own the transaction.
+Every write bumps table.updated_at, so (id, updated_at) identifies a version of
+a table's rows.
+
+The write helpers take a sync Session; async callers run them with
+AsyncSession.run_sync so the same code serves both.
+"""
+from datetime import datetime
+from typing import Dict, Any, List, Iterable, Iterator, AsyncIterator, Optional
+from sqlmodel import Session, select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.table_chunk import TableChunk
+from ..models.table_data import TableData, TableDataRead
+
+Row = Dict[str, Any]
+
+# Number of chunks fetched per database round-trip when streaming rows
+CHUNK_FETCH_SIZE = 4
+
+
+def _chunk_query(table: TableData, first: int, last: int, *columns):
+    return (
+        select(*(columns or (TableChunk,)))
+        .where(TableChunk.table_id == table.id)
+        .where(TableChunk.chunk_index >= first)
+        .where(TableChunk.chunk_index <= last)
+        .order_by(TableChunk.chunk_index)
+    )
+
+
+def _merge_columns(columns: List[str], rows: Iterable[Row]) -> List[str]:
+    """Return columns extended with any new field names found in rows, keeping first-seen order."""
+    merged = list(columns)
+    seen = set(merged)
+    for row in rows:
+        if row.keys() - seen:
+            for key in row:
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(key)
+    return merged
+
+
+def _write_chunks(session: Session, table: TableData, rows: Iterable[Row], first_index: int) -> int:
+    """Write rows into new chunks starting at first_index. Returns the number of rows written."""
+    written = 0
+    chunk_index = first_index
+    batch: List[Row] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == table.chunk_size:
+            session.add(TableChunk(table_id=table.id, chunk_index=chunk_index, row_count=len(batch), rows=batch))
+            table.columns = _merge_columns(table.columns, batch)
+            written += len(batch)
+            chunk_index += 1
+            batch = []
+    if batch:
+        session.add(TableChunk(table_id=table.id, chunk_index=chunk_index, row_count=len(batch), rows=batch))
+        table.columns = _merge_columns(table.columns, batch)
+        written += len(batch)
+    return written
+
+
+def _row_batch_query(table: TableData, start: int, stop: Optional[int]):
+    """Clamp a row range and build the query for the chunks covering it, or None if empty."""
+    stop = table.row_count if stop is None else min(stop, table.row_count)
+    start = max(start, 0)
+    if start >= stop:
+        return None, start, stop
+    size = table.chunk_size
+    query = _chunk_query(
+        table, start // size, (stop - 1) // size, TableChunk.chunk_index, TableChunk.rows
+    ).execution_options(yield_per=CHUNK_FETCH_SIZE)
+    return query, start, stop
+
+
+def iter_row_batches(session: Session, table: TableData, start: int = 0, stop: Optional[int] = None) -> Iterator[List[Row]]:
+    """Yield rows[start:stop] of a table one chunk at a time.
+
+    Chunks are fetched from the database incrementally as plain column tuples
+    (not ORM objects held by the session), so only a few are resident at once
+    no matter how large the range is.
+    """
+    query, start, stop = _row_batch_query(table, start, stop)
+    if query is None:
+        return
+    for chunk_index, rows in session.exec(query):
+        offset = chunk_index * table.chunk_size
+        yield rows[max(start - offset, 0):stop - offset]
+
+
+async def aiter_row_batches(session: AsyncSession, table: TableData, start: int = 0, stop: Optional[int] = None) -> AsyncIterator[List[Row]]:
+    """Async counterpart of iter_row_batches, streaming chunks through an AsyncSession."""
+    query, start, stop = _row_batch_query(table, start, stop)
+    if query is None:
+        return
+    result = await session.stream(query)
+    async for chunk_index, rows in result:
+        offset = chunk_index * table.chunk_size
+        yield rows[max(start - offset, 0):stop - offset]
+
+
+def iter_rows(session: Session, table: TableData, start: int = 0, stop: Optional[int] = None) -> Iterator[Row]:
+    """Yield rows[start:stop] of a table, loading only the chunks that cover the range."""
+    for batch in iter_row_batches(session, table, start, stop):
+        yield from batch
+
+
+def read_rows(session: Session, table: TableData, start: int = 0, stop: Optional[int] = None) -> List[Row]:
+    return list(iter_rows(session, table, start, stop))
+
+
+def replace_rows(session: Session, table: TableData, rows: Iterable[Row]) -> None:
+    """Replace every row of a table. The table must already have an id (flush first)."""
+    delete_rows(session, table)
+    table.row_count = _write_chunks(session, table, rows, 0)
+    table.updated_at = datetime.utcnow()
+    session.add(table)
+
+
+def append_rows(session: Session, table: TableData, rows: List[Row]) -> None:
+    """Append rows, topping up the last partial chunk before creating new ones."""
+    if not rows:
+        return
+    size = table.chunk_size
+    remaining = rows
+    if table.row_count % size:
+        last = session.exec(_chunk_query(table, table.row_count // size, table.row_count // size)).one()
+        free = size - last.row_count
+        # JSON columns do not track in-place mutation, so assign a new list
+        last.rows = last.rows + remaining[:free]
+        table.columns = _merge_columns(table.columns, remaining[:free])
+        last.row_count = len(last.rows)
+        session.add(last)
+        remaining = remaining[free:]
+    next_index = (table.row_count + size - 1) // size
+    _write_chunks(session, table, remaining, next_index)
+    table.row_count += len(rows)
+    table.updated_at = datetime.utcnow()
+    session.add(table)
+
+
+def update_rows(session: Session, table: TableData, start: int, rows: List[Row]) -> None:
+    """Overwrite rows[start:start + len(rows)] in place."""
+    if start < 0 or start + len(rows) > table.row_count:
+        raise IndexError(f"Row range {start}:{start + len(rows)} is out of bounds for {table.row_count} rows")
+    if not rows:
+        return
+    size = table.chunk_size
+    stop = start + len(rows)
+    for chunk in session.exec(_chunk_query(table, start // size, (stop - 1) // size)):
+        offset = chunk.chunk_index * size
+        lo = max(start - offset, 0)
+        hi = min(stop - offset, chunk.row_count)
+        new_rows = list(chunk.rows)
+        new_rows[lo:hi] = rows[offset + lo - start:offset + hi - start]
+        chunk.rows = new_rows
+        session.add(chunk)
+    # Columns only ever grow here; replace_rows recomputes them exactly
+    table.columns = _merge_columns(table.columns, rows)
+    table.updated_at = datetime.utcnow()
+    session.add(table)
+
+
+def delete_rows(session: Session, table: TableData) -> None:
+    session.exec(delete(TableChunk).where(TableChunk.table_id == table.id))
+    table.row_count = 0
+    table.columns = []
+
+
+def to_read_model(session: Session, table: TableData, rows: Optional[List[Row]] = None) -> TableDataRead:
+    """Build the API representation of a table, loading its rows unless they are given."""
+    if rows is None:
+        rows = read_rows(session, table)
+    # Rows come from storage or were validated on the way in
+    return TableDataRead.construct(**table.dict(include=set(TableDataRead.__fields__)), data=rows)
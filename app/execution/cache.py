@@ -0,0 +1,95 @@
+"""Content-addressed cache of test run results.
+
+A run's outcome is fully determined by the submission code, the versions of
+the tables it reads and compares against, and the test case parameters, so a
+hash of those identifies the result. Table versions are their updated_at,
+which every row write bumps. The expected tables' ObjectSchemas are included
+by version too, since their comparison settings affect the outcome. Only
+passed and failed outcomes are cached; errors and timeouts may be transient
+and are always re-run.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from ..core.config import settings
+from ..models.object_schema import ObjectSchema
+from ..models.table_data import TableData
+from ..models.test_case import TestCase
+
+
+def result_key(
+    code: str, test_case: TestCase, tables: Dict[int, TableData], schemas: Dict[int, ObjectSchema]
+) -> Optional[str]:
+    """Hash everything a run's outcome depends on, or None if a referenced table or schema is missing.
+
+    schemas must hold the ObjectSchemas of the expected output tables, whose
+    key columns and tolerances decide how outputs are compared.
+    """
+    versions = {}
+    for kind, table_ids in (("input", test_case.input_tables), ("expected", test_case.expected_output_tables)):
+        for name, table_id in table_ids.items():
+            table = tables.get(table_id)
+            if table is None:
+                return None
+            versions[f"{kind}:{name}"] = [table.id, table.updated_at.isoformat()]
+            if kind == "expected":
+                schema = schemas.get(table.object_id)
+                if schema is None:
+                    return None
+                versions[f"schema:{name}"] = [schema.id, schema.updated_at.isoformat()]
+    digest = hashlib.sha256(code.encode())
+    digest.update(json.dumps([versions, test_case.parameters], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU of run outcomes, with hit and miss counters"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, outcome: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = outcome
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache(settings.execution_result_cache_size)
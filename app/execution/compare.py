@@ -0,0 +1,185 @@
+"""Order-insensitive comparison of actual output rows against expected rows.
+
+Rows are matched as multisets with a hash join: the actual rows (already in
+memory, since the submission returned them) are indexed by a hash of their
+match key, and the expected rows are streamed past that index once, so the
+comparison is linear in the number of rows. Matches are confirmed on the row
+values themselves, so hash collisions never produce false matches.
+
+- Without key columns, rows match when every column is equal, allowing
+  numeric columns listed in tolerances to differ by up to their tolerance.
+  A row that does not match is reported as missing or unexpected.
+- With key columns, rows pair up by key and a pair whose other columns
+  differ is reported as changed, with the differing columns.
+
+Absent fields compare equal to None. When there are more actual rows than
+partition_rows, the join runs in several passes over hash partitions
+(re-streaming the expected rows each pass), so the index never holds more
+than about partition_rows entries. Only counts and a bounded sample of each
+kind of difference are kept. An optional progress callback is told how many
+expected rows have been streamed every progress_rows rows.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Row = Dict[str, Any]
+
+PARTITION_ROWS = 250_000
+MAX_DIFF_SAMPLES = 20
+PROGRESS_ROWS = 100_000
+
+
+def _freeze(value: Any) -> Any:
+    """Make a JSON value hashable"""
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class RowComparator:
+    def __init__(self, key_columns: Sequence[str] = (), tolerances: Optional[Dict[str, float]] = None):
+        self.key_columns = tuple(key_columns)
+        self.tolerances = dict(tolerances or {})
+
+    def match_key(self, row: Row) -> Any:
+        """The part of a row that must be exactly equal for two rows to pair up"""
+        if self.key_columns:
+            return tuple(_freeze(row.get(column)) for column in self.key_columns)
+        if not self.tolerances and None not in row.values():
+            try:
+                return frozenset(row.items())  # Fast path for flat rows
+            except TypeError:
+                pass  # Nested lists or objects
+        return frozenset(
+            (column, _freeze(value))
+            for column, value in row.items()
+            if value is not None and column not in self.tolerances
+        )
+
+    def values_equal(self, column: str, expected: Any, actual: Any) -> bool:
+        tolerance = self.tolerances.get(column)
+        if tolerance is not None and _is_number(expected) and _is_number(actual):
+            return abs(expected - actual) <= tolerance
+        return expected == actual
+
+    def changed_columns(self, expected: Row, actual: Row) -> Dict[str, Dict[str, Any]]:
+        changed = {}
+        for column in expected.keys() | actual.keys():
+            if not self.values_equal(column, expected.get(column), actual.get(column)):
+                changed[column] = {"expected": expected.get(column), "actual": actual.get(column)}
+        return changed
+
+    def compare(
+        self,
+        actual: List[Row],
+        expected: Callable[[], Iterable[Row]],
+        partition_rows: int = PARTITION_ROWS,
+        max_samples: int = MAX_DIFF_SAMPLES,
+        progress: Optional[Callable[[int], None]] = None,
+        progress_rows: int = PROGRESS_ROWS,
+    ) -> Optional[Dict[str, Any]]:
+        """Compare actual rows with the rows produced by expected(); None if they match.
+
+        expected is called once per partition, so it must return a fresh iterable each time.
+        """
+        counts = {"matched": 0, "missing": 0, "unexpected": 0, "changed": 0}
+        samples: Dict[str, List[Any]] = {"missing": [], "unexpected": [], "changed": []}
+        expected_count = 0
+        streamed = 0
+
+        def record(kind: str, sample: Any):
+            counts[kind] += 1
+            if len(samples[kind]) < max_samples:
+                samples[kind].append(sample)
+
+        partitions = max(1, -(-len(actual) // partition_rows))
+        for partition in range(partitions):
+            # Index this partition's actual rows by match key hash; a bucket is
+            # a row index, or a list of them once a hash repeats
+            index: Dict[int, Any] = {}
+            for i, row in enumerate(actual):
+                h = hash(self.match_key(row))
+                if partitions > 1 and h % partitions != partition:
+                    continue
+                bucket = index.get(h)
+                if bucket is None:
+                    index[h] = i
+                elif isinstance(bucket, list):
+                    bucket.append(i)
+                else:
+                    index[h] = [bucket, i]
+
+            for row in expected():
+                streamed += 1
+                if progress is not None and streamed % progress_rows == 0:
+                    progress(streamed)
+                key = self.match_key(row)
+                h = hash(key)
+                if partitions > 1 and h % partitions != partition:
+                    continue
+                expected_count += 1
+                match, diff = self._take_match(index, h, actual, row, key)
+                if match is None:
+                    record("missing", row)
+                elif diff:
+                    record("changed", {"key": {c: row.get(c) for c in self.key_columns}, "columns": diff})
+                else:
+                    counts["matched"] += 1
+
+            for bucket in index.values():
+                for i in bucket if isinstance(bucket, list) else (bucket,):
+                    record("unexpected", actual[i])
+
+        if not (counts["missing"] or counts["unexpected"] or counts["changed"]):
+            return None
+        return {
+            "expected_row_count": expected_count,
+            "actual_row_count": len(actual),
+            **counts,
+            "samples": {kind: rows for kind, rows in samples.items() if rows},
+        }
+
+    def _take_match(
+        self, index: Dict[int, Any], h: int, actual: List[Row], row: Row, key: Any
+    ) -> Tuple[Optional[int], Dict[str, Any]]:
+        """Remove and return the actual row index paired with an expected row, with any changed columns"""
+        bucket = index.get(h)
+        if bucket is None:
+            return None, {}
+        if not isinstance(bucket, list):
+            # Common case: a single candidate
+            candidate = actual[bucket]
+            if candidate == row:
+                del index[h]
+                return bucket, {}
+            bucket = index[h] = [bucket]
+
+        fallback: Optional[Tuple[int, Dict[str, Any]]] = None
+        for position in range(len(bucket) - 1, -1, -1):
+            candidate = actual[bucket[position]]
+            if candidate == row:
+                return self._pop(index, h, bucket, position), {}
+            if self.match_key(candidate) != key:
+                continue  # Hash collision
+            diff = self.changed_columns(row, candidate)
+            if not diff:
+                return self._pop(index, h, bucket, position), diff
+            # With key columns, pair with a differing row only if no row with the key matches exactly
+            if self.key_columns and fallback is None:
+                fallback = (position, diff)
+        if fallback is None:
+            return None, {}
+        position, diff = fallback
+        return self._pop(index, h, bucket, position), diff
+
+    @staticmethod
+    def _pop(index: Dict[int, Any], h: int, bucket: List[int], position: int) -> int:
+        i = bucket.pop(position)
+        if not bucket:
+            del index[h]
+        return i
@@ -0,0 +1,161 @@
+"""In-process pub/sub of test run events, streamed to clients over SSE.
+
+Runs publish an event when they are queued, when they start, as the worker
+reports progress, and when they finish. Every subscriber gets its own bounded
+queue on its own event loop and filters on run, test case or submission ids,
+so any number of dashboards can follow runs through one broker instead of
+polling the REST endpoints. Publishing never blocks: events may come from
+queue consumers on another event loop or from the pool's progress thread, and
+a subscriber that falls behind loses its oldest events rather than slowing
+the runs down.
+
+Events only reach subscribers in the process that executes the run; runs
+executed by separate `python -m app.execution.queue` workers are seen as
+queued here. A stream following one run also polls its status from the
+database, so it still gets the run's "finished" event.
+
+Event kinds:
+
+- queued: a run was added to the queue
+- started: a worker began executing the run
+- progress: the worker reached a stage: "loaded" (input tables read),
+  "ran" (submission returned, with output row counts) or "comparing"
+  (rows of an expected table compared so far)
+- finished: the outcome, with status, passed, diff, error and resource usage
+"""
+import asyncio
+import itertools
+import weakref
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional
+
+from ..models.test_run import TestRun
+
+EVENT_QUEUED = "queued"
+EVENT_STARTED = "started"
+EVENT_PROGRESS = "progress"
+EVENT_FINISHED = "finished"
+
+# Events held for a subscriber that is not reading; older ones are dropped beyond this
+MAX_PENDING_EVENTS = 1000
+
+Event = Dict[str, Any]
+
+
+class Subscription:
+    """Events matching the given ids (all events when no ids are given), in publication order"""
+
+    def __init__(
+        self,
+        broker: "RunEvents",
+        run_ids: Iterable[int] = (),
+        test_case_ids: Iterable[int] = (),
+        submission_ids: Iterable[int] = (),
+        max_pending: int = MAX_PENDING_EVENTS,
+    ):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.filters = {
+            "run_id": set(run_ids),
+            "test_case_id": set(test_case_ids),
+            "submission_id": set(submission_ids),
+        }
+        self.dropped = 0
+        self._queue: "asyncio.Queue[Event]" = asyncio.Queue(max_pending)
+
+    def matches(self, event: Event) -> bool:
+        return all(not ids or event.get(field) in ids for field, ids in self.filters.items())
+
+    def _deliver(self, event: Event) -> None:
+        # Runs on the subscriber's loop
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """The next event, or None if none arrives within timeout seconds"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.broker._unsubscribe(self)
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+
+class RunEvents:
+    def __init__(self):
+        self.published = 0
+        self._ids = itertools.count(1)
+        # Weak, so a stream dropped before it started reading does not stay subscribed
+        self._subscribers: "weakref.WeakSet[Subscription]" = weakref.WeakSet()
+        self._lock = Lock()
+
+    def subscribe(self, **filters) -> Subscription:
+        """Start receiving events; call from the event loop that will read them"""
+        subscription = Subscription(self, **filters)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: Event) -> None:
+        """Fan an event out to every matching subscriber; safe to call from any thread"""
+        with self._lock:
+            event["id"] = next(self._ids)
+            self.published += 1
+            subscribers = [s for s in self._subscribers if s.matches(event)]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:  # The subscriber's loop has closed
+                subscription.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": sum(s.dropped for s in self._subscribers),
+            }
+
+
+run_events = RunEvents()
+
+
+def run_event(kind: str, run: TestRun, **data) -> Event:
+    event = {
+        "event": kind,
+        "run_id": run.id,
+        "test_case_id": run.test_case_id,
+        "submission_id": run.submission_id,
+        "status": run.status,
+    }
+    if kind == EVENT_FINISHED:
+        event.update(
+            passed=run.passed, cached=run.cached, diff=run.diff, error=run.error,
+            wall_time=run.wall_time, cpu_time=run.cpu_time, peak_rss_mb=run.peak_rss_mb,
+            rows_per_second=run.rows_per_second,
+        )
+    event.update(data)
+    return event
+
+
+def publish_runs(kind: str, runs: Iterable[TestRun]) -> None:
+    for run in runs:
+        run_events.publish(run_event(kind, run))
+
+
+def publish_progress(tag: Dict[str, Any], stage: str, data: Dict[str, Any]) -> None:
+    """Publish a progress report from a worker; tag identifies the run"""
+    run_events.publish({"event": EVENT_PROGRESS, **tag, "stage": stage, **data})
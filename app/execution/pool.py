@@ -0,0 +1,253 @@
+"""Pool of warm worker processes that run submissions in isolation.
+
+Workers are started with the "spawn" method so they never inherit the API
+process's database connections or event loop, and the pool is sized to every
+core this process may run on unless settings.execution_workers says otherwise.
+Workers stay up between runs and keep compiled submissions cached, and map
+input tables from a store shared by all of them (see worker.py and
+shared.py). To bound leaks and cache growth, each worker is
+replaced after max_runs_per_worker runs, and the whole pool is retired, letting
+in-flight runs finish, once any worker reports an RSS above max_rss_mb.
+Workers report on a queue when they pick up a run, along with any progress
+reports, and a background thread relays them; given an on_progress callback,
+the pool calls it for each progress report.
+
+A run's deadline starts when a worker picks it up, so time spent waiting for
+a free worker never counts against it, and covers loading its inputs,
+running it and comparing its outputs, each within its own limit (see
+worker.py), plus settings.execution_timeout_grace. A worker that misses the
+deadline has stopped responding and is killed. That breaks its executor, so
+the other runs in flight on it are requeued on a fresh one rather than
+failed. When a worker dies on its own, which run it was executing is
+unknown: the runs that had started fail and the rest are requeued.
+The pool is created lazily and shut down from the application lifespan.
+"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+from weakref import WeakSet
+
+from ..core.config import settings
+from . import worker
+from .events import publish_progress
+from .shared import SharedTableStore
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS or Windows
+        return os.cpu_count() or 1
+
+
+# Times a run is resubmitted after the executor it was on broke under it
+MAX_REQUEUES = 3
+
+
+class _Pickup:
+    """Which worker process picked up a submitted run, set from the relay thread"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.pid: Optional[int] = None
+
+
+class ExecutionPool:
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_runs_per_worker: Optional[int] = None,
+        max_rss_mb: Optional[int] = None,
+        module_cache_size: int = worker.MODULE_CACHE_SIZE,
+        store: Optional[SharedTableStore] = None,
+        compare_partition_rows: int = worker.COMPARE_PARTITION_ROWS,
+        on_progress: Optional[Callable[[Dict[str, Any], str, Dict[str, Any]], None]] = None,
+    ):
+        self.max_workers = max_workers or available_cores()
+        self.max_runs_per_worker = max_runs_per_worker
+        self.max_rss_mb = max_rss_mb
+        self.module_cache_size = module_cache_size
+        self.store = store or SharedTableStore()
+        self.compare_partition_rows = compare_partition_rows
+        self.on_progress = on_progress
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._progress = None
+        self._progress_thread: Optional[threading.Thread] = None
+        self._tokens = itertools.count()
+        self._pickups: Dict[int, _Pickup] = {}
+        # Executors broken by killing a worker that missed its deadline
+        self._killed: "WeakSet[ProcessPoolExecutor]" = WeakSet()
+
+    def _progress_queue(self, context):
+        """The queue workers report pickups and progress on, shared by every executor this pool starts"""
+        if self._progress is None:
+            self._progress = context.Queue()
+            self._progress_thread = threading.Thread(
+                target=self._relay_progress, args=(self._progress,), name="execution-progress", daemon=True
+            )
+            self._progress_thread.start()
+        return self._progress
+
+    def _relay_progress(self, progress) -> None:
+        while True:
+            item = progress.get()
+            if item is None:
+                return
+            tag, stage, data = item
+            if stage == worker.PICKED_UP:
+                pickup = self._pickups.get(data["token"])
+                if pickup is not None:
+                    pickup.pid = data["pid"]
+                    try:
+                        pickup.loop.call_soon_threadsafe(pickup.event.set)
+                    except RuntimeError:
+                        pass  # The run's event loop has closed
+                continue
+            if self.on_progress is None:
+                continue
+            try:
+                self.on_progress(tag, stage, data)
+            except Exception as e:
+                print(f"Progress callback failed: {e!r}")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            kwargs: Dict[str, Any] = {}
+            if self.max_runs_per_worker and sys.version_info >= (3, 11):
+                kwargs["max_tasks_per_child"] = self.max_runs_per_worker
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=worker.init_worker,
+                initargs=(
+                    self.module_cache_size, self.compare_partition_rows, self.store,
+                    self._progress_queue(context),
+                ),
+                **kwargs,
+            )
+        return self._executor
+
+    def _retire(self) -> None:
+        """Start a fresh pool for new runs; the old one exits once its queued runs finish"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Start a fresh pool for new runs if executor is still the current one"""
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _kill(self, executor: ProcessPoolExecutor, pid: Optional[int]) -> None:
+        """Kill the worker process pid, which breaks executor, and start a fresh pool for new runs"""
+        self._killed.add(executor)
+        process = (getattr(executor, "_processes", None) or {}).get(pid)
+        if process is not None:
+            process.kill()
+        else:
+            # Not a process of this executor any more; stop every worker instead
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.terminate()
+        self._discard(executor)
+
+    async def run(
+        self,
+        code: str,
+        database_url: str,
+        inputs: Dict[str, worker.TableRef],
+        expected: Dict[str, Dict[str, Any]],
+        parameters: Dict[str, Any],
+        limits: Dict[str, Any],
+        tag: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Run a submission on a worker and return the worker's result dict, including the diff.
+
+        tag identifies the run in the progress reports passed to on_progress.
+
+        The worker enforces the limits itself; the deadline here only catches
+        a worker that stopped responding, which is killed.
+        """
+        limits = {
+            "wall_seconds": settings.execution_default_timeout,
+            "load_seconds": settings.execution_load_timeout,
+            "compare_seconds": settings.execution_compare_timeout,
+            **{name: value for name, value in limits.items() if value is not None},
+        }
+        deadline = (
+            limits["wall_seconds"] + limits["load_seconds"] + limits["compare_seconds"]
+            + settings.execution_timeout_grace
+        )
+        for _ in range(MAX_REQUEUES + 1):
+            executor = self._get_executor()
+            token = next(self._tokens)
+            pickup = self._pickups[token] = _Pickup(asyncio.get_running_loop())
+            try:
+                future = asyncio.wrap_future(executor.submit(
+                    worker.run_submission,
+                    code, database_url, inputs, expected, parameters, limits, tag, token,
+                ))
+                # Waiting for a free worker does not count against the deadline
+                picked_up = asyncio.ensure_future(pickup.event.wait())
+                await asyncio.wait({future, picked_up}, return_when=asyncio.FIRST_COMPLETED)
+                picked_up.cancel()
+                result = await asyncio.wait_for(future, deadline)
+            except asyncio.TimeoutError:
+                self._kill(executor, pickup.pid)
+                return {"status": worker.TIMEOUT, "diff": {}, "error": f"Worker did not respond within {deadline}s"}
+            except BrokenProcessPool:
+                self._discard(executor)
+                if pickup.pid is not None and executor not in self._killed:
+                    # A worker died outright, e.g. killed by the OS for exceeding its memory limit;
+                    # which one is unknown, so every run that had started fails
+                    return {"status": worker.ERROR, "diff": {}, "error": "Worker process exited unexpectedly"}
+                continue  # Broken by another run's worker; run this one again
+            finally:
+                del self._pickups[token]
+            if self.max_rss_mb and result.get("rss_mb", 0) > self.max_rss_mb:
+                self._retire()
+            return result
+        return {"status": worker.ERROR, "diff": {}, "error": "Worker pool kept failing; run abandoned"}
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        progress, self._progress = self._progress, None
+        if progress is not None:
+            progress.put(None)
+            self._progress_thread.join()
+            progress.close()
+
+
+_pool: Optional[ExecutionPool] = None
+
+
+def get_execution_pool() -> ExecutionPool:
+    global _pool
+    if _pool is None:
+        _pool = ExecutionPool(
+            settings.execution_workers,
+            max_runs_per_worker=settings.execution_worker_max_runs,
+            max_rss_mb=settings.execution_worker_max_rss_mb,
+            module_cache_size=settings.execution_module_cache_size,
+            store=SharedTableStore(settings.execution_shared_tables_dir, settings.execution_shared_tables_mb * 1024 * 1024),
+            compare_partition_rows=settings.execution_compare_partition_rows,
+            on_progress=publish_progress,
+        )
+    return _pool
+
+
+def shutdown_execution_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,207 @@
+"""Durable execution queue backed by the test_runs table.
+
+Queuing a run only inserts a TestRun with status "queued"; consumers claim
+runs and execute them. Because the queue is the table itself, queued runs
+survive restarts, and any number of consumers, in the API process or in
+separate worker processes, can share it:
+
+    python -m app.execution.queue [--consumers N]
+
+A claim is a compare-and-set UPDATE that only succeeds while the run is still
+claimable, so two consumers never execute the same run; on PostgreSQL the
+candidate rows are also selected with FOR UPDATE SKIP LOCKED so consumers do
+not contend for the same rows. A claim comes with a lease; a running job
+whose lease expired (its worker died) is claimed again, up to
+settings.execution_job_max_attempts attempts, after which it is marked as an
+error.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..core.config import settings
+from ..core.database import new_async_session
+from ..models.test_run import TestRun, RUN_QUEUED, RUN_RUNNING, RUN_ERROR
+from .pool import get_execution_pool, shutdown_execution_pool
+from .runner import execute_run
+
+# Candidate runs fetched per claim attempt, so losing a race does not mean another round-trip
+CLAIM_CANDIDATES = 8
+# Finished runs sampled for latency metrics
+LATENCY_SAMPLE_SIZE = 1000
+
+
+def _claimable(now: datetime):
+    abandoned = and_(TestRun.status == RUN_RUNNING, TestRun.lease_expires_at < now)
+    return or_(TestRun.status == RUN_QUEUED, abandoned)
+
+
+async def _fail_exhausted(session: AsyncSession, now: datetime) -> None:
+    """Give up on abandoned runs that have used all their attempts"""
+    await session.exec(
+        update(TestRun)
+        .where(TestRun.status == RUN_RUNNING)
+        .where(TestRun.lease_expires_at < now)
+        .where(TestRun.attempts >= settings.execution_job_max_attempts)
+        .values(
+            status=RUN_ERROR,
+            passed=False,
+            error=f"Abandoned after {settings.execution_job_max_attempts} attempts",
+            finished_at=now,
+            lease_expires_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def claim_next(session: AsyncSession, worker_id: str) -> Optional[TestRun]:
+    """Atomically claim the oldest claimable run for worker_id, or return None if there is none"""
+    now = datetime.utcnow()
+    await _fail_exhausted(session, now)
+    candidates = (await session.exec(
+        select(TestRun.id)
+        .where(_claimable(now))
+        .order_by(TestRun.id)
+        .limit(CLAIM_CANDIDATES)
+        .with_for_update(skip_locked=True)
+    )).all()
+    for run_id in candidates:
+        result = await session.exec(
+            update(TestRun)
+            .where(TestRun.id == run_id)
+            .where(_claimable(now))
+            .values(
+                status=RUN_RUNNING,
+                claimed_by=worker_id,
+                attempts=TestRun.attempts + 1,
+                started_at=now,
+                lease_expires_at=now + timedelta(seconds=settings.execution_job_lease),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            await session.commit()
+            return await session.get(TestRun, run_id, populate_existing=True)
+    await session.commit()
+    return None
+
+
+async def process_next(session_factory: Callable[[], AsyncSession], worker_id: str) -> bool:
+    """Claim and execute one run; returns False when the queue is empty"""
+    async with session_factory() as session:
+        run = await claim_next(session, worker_id)
+        if run is None:
+            return False
+        await execute_run(session, run)
+        return True
+
+
+async def drain(session_factory: Callable[[], AsyncSession], worker_id: str = "drain") -> int:
+    """Execute runs until the queue is empty, returning how many were executed"""
+    executed = 0
+    while await process_next(session_factory, worker_id):
+        executed += 1
+    return executed
+
+
+async def consume(
+    session_factory: Callable[[], AsyncSession],
+    worker_id: str,
+    stop: asyncio.Event,
+    poll_interval: Optional[float] = None,
+) -> None:
+    """Execute runs as they are queued until stop is set"""
+    poll_interval = poll_interval or settings.execution_queue_poll_interval
+    while not stop.is_set():
+        try:
+            if await process_next(session_factory, worker_id):
+                continue
+        except Exception as e:
+            # Keep consuming; the run's lease expires and another attempt picks it up
+            print(f"Queue consumer {worker_id} failed: {e!r}")
+        try:
+            await asyncio.wait_for(stop.wait(), poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def worker_id(index: int) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def start_consumers(session_factory: Callable[[], AsyncSession], count: int, stop: asyncio.Event) -> List[asyncio.Task]:
+    return [asyncio.create_task(consume(session_factory, worker_id(i), stop)) for i in range(count)]
+
+
+def _summarize(seconds: List[float]) -> Optional[Dict[str, float]]:
+    if not seconds:
+        return None
+    seconds = sorted(seconds)
+    return {
+        "avg": sum(seconds) / len(seconds),
+        "p50": seconds[len(seconds) // 2],
+        "p95": seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))],
+        "max": seconds[-1],
+    }
+
+
+async def queue_stats(session: AsyncSession) -> Dict[str, Any]:
+    """Queue depth by status, age of the oldest queued run, and wait/run latency of recent runs"""
+    now = datetime.utcnow()
+    counts = dict((await session.exec(select(TestRun.status, func.count()).group_by(TestRun.status))).all())
+    oldest = (await session.exec(select(func.min(TestRun.created_at)).where(TestRun.status == RUN_QUEUED))).one()
+    recent = (await session.exec(
+        select(TestRun.created_at, TestRun.started_at, TestRun.finished_at)
+        .where(TestRun.finished_at.is_not(None))
+        .where(TestRun.cached == False)  # noqa: E712
+        .order_by(TestRun.id.desc())
+        .limit(LATENCY_SAMPLE_SIZE)
+    )).all()
+    return {
+        "queued": counts.get(RUN_QUEUED, 0),
+        "running": counts.get(RUN_RUNNING, 0),
+        "by_status": counts,
+        "oldest_queued_seconds": (now - oldest).total_seconds() if oldest else None,
+        # Time from queuing to a worker picking the run up, and from then to completion
+        "wait_seconds": _summarize([(started - created).total_seconds() for created, started, _ in recent if started]),
+        "run_seconds": _summarize([(finished - started).total_seconds() for _, started, finished in recent if started]),
+        "sample_size": len(recent),
+    }
+
+
+async def _run_consumers(count: int) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+    except NotImplementedError:  # Windows
+        pass
+    try:
+        await asyncio.gather(*start_consumers(new_async_session, count, stop))
+    finally:
+        shutdown_execution_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Execute queued test runs")
+    parser.add_argument(
+        "--consumers", type=int, default=None,
+        help="Runs executed concurrently (default: one per execution pool worker)",
+    )
+    args = parser.parse_args()
+    count = args.consumers or get_execution_pool().max_workers
+    print(f"Consuming the execution queue with {count} consumers")
+    asyncio.run(_run_consumers(count))
+
+
+if __name__ == "__main__":
+    main()
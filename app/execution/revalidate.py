@@ -0,0 +1,72 @@
+"""Incremental re-validation: queue runs for the test cases a change affects.
+
+Write endpoints call revalidate() after committing a change to a table,
+object schema or function. The dependency index (crud/dependencies.py) maps
+the change to the test cases that use it, and each of those is queued against
+the latest submission of its function. Test cases that did not change are
+never queued, and a queued run whose outcome is already in the result cache
+(for instance after editing only a function's description) is answered from
+the cache by execute_run, so the cost of a change scales with what it touches.
+"""
+from typing import Iterable, List
+
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..core.config import settings
+from ..crud import dependencies
+from ..models.submission import Submission
+from ..models.test_case import TestCase
+from ..models.test_run import TestRun, RUN_QUEUED
+from .events import EVENT_QUEUED, publish_runs
+
+
+async def latest_submissions(session: AsyncSession, function_ids: Iterable[int]) -> dict:
+    """function_id -> id of the function's most recent submission"""
+    function_ids = set(function_ids)
+    if not function_ids:
+        return {}
+    query = (
+        select(Submission.function_id, func.max(Submission.id))
+        .where(Submission.function_id.in_(function_ids))
+        .group_by(Submission.function_id)
+    )
+    return dict((await session.exec(query)).all())
+
+
+async def revalidate(
+    session: AsyncSession,
+    tables: Iterable[int] = (),
+    objects: Iterable[int] = (),
+    functions: Iterable[int] = (),
+) -> List[TestRun]:
+    """Queue a run of every test case depending on the given entities, returning the new runs.
+
+    Test cases whose function has no submission are skipped, as are those
+    that already have a run of the same submission waiting in the queue.
+    """
+    if not settings.revalidate_on_change:
+        return []
+    test_case_ids = await session.run_sync(dependencies.dependents, tables, objects, functions)
+    if not test_case_ids:
+        return []
+    cases = (await session.exec(
+        select(TestCase.id, TestCase.function_id).where(TestCase.id.in_(test_case_ids))
+    )).all()
+    submissions = await latest_submissions(session, (function_id for _, function_id in cases))
+    waiting = set((await session.exec(
+        select(TestRun.test_case_id, TestRun.submission_id)
+        .where(TestRun.test_case_id.in_(test_case_ids))
+        .where(TestRun.status == RUN_QUEUED)
+    )).all())
+    runs = [
+        TestRun(test_case_id=test_case_id, submission_id=submissions[function_id])
+        for test_case_id, function_id in sorted(cases)
+        if function_id in submissions and (test_case_id, submissions[function_id]) not in waiting
+    ]
+    if runs:
+        session.add_all(runs)
+        await session.commit()
+        publish_runs(EVENT_QUEUED, runs)
+    return runs
@@ -0,0 +1,269 @@
+"""Executes TestRuns: resolves a test case's tables, runs the submission on the
+execution pool and records the outcome on the run. Outputs are compared with
+the expected tables using the key columns and tolerances of their output
+ObjectSchemas. Passed and failed outcomes are stored in the result cache, so
+identical runs can skip execution.
+
+Limits come from TestCase.parameters:
+
+- timeout: wall-clock seconds (default settings.execution_default_timeout)
+- cpu_limit: CPU seconds
+- memory_limit_mb: address space in MB
+
+Setting "profile" to true in the parameters records a cProfile summary with each run.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..core.config import settings
+from ..core.database import to_sync_url
+from ..crud import table_rows
+from ..crud.references import resolve
+from ..models.object_schema import ObjectSchema
+from ..models.submission import Submission
+from ..models.table_data import TableData
+from ..models.test_case import TestCase
+from ..models.test_run import TestRun, RUN_RUNNING, RUN_PASSED, RUN_FAILED, RUN_ERROR, RUN_TIMEOUT
+from . import worker
+from .cache import result_cache, result_key
+from .events import EVENT_STARTED, EVENT_FINISHED, publish_runs
+from .pool import get_execution_pool
+
+# Worker result status -> run status, for runs that did not complete
+FAILURE_STATUSES = {
+    worker.ERROR: RUN_ERROR,
+    worker.TIMEOUT: RUN_TIMEOUT,
+    worker.CPU_LIMIT: RUN_TIMEOUT,
+    worker.MEMORY_LIMIT: RUN_ERROR,
+}
+
+
+def run_limits(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "wall_seconds": float(parameters.get("timeout") or settings.execution_default_timeout),
+        "cpu_seconds": parameters.get("cpu_limit"),
+        "memory_mb": parameters.get("memory_limit_mb"),
+        "load_seconds": settings.execution_load_timeout,
+        "compare_seconds": settings.execution_compare_timeout,
+    }
+
+
+def _resolve_tables(tables: Dict[int, TableData], table_ids: Dict[str, int]) -> Dict[str, TableData]:
+    missing = [f"{name} (id: {table_id})" for name, table_id in table_ids.items() if table_id not in tables]
+    if missing:
+        raise LookupError(f"Tables not found: {', '.join(missing)}")
+    return {name: tables[table_id] for name, table_id in table_ids.items()}
+
+
+class PreparedCase:
+    """A test case's tables and schemas, resolved once and shared by every run of it"""
+
+    def __init__(self, test_case: TestCase, tables: Dict[int, TableData], schemas: Dict[int, ObjectSchema]):
+        self.test_case = test_case
+        self.tables = tables
+        self.schemas = schemas
+        self.error: Optional[str] = None
+        try:
+            input_tables = _resolve_tables(tables, test_case.input_tables)
+            expected_tables = _resolve_tables(tables, test_case.expected_output_tables)
+            if any(table.object_id not in schemas for table in expected_tables.values()):
+                raise LookupError("Object schema of an expected output table not found")
+        except LookupError as e:
+            self.error = str(e)
+            return
+        # Workers read input tables themselves and cache them by version
+        self.inputs = {name: (table.id, table.updated_at.isoformat()) for name, table in input_tables.items()}
+        self.expected = {
+            name: {
+                "table_id": table.id,
+                "key_columns": schemas[table.object_id].key_columns,
+                "tolerances": schemas[table.object_id].tolerances,
+            }
+            for name, table in expected_tables.items()
+        }
+
+    def result_key(self, submission: Submission) -> Optional[str]:
+        return result_key(submission.code, self.test_case, self.tables, self.schemas)
+
+
+async def prepare_cases(session: AsyncSession, test_cases: List[TestCase]) -> List[PreparedCase]:
+    """Resolve the tables and schemas of many test cases with one query per model"""
+    table_ids = {
+        table_id
+        for test_case in test_cases
+        for table_id in [*test_case.input_tables.values(), *test_case.expected_output_tables.values()]
+    }
+    tables = await resolve(session, TableData, table_ids)
+    schemas = await resolve(session, ObjectSchema, (table.object_id for table in tables.values()))
+    return [PreparedCase(test_case, tables, schemas) for test_case in test_cases]
+
+
+def database_url_for(session: AsyncSession) -> str:
+    """The sync URL of the session's database, for workers to connect to"""
+    return to_sync_url(session.bind.url.render_as_string(hide_password=False))
+
+
+async def _execute(
+    run: TestRun,
+    case: PreparedCase,
+    submission: Submission,
+    database_url: str,
+) -> None:
+    """Execute one run on the pool and record its outcome on the run (without committing)"""
+    run.started_at = datetime.utcnow()
+    if case.error:
+        run.status, run.passed, run.error = RUN_ERROR, False, case.error
+    else:
+        parameters = case.test_case.parameters
+        tag = {"run_id": run.id, "test_case_id": run.test_case_id, "submission_id": run.submission_id}
+        result = await get_execution_pool().run(
+            submission.code, database_url, case.inputs, case.expected, parameters, run_limits(parameters), tag
+        )
+        record_usage(run, result)
+        if result["status"] == worker.COMPLETED:
+            run.diff = result["diff"]
+            run.passed = not run.diff
+            run.status = RUN_PASSED if run.passed else RUN_FAILED
+            result_cache.put(case.result_key(submission), {"status": run.status, "passed": run.passed, "diff": run.diff})
+        else:
+            run.status = FAILURE_STATUSES[result["status"]]
+            run.passed = False
+            run.error = result["error"]
+    run.finished_at = datetime.utcnow()
+
+
+def record_usage(run: TestRun, result: Dict[str, Any]) -> None:
+    """Copy the resource usage a worker reported onto the run"""
+    run.wall_time = result.get("wall_time")
+    run.cpu_time = result.get("cpu_time")
+    run.peak_rss_mb = result.get("peak_rss_mb")
+    run.input_rows = result.get("input_row_count")
+    if result["status"] == worker.COMPLETED:
+        run.output_rows = sum(result["output_row_counts"].values())
+    if run.input_rows and run.wall_time:
+        run.rows_per_second = run.input_rows / run.wall_time
+    run.profile = result.get("profile")
+
+
+async def execute_run(session: AsyncSession, run: TestRun) -> None:
+    """Execute a run claimed from the queue, recording its status, diff and timings.
+
+    A run whose outcome is in the result cache is completed from the cache without executing.
+    """
+    test_case = await session.get(TestCase, run.test_case_id)
+    submission = await session.get(Submission, run.submission_id)
+    if test_case is None or submission is None:
+        run.status, run.passed, run.error = RUN_ERROR, False, "Test case or submission no longer exists"
+        run.finished_at = datetime.utcnow()
+    else:
+        [case] = await prepare_cases(session, [test_case])
+        key = case.result_key(submission)
+        outcome = result_cache.get(key) if key else None
+        if outcome is not None:
+            # Nothing the outcome depends on changed since an identical run
+            for field, value in outcome.items():
+                setattr(run, field, value)
+            run.cached = True
+            run.finished_at = datetime.utcnow()
+        else:
+            # Hold the job for as long as the run may legitimately take
+            run.lease_expires_at = lease_until(run_limits(test_case.parameters)["wall_seconds"])
+            session.add(run)
+            await session.commit()
+            publish_runs(EVENT_STARTED, [run])
+            await _execute(run, case, submission, database_url_for(session))
+    run.lease_expires_at = None
+    session.add(run)
+    await session.commit()
+    publish_runs(EVENT_FINISHED, [run])
+
+
+def lease_until(wall_seconds: float) -> datetime:
+    """When a job running for at most wall_seconds should be considered abandoned"""
+    return datetime.utcnow() + timedelta(
+        seconds=run_seconds(wall_seconds) + settings.execution_job_lease
+    )
+
+
+def run_seconds(wall_seconds: float) -> float:
+    """The longest a run limited to wall_seconds may occupy a worker, loading and comparing included"""
+    return (
+        wall_seconds + settings.execution_load_timeout + settings.execution_compare_timeout
+        + settings.execution_timeout_grace
+    )
+
+
+def cached_run(test_case: TestCase, submission: Submission, outcome: Dict[str, Any]) -> TestRun:
+    """A finished TestRun whose outcome was served from the result cache"""
+    now = datetime.utcnow()
+    return TestRun(
+        test_case_id=test_case.id, submission_id=submission.id, cached=True,
+        started_at=now, finished_at=now, **outcome
+    )
+
+
+async def run_matrix(session: AsyncSession, test_cases: List[TestCase], submissions: List[Submission]) -> List[TestRun]:
+    """Run every test case against every submission, returning the finished runs.
+
+    Tables and schemas are resolved once for all test cases, and each input
+    table that a run needs is read once and written to the shared table
+    store, which every worker running against it maps. Cached outcomes are
+    reused without running. At most one run per pool worker is in flight at a
+    time, leaving the pool's queue to other callers such as queue consumers.
+    """
+    cases = await prepare_cases(session, test_cases)
+    pool = get_execution_pool()
+    runs: List[TestRun] = []
+    pending: List[Tuple[TestRun, PreparedCase, Submission]] = []
+    for submission in submissions:
+        for case in cases:
+            key = case.result_key(submission)
+            outcome = result_cache.get(key) if key else None
+            if outcome is not None:
+                runs.append(cached_run(case.test_case, submission, outcome))
+                continue
+            run = TestRun(test_case_id=case.test_case.id, submission_id=submission.id)
+            runs.append(run)
+            pending.append((run, case, submission))
+
+    # Claim the runs for this process, leased long enough to run them all in
+    # waves of one per worker; queue consumers take them over if it dies
+    if pending:
+        longest = max(run_limits(case.test_case.parameters)["wall_seconds"] for _, case, _ in pending)
+        waves = -(-len(pending) // pool.max_workers)
+        lease = lease_until(waves * run_seconds(longest))
+        for run, _, _ in pending:
+            run.status, run.claimed_by, run.attempts, run.lease_expires_at = RUN_RUNNING, f"api:{os.getpid()}", 1, lease
+    session.add_all(runs)
+    await session.commit()
+    publish_runs(EVENT_STARTED, (run for run, _, _ in pending))
+
+    database_url = database_url_for(session)
+    stored = set()
+    for run, case, submission in pending:
+        if case.error:
+            continue
+        for table_id, version in case.inputs.values():
+            if (table_id, version) not in stored and not pool.store.contains(database_url, table_id, version):
+                rows = await session.run_sync(table_rows.read_rows, case.tables[table_id])
+                table = await asyncio.to_thread(pool.store.put, database_url, table_id, version, rows)
+                table.close()
+            stored.add((table_id, version))
+
+    slots = asyncio.Semaphore(pool.max_workers)
+
+    async def execute(run: TestRun, case: PreparedCase, submission: Submission):
+        async with slots:
+            await _execute(run, case, submission, database_url)
+
+    await asyncio.gather(*(execute(*job) for job in pending))
+    for run, _, _ in pending:
+        run.lease_expires_at = None
+    session.add_all(runs)
+    await session.commit()
+    publish_runs(EVENT_FINISHED, runs)
+    return runs
@@ -0,0 +1,241 @@
+"""Input tables shared between the API process and workers as memory-mapped files.
+
+Each version of a table is encoded once into a file in the store's directory
+(under /dev/shm by default, so the file lives in shared memory) and every
+worker that needs it maps the file read-only. The OS shares the mapped pages
+between all workers, so a table read by many runs is held in memory once,
+instead of being pickled into each worker through a pipe and cached per
+worker. Whichever process first needs a version writes it, atomically via a
+rename; run_matrix writes a batch's inputs up front so its workers do not all
+read the same table from the database at once.
+
+Files are columnar snapshots (see core/table_formats.py): fixed-layout,
+8-byte aligned column buffers in batches of BATCH_ROWS rows. A run reads its
+inputs through SharedTable, which decodes one batch at a time straight from
+the mapping, so a run never holds a private copy of a whole table, and
+column() reads a single column without building rows. The files hold only
+data; nothing in them is ever executed or unpickled.
+
+The directory is private to the user running the store: $XDG_RUNTIME_DIR, or
+a directory named after the user's uid, created with mode 0700. A directory
+owned by someone else or accessible to anyone else is refused rather than
+used.
+
+Files are named by database, table id and version (updated_at), so a changed
+table is never read stale. Writing a version removes the table's older
+versions, and the least recently written files are removed once the store
+exceeds max_bytes. Removing a file never disturbs a worker that has it
+mapped. Like worker.py this module only uses the standard library.
+"""
+import bisect
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..core.table_formats import SnapshotReader, SnapshotWriter
+
+Row = Dict[str, Any]
+
+# Rows per batch of a stored table; a run decodes one batch at a time
+BATCH_ROWS = 10_000
+
+_DIRECTORY_NAME = "functionsvalidated-tables"
+
+
+def default_directory() -> str:
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and os.path.isdir(runtime):
+        return str(Path(runtime) / _DIRECTORY_NAME)
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return str(base / f"{_DIRECTORY_NAME}-{uid}")
+
+
+def private_directory(path: Path) -> None:
+    """Create path with mode 0700 if needed, and check that only this user can use it"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        path.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+    if not hasattr(os, "getuid"):  # pragma: no cover - Windows has no uid or mode bits to check
+        return
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(
+            f"Shared table directory {path} must be a directory owned by uid {os.getuid()} with mode 0700"
+        )
+
+
+def write_rows(f, rows: List[Row]) -> None:
+    """Write rows to a file as a columnar snapshot"""
+    columns: Dict[str, None] = {}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+    writer = SnapshotWriter(columns)
+    f.write(writer.header())
+    for start in range(0, len(rows), BATCH_ROWS):
+        f.write(writer.batch(rows[start:start + BATCH_ROWS]))
+    f.write(writer.footer())
+
+
+class SharedTable(Sequence):
+    """Read-only rows of a stored table version, decoded a batch at a time from its mapped file.
+
+    Rows are fresh dicts per decoded batch; the batch last indexed stays
+    decoded, so reading rows by index in order decodes each batch once.
+    Valid until close(), which the worker calls after the run.
+    """
+
+    def __init__(self, buffer: mmap.mmap):
+        self._map = buffer
+        try:
+            self._reader = SnapshotReader(buffer)
+            self._starts: List[int] = []
+            total = 0
+            for index in range(len(self._reader)):
+                self._starts.append(total)
+                total += self._reader.batch_rows(index)
+        except BaseException:
+            if hasattr(self, "_reader"):
+                self._reader.release()
+            try:
+                buffer.close()
+            except BufferError:
+                pass  # Still viewed from the traceback; closes once it is collected
+            raise
+        self.columns: List[str] = self._reader.columns
+        self._length = total
+        self._cached: Optional[int] = None
+        self._cached_rows: List[Row] = []
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _rows(self, index: int) -> List[Row]:
+        if self._cached != index:
+            self._cached_rows = self._reader.batch(index)
+            self._cached = index
+        return self._cached_rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("table row index out of range")
+        batch = bisect.bisect_right(self._starts, index) - 1
+        return self._rows(batch)[index - self._starts[batch]]
+
+    def __iter__(self) -> Iterator[Row]:
+        for index in range(len(self._reader)):
+            yield from self._reader.batch(index)
+
+    def __repr__(self) -> str:
+        return f"<SharedTable of {self._length} rows>"
+
+    def column(self, name: str) -> List[Any]:
+        """Every row's value of one column, None where a row lacks it, without decoding other columns"""
+        values: List[Any] = []
+        for index in range(len(self._reader)):
+            values.extend(self._reader.column(index, name))
+        return values
+
+    def close(self) -> None:
+        self._cached_rows = []
+        try:
+            self._reader.release()
+            self._map.close()
+        except BufferError:
+            pass  # A view is still held, e.g. by a traceback; the mapping closes once it is collected
+
+
+class SharedTableStore:
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = Path(directory or default_directory())
+        self.max_bytes = max_bytes
+        self._checked = False
+
+    def __getstate__(self):
+        # Every process checks the directory itself
+        return {**self.__dict__, "_checked": False}
+
+    def _check_directory(self) -> None:
+        if not self._checked:
+            private_directory(self.directory)
+            self._checked = True
+
+    def _prefix(self, database_url: str, table_id: int) -> str:
+        return f"{hashlib.sha1(database_url.encode()).hexdigest()[:12]}-{table_id}-"
+
+    def path(self, database_url: str, table_id: int, version: str) -> Path:
+        return self.directory / f"{self._prefix(database_url, table_id)}{hashlib.sha1(version.encode()).hexdigest()[:16]}.tbl"
+
+    def open(self, database_url: str, table_id: int, version: str) -> Optional[SharedTable]:
+        """Map a stored table version read-only, or return None if it is not stored (or unreadable)"""
+        self._check_directory()
+        try:
+            with open(self.path(database_url, table_id, version), "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):  # ValueError: an empty file cannot be mapped
+            return None
+        try:
+            return SharedTable(buffer)
+        except (ValueError, KeyError, struct.error):
+            return None  # Corrupt; the caller stores the version again
+
+    def contains(self, database_url: str, table_id: int, version: str) -> bool:
+        return self.path(database_url, table_id, version).exists()
+
+    def put(self, database_url: str, table_id: int, version: str, rows: List[Row]) -> SharedTable:
+        """Store a table version and return it mapped"""
+        self._check_directory()
+        path = self.path(database_url, table_id, version)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w+b") as f:
+                write_rows(f, rows)
+                f.flush()
+                # Mapped before the rename, so a concurrent prune cannot take it away
+                table = SharedTable(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        self._prune(path, self._prefix(database_url, table_id))
+        return table
+
+    def _prune(self, written: Path, prefix: str) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".tbl") or entry.path == str(written):
+                continue
+            try:
+                if entry.name.startswith(prefix):
+                    os.unlink(entry.path)  # An older version of the same table
+                else:
+                    stat_result = entry.stat()
+                    entries.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+            except FileNotFoundError:
+                pass  # Removed by another process
+        try:
+            total = written.stat().st_size
+        except FileNotFoundError:
+            total = 0
+        total += sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
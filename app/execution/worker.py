@@ -0,0 +1,411 @@
+"""Code that runs inside execution worker processes.
+
+A submission is Python source defining `run(inputs, parameters)`, where inputs
+maps each input name to a read-only sequence of its rows (a SharedTable, see
+shared.py; list() it for a mutable copy), and which returns a dict mapping
+each output name to a list of rows. Workers apply the run's limits before
+calling it:
+
+- cpu_seconds: CPU time, enforced with RLIMIT_CPU (SIGXCPU)
+- memory_mb: address space, enforced with RLIMIT_AS (MemoryError)
+- wall_seconds: wall-clock time, enforced with a SIGALRM timer
+
+Loading the inputs before the run and comparing the outputs after it are
+timed separately, against load_seconds and compare_seconds, so a slow
+database read is not charged to the submission.
+Only soft limits are changed, so they can be lifted again after the run and
+the worker reused. This is process isolation with resource limits, not a
+security boundary; do not run untrusted code without an OS-level sandbox.
+
+After a run the worker compares the outputs against the expected tables
+itself (see compare.py), streaming the expected rows from the database, so
+only the diff travels back to the API process.
+
+Workers are long-lived and keep submission modules in an LRU cache, keyed by
+a hash of their code, so a submission is compiled and its module body
+executed once per worker; module-level state therefore persists across that
+worker's runs. Input tables are mapped read-only from the shared table store
+(see shared.py), keyed by (table id, updated_at); on a miss the worker reads
+the table from the database and stores it for every other worker. Rows are
+decoded from the mapping a batch at a time as the run reads them.
+
+The app's database modules are imported on the first table load rather than
+at import time, so spawned workers start quickly.
+
+Every run reports its wall and CPU time, the peak RSS of the worker while it
+ran and its input and output row counts. A run whose parameters set
+"profile" is run under cProfile, and the PROFILE_ENTRIES functions with the
+most cumulative time are returned with the result.
+
+When the pool gives a worker a progress queue, the worker reports on it
+when it picks up a run, which starts the pool's deadline for the run, and a
+run tagged with its ids reports each stage on it (see events.py); reports
+never block the run.
+"""
+import cProfile
+import hashlib
+import os
+import pstats
+import signal
+import time
+import traceback
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .compare import PARTITION_ROWS, PROGRESS_ROWS, RowComparator
+from .shared import SharedTable, SharedTableStore
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+ENTRY_POINT = "run"
+
+# Result status values
+COMPLETED = "completed"
+ERROR = "error"
+TIMEOUT = "timeout"
+CPU_LIMIT = "cpu_limit"
+MEMORY_LIMIT = "memory_limit"
+
+# Stage reported on the progress queue when a worker starts a run
+PICKED_UP = "picked_up"
+
+# (table id, version) where version is the table's updated_at in ISO format
+TableRef = Tuple[int, str]
+
+MODULE_CACHE_SIZE = 32
+COMPARE_PARTITION_ROWS = PARTITION_ROWS
+PROFILE_ENTRIES = 30
+
+_modules: "OrderedDict[str, Callable]" = OrderedDict()
+_store = SharedTableStore()
+_engines: Dict[str, Any] = {}
+_progress: Optional[Any] = None  # multiprocessing queue of (tag, stage, data)
+
+
+class WallClockExceeded(Exception):
+    pass
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+def _raise_wall_clock(signum, frame):
+    raise WallClockExceeded()
+
+
+def _raise_cpu_limit(signum, frame):
+    raise CpuLimitExceeded()
+
+
+def init_worker(
+    module_cache_size: int, compare_partition_rows: int, store: SharedTableStore, progress=None
+) -> None:
+    """Pool initializer: size this worker's module cache and comparison memory budget"""
+    global MODULE_CACHE_SIZE, COMPARE_PARTITION_ROWS, _store, _progress
+    MODULE_CACHE_SIZE = module_cache_size
+    COMPARE_PARTITION_ROWS = compare_partition_rows
+    _store = store
+    _progress = progress
+
+
+def report(tag: Optional[Dict[str, Any]], stage: str, **data) -> None:
+    """Send a progress report for the run identified by tag, if anyone is listening"""
+    if _progress is None or tag is None:
+        return
+    try:
+        _progress.put_nowait((tag, stage, data))
+    except Exception:
+        pass  # Progress is best effort
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        # Peak rather than current RSS, in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else 0
+        return peak / 1024
+
+
+def reset_peak_rss() -> bool:
+    """Reset this process's peak RSS to its current RSS, where the OS allows it (Linux 4.0+)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size in MB since the last reset_peak_rss, or over the process lifetime"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # In KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else 0
+    return peak / 1024
+
+
+def profile_summary(profiler: cProfile.Profile, limit: int = PROFILE_ENTRIES) -> List[Dict[str, Any]]:
+    """The functions with the most cumulative time in a profile"""
+    stats = pstats.Stats(profiler).stats
+    entries = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": function,
+            "file": file,
+            "line": line,
+            "calls": calls,
+            "primitive_calls": primitive_calls,
+            "total_time": total_time,
+            "cumulative_time": cumulative_time,
+        }
+        for (file, line, function), (primitive_calls, calls, total_time, cumulative_time, _) in entries
+    ]
+
+
+def load_entry(code: str) -> Callable:
+    """Return the submission's entry point, compiling and executing its module on a cache miss"""
+    key = hashlib.sha256(code.encode()).hexdigest()
+    entry = _modules.get(key)
+    if entry is not None:
+        _modules.move_to_end(key)
+        return entry
+
+    namespace: Dict[str, Any] = {"__name__": "submission"}
+    exec(compile(code, "<submission>", "exec"), namespace)
+    entry = namespace.get(ENTRY_POINT)
+    if not callable(entry):
+        raise TypeError(f"Submission must define a callable {ENTRY_POINT}(inputs, parameters)")
+    _modules[key] = entry
+    while len(_modules) > MODULE_CACHE_SIZE:
+        _modules.popitem(last=False)
+    return entry
+
+
+def _engine(database_url: str):
+    from sqlmodel import create_engine
+
+    engine = _engines.get(database_url)
+    if engine is None:
+        engine = _engines[database_url] = create_engine(database_url)
+    return engine
+
+
+def _read_table(database_url: str, table_id: int):
+    from sqlmodel import Session
+    from ..crud.table_rows import read_rows
+    from ..models.table_data import TableData
+
+    with Session(_engine(database_url)) as session:
+        table = session.get(TableData, table_id)
+        if table is None:
+            raise LookupError(f"Table {table_id} not found")
+        return table.updated_at.isoformat(), read_rows(session, table)
+
+
+def _stream_table(database_url: str, table_id: int) -> Iterator[Dict[str, Any]]:
+    """Yield a table's rows a chunk at a time, without caching them"""
+    from sqlmodel import Session
+    from ..crud.table_rows import iter_rows
+    from ..models.table_data import TableData
+
+    with Session(_engine(database_url)) as session:
+        table = session.get(TableData, table_id)
+        if table is None:
+            raise LookupError(f"Table {table_id} not found")
+        yield from iter_rows(session, table)
+
+
+def compare_outputs(
+    database_url: str,
+    outputs: Dict[str, Any],
+    expected: Dict[str, Dict[str, Any]],
+    tag: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Diff each expected output against its table, keyed by output name; empty if all match"""
+    diff: Dict[str, Any] = {}
+    for name, spec in expected.items():
+        if name not in outputs:
+            diff[name] = {"error": "Output missing"}
+            continue
+        comparator = RowComparator(spec.get("key_columns") or (), spec.get("tolerances"))
+        table_id = spec["table_id"]
+        output_diff = comparator.compare(
+            outputs[name], lambda: _stream_table(database_url, table_id), partition_rows=COMPARE_PARTITION_ROWS,
+            progress=lambda rows, name=name: report(tag, "comparing", output=name, rows=rows),
+            progress_rows=PROGRESS_ROWS,
+        )
+        if output_diff:
+            diff[name] = output_diff
+    return diff
+
+
+def load_table(database_url: str, ref: TableRef) -> SharedTable:
+    """Return a table's rows mapped read-only from the shared store, storing the table on a miss"""
+    table_id, version = ref
+    table = _store.open(database_url, table_id, version)
+    if table is None:
+        read_version, rows = _read_table(database_url, table_id)
+        # The table may have been written since the run was queued; store what was actually read
+        table = _store.put(database_url, table_id, read_version, rows)
+    return table
+
+
+def _close_tables(tables: Dict[str, SharedTable]) -> None:
+    for table in tables.values():
+        table.close()
+
+
+def _cpu_used() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _set_soft_limit(kind: int, value: int) -> None:
+    soft, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(kind, (value, hard))
+
+
+def start_alarm(seconds: Optional[float]) -> None:
+    """Raise WallClockExceeded once seconds have passed, if set"""
+    if seconds:
+        signal.signal(signal.SIGALRM, _raise_wall_clock)
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+
+
+def stop_alarm() -> None:
+    signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def apply_limits(limits: Dict[str, Any]) -> None:
+    if resource is not None:
+        if limits.get("cpu_seconds"):
+            # RLIMIT_CPU counts the whole process lifetime, so offset by what this worker already used
+            signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+            _set_soft_limit(resource.RLIMIT_CPU, int(_cpu_used() + limits["cpu_seconds"]) + 1)
+        if limits.get("memory_mb"):
+            _set_soft_limit(resource.RLIMIT_AS, int(limits["memory_mb"] * 1024 * 1024))
+    start_alarm(limits.get("wall_seconds"))
+
+
+def clear_limits() -> None:
+    stop_alarm()
+    if resource is not None:
+        for kind in (resource.RLIMIT_CPU, resource.RLIMIT_AS):
+            soft, hard = resource.getrlimit(kind)
+            resource.setrlimit(kind, (hard, hard))
+
+
+def _check_outputs(outputs: Any) -> None:
+    if not isinstance(outputs, dict):
+        raise TypeError(f"{ENTRY_POINT}() must return a dict of output name to rows, got {type(outputs).__name__}")
+    for name, rows in outputs.items():
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise TypeError(f"Output {name!r} must be a list of row dicts")
+
+
+def run_submission(
+    code: str,
+    database_url: str,
+    inputs: Dict[str, TableRef],
+    expected: Dict[str, Dict[str, Any]],
+    parameters: Dict[str, Any],
+    limits: Dict[str, Any],
+    tag: Optional[Dict[str, Any]] = None,
+    token: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Load the input tables, run a submission on them under limits and diff its outputs.
+
+    expected maps each output name to {"table_id", "key_columns", "tolerances"}.
+    tag identifies the run in progress reports, and token the run's pickup report.
+    Never raises; failures are reported in the result, along with the
+    worker's resident memory so the pool can recycle bloated workers.
+    """
+    if _progress is not None and token is not None:
+        try:
+            _progress.put_nowait((None, PICKED_UP, {"token": token, "pid": os.getpid()}))
+        except Exception:
+            pass  # The pool then times the run from submission
+    result: Dict[str, Any] = {"status": COMPLETED, "diff": {}, "output_row_counts": {}, "error": None}
+    tables: Dict[str, SharedTable] = {}
+    try:
+        start_alarm(limits.get("load_seconds"))
+        for name, ref in inputs.items():
+            tables[name] = load_table(database_url, ref)
+    except WallClockExceeded:
+        _close_tables(tables)
+        result.update(
+            status=TIMEOUT, error=f"Loading inputs exceeded {limits.get('load_seconds')}s",
+            wall_time=0.0, cpu_time=0.0, rss_mb=rss_mb(),
+        )
+        return result
+    except Exception:
+        _close_tables(tables)
+        result.update(status=ERROR, error=traceback.format_exc(limit=-3), wall_time=0.0, cpu_time=0.0, rss_mb=rss_mb())
+        return result
+    finally:
+        stop_alarm()
+    report(tag, "loaded", inputs=sorted(tables))
+
+    outputs: Optional[Dict[str, Any]] = None
+    profiler = cProfile.Profile() if parameters.get("profile") else None
+    reset_peak_rss()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        apply_limits(limits)
+        entry = load_entry(code)
+        result["input_row_count"] = sum(len(table) for table in tables.values())
+        if profiler is not None:
+            outputs = profiler.runcall(entry, dict(tables), parameters)
+        else:
+            outputs = entry(dict(tables), parameters)
+        if isinstance(outputs, dict):
+            # An input passed through as an output is decoded before its mapping closes
+            outputs = {name: list(rows) if isinstance(rows, SharedTable) else rows for name, rows in outputs.items()}
+        _check_outputs(outputs)
+    except WallClockExceeded:
+        result.update(status=TIMEOUT, error=f"Wall-clock limit of {limits.get('wall_seconds')}s exceeded")
+    except CpuLimitExceeded:
+        result.update(status=CPU_LIMIT, error=f"CPU time limit of {limits.get('cpu_seconds')}s exceeded")
+    except MemoryError:
+        result.update(status=MEMORY_LIMIT, error=f"Memory limit of {limits.get('memory_mb')} MB exceeded")
+    except BaseException:
+        result.update(status=ERROR, error=traceback.format_exc(limit=-5))
+    finally:
+        clear_limits()
+        _close_tables(tables)
+    result["wall_time"] = time.perf_counter() - wall_start
+    result["cpu_time"] = time.process_time() - cpu_start
+    result["peak_rss_mb"] = peak_rss_mb()
+    if profiler is not None:
+        result["profile"] = profile_summary(profiler)
+
+    if result["status"] == COMPLETED:
+        result["output_row_counts"] = {name: len(rows) for name, rows in outputs.items()}
+        report(tag, "ran", wall_time=result["wall_time"], output_row_counts=result["output_row_counts"])
+        try:
+            start_alarm(limits.get("compare_seconds"))
+            result["diff"] = compare_outputs(database_url, outputs, expected, tag)
+        except WallClockExceeded:
+            result.update(status=TIMEOUT, error=f"Comparing outputs exceeded {limits.get('compare_seconds')}s")
+        except Exception:
+            result.update(status=ERROR, error=traceback.format_exc(limit=-3))
+        finally:
+            stop_alarm()
+    result["rss_mb"] = rss_mb()
+    return result
@@ -1,17 +1,25 @@
-import json
+import asyncio
 from contextlib import asynccontextmanager
-from datetime import datetime # Import datetime
 from fastapi import FastAPI, Request, Depends, HTTPException # Added Depends, HTTPException
 from fastapi.responses import HTMLResponse # Added for HTML response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from sqlmodel import SQLModel, Session, select # Added Session and select
 from pathlib import Path
-from .core.database import engine, get_session # Added get_session
+from .core.database import engine, get_async_session # Added get_async_session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .models.function_def import FunctionDef # Added FunctionDef
 from .models.object_schema import ObjectSchema # Added ObjectSchema
 from .models.table_data import TableData # Added TableData
-from .api.v1.endpoints import objects, tables, functions, test_cases
+from .crud import table_rows, dependencies
+from .crud.migrations import add_comparison_columns, migrate_inline_rows
+from .crud.metadata_cache import metadata_cache
+from .api.responses import FastJSONResponse, dumps_html_safe
+from .api.v1.endpoints import objects, tables, functions, test_cases, submissions, runs, cache
+from .execution.pool import get_execution_pool, shutdown_execution_pool
+from .execution.queue import start_consumers
+from .core.database import new_async_session
+from .core.config import settings
 from typing import List # Added List
 
 # Lifespan context manager for startup/shutdown events
@@ -21,16 +29,30 @@ async def lifespan(app: FastAPI):
     print("Creating database tables...")
     create_db_and_tables()
     print("Database tables created.")
+    create_dependency_index()
     create_sample_data() # Call the new function
+    if settings.metadata_cache_broadcast_dir:
+        metadata_cache.start_broadcast(settings.metadata_cache_broadcast_dir)
+    # Execute queued test runs in this process unless separate workers do it
+    consumers = settings.execution_queue_consumers
+    if consumers is None:
+        consumers = get_execution_pool().max_workers
+    stop = asyncio.Event()
+    tasks = start_consumers(new_async_session, consumers, stop)
     yield
-    # Shutdown logic (if any)
+    # Shutdown logic
     print("Shutting down...")
+    stop.set()
+    await asyncio.gather(*tasks)
+    shutdown_execution_pool()
+    metadata_cache.stop_broadcast()
 
 # Create FastAPI app with lifespan manager
 app = FastAPI(
     title="Schema & Process Management API",
     description="API for managing Objects, Tables, Functions, and TestCases",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
     lifespan=lifespan
 )
 
@@ -45,10 +67,24 @@ app.include_router(objects.router, prefix="/api/v1")
 app.include_router(tables.router, prefix="/api/v1")
 app.include_router(functions.router, prefix="/api/v1")
 app.include_router(test_cases.router, prefix="/api/v1")
+app.include_router(submissions.router, prefix="/api/v1")
+app.include_router(runs.router, prefix="/api/v1")
+app.include_router(cache.router, prefix="/api/v1")
 
 # Create tables on startup
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    # Databases from before output comparison settings lack them on objects
+    add_comparison_columns(engine)
+    # Databases from before chunked row storage keep their rows in tables.data
+    moved = migrate_inline_rows(engine)
+    if moved:
+        print(f"Moved the rows of {moved} tables into chunks.")
+
+def create_dependency_index():
+    with Session(engine) as session:
+        dependencies.ensure_index(session)
+        session.commit()
 
 # Function to create sample data
 def create_sample_data():
@@ -83,12 +119,10 @@ def create_sample_data():
         else:
             print("Found existing Sample Product.")
 
-        # Commit here to ensure objects have IDs before creating tables
-        session.commit()
-        # Refresh objects to get IDs assigned by the database
-        if customer: session.refresh(customer)
-        if product: session.refresh(product)
-        print("Committed/Refreshed sample objects.")
+        # Flush (not commit) so objects have IDs before creating tables;
+        # all sample data is written in the single commit at the end
+        session.flush()
+        print("Flushed sample objects.")
 
 
         # --- Add Sample Table Data ---
@@ -109,9 +143,10 @@ def create_sample_data():
                     name=customer_table_name,
                     description="A few sample customer records.",
                     object_id=customer.id,
-                    data=customer_rows
                 )
                 session.add(cust_table)
+                session.flush() # Assign an id before writing row chunks
+                table_rows.replace_rows(session, cust_table, customer_rows)
                 print(f"Adding sample table: {customer_table_name}")
                 needs_table_commit = True
             else:
@@ -132,15 +167,16 @@ def create_sample_data():
                     {"sku": "BOOK-003", "price": 15.00, "in_stock": True, "title": "API Adventures"},
                 ]
                 # Note: 'title' might not be in the base 'Sample Product' object schema's attributes.
-                # The TableData.data field stores arbitrary JSON, but validation against
+                # The table rows store arbitrary JSON, but validation against
                 # the linked ObjectSchema might occur elsewhere (e.g., in API endpoints).
                 book_table = TableData(
                     name=book_table_name,
                     description="Sample products for a bookstore.",
                     object_id=product.id,
-                    data=book_rows
                 )
                 session.add(book_table)
+                session.flush() # Assign an id before writing row chunks
+                table_rows.replace_rows(session, book_table, book_rows)
                 print(f"Adding sample table: {book_table_name}")
                 needs_table_commit = True
             else:
@@ -165,9 +201,10 @@ def create_sample_data():
                     name=jewelry_table_name,
                     description="Sample products for a jewelry store.",
                     object_id=product.id,
-                    data=jewelry_rows
                 )
                 session.add(jewelry_table)
+                session.flush() # Assign an id before writing row chunks
+                table_rows.replace_rows(session, jewelry_table, jewelry_rows)
                 print(f"Adding sample table: {jewelry_table_name}")
                 needs_table_commit = True
             else:
@@ -176,9 +213,9 @@ def create_sample_data():
              print(f"Skipping sample jewelry table creation (Product object missing or has no ID).")
 
 
+        session.commit()
         if needs_table_commit:
-            session.commit()
-            print("Committed sample table data.")
+            print("Committed sample data.")
         else:
             print("No new sample table data to commit.")
 
@@ -199,8 +236,8 @@ async def get_objects_list_page(request: Request):
 
 # Edit an object
 @app.get("/object/edit/{object_id}", response_class=HTMLResponse)
-async def get_object_edit_page(request: Request, object_id: int, session: Session = Depends(get_session)):
-    object_data = session.get(ObjectSchema, object_id)
+async def get_object_edit_page(request: Request, object_id: int, session: AsyncSession = Depends(get_async_session)):
+    object_data = await session.get(ObjectSchema, object_id)
     # return 404 if not exist
     if not object_data:
         return templates.TemplateResponse("404.html", {"request": request})
@@ -211,10 +248,10 @@ async def get_object_edit_page(request: Request, object_id: int, session: Sessio
 
 # Endpoint to serve the table creation form
 @app.get("/table/create", response_class=HTMLResponse)
-async def get_table_create_form(request: Request, session: Session = Depends(get_session)):
+async def get_table_create_form(request: Request, session: AsyncSession = Depends(get_async_session)):
     # Fetch all objects to populate the dropdown
     statement = select(ObjectSchema)
-    object_list = session.exec(statement).all()
+    object_list = (await session.exec(statement)).all()
     return templates.TemplateResponse("table_create.html", {"request": request, "objects": object_list})
 
 # Endpoint to serve the table list page
@@ -225,42 +262,30 @@ async def get_tables_list_page(request: Request):
 
 # Endpoint to serve the table edit form
 @app.get("/table/edit/{table_id}", response_class=HTMLResponse)
-async def get_table_edit_page(request: Request, table_id: int, session: Session = Depends(get_session)):
+async def get_table_edit_page(request: Request, table_id: int, session: AsyncSession = Depends(get_async_session)):
     # Fetch the specific table
-    table_data = session.get(TableData, table_id)
+    table_data = await session.get(TableData, table_id)
     if not table_data:
         raise HTTPException(status_code=404, detail=f"Table with id {table_id} not found")
 
     # Fetch all objects to populate the dropdown
     statement = select(ObjectSchema)
-    object_list = session.exec(statement).all()
-
-    # Convert table_data to dict for JSON serialization
-    table_data_dict = table_data.dict()
-
-    # Manually convert datetime objects to ISO strings for JSON
-    def default_serializer(obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
-
-    # Use json.dumps with the custom serializer, then json.loads to get a clean dict
-    # This ensures all nested datetimes are handled.
-    serializable_table_data_str = json.dumps(table_data_dict, default=default_serializer)
-    serializable_table_data_dict = json.loads(serializable_table_data_str)
+    object_list = (await session.exec(statement)).all()
 
+    # Encoded once, datetimes included, for the page's <script type="application/json"> element
+    table_json = dumps_html_safe(await session.run_sync(table_rows.to_read_model, table_data))
 
     return templates.TemplateResponse("table_edit.html", {
         "request": request,
         "table": table_data, # Pass the original object for direct field access (e.g., table.id)
-        "table_json": serializable_table_data_dict, # Pass the fully JSON-serializable dict
+        "table_json": table_json, # Already-encoded, HTML-safe JSON
         "objects": object_list
     })
 
 # Endpoint to serve the test case creation form
 @app.get("/test-case/create", response_class=HTMLResponse)
-async def get_test_case_create_form(request: Request, session: Session = Depends(get_session)):
+async def get_test_case_create_form(request: Request, session: AsyncSession = Depends(get_async_session)):
     # Fetch all functions to populate the dropdown
     statement = select(FunctionDef)
-    function_list = session.exec(statement).all()
+    function_list = (await session.exec(statement)).all()
     return templates.TemplateResponse("test_case_create.html", {"request": request, "functions": function_list})
\ No newline at end of file
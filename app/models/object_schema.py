@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from sqlmodel import SQLModel, Field
 from datetime import datetime
 from sqlalchemy import JSON
@@ -10,5 +10,11 @@ class ObjectSchema(SQLModel, table=True):
     name: str = Field(index=True)
     description: Optional[str] = None
     attributes: Dict[str, Any] = Field(default_factory=dict, sa_type=JSON)
+    
+    # How test outputs of this schema are compared with expected tables:
+    # rows pair up by key_columns (whole rows when empty), and numeric
+    # attributes in tolerances may differ by up to the given amount
+    key_columns: List[str] = Field(default_factory=list, sa_type=JSON)
+    tolerances: Dict[str, float] = Field(default_factory=dict, sa_type=JSON)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
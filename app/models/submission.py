@@ -0,0 +1,33 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field, Relationship
+from datetime import datetime
+from .function_def import FunctionDef
+
+class Submission(SQLModel, table=True):
+    __tablename__ = "submissions"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(index=True)
+    description: Optional[str] = None
+    
+    # The function specification this code implements
+    function_id: int = Field(foreign_key="functions.id", index=True)
+    
+    # Python source defining run(inputs, parameters) -> {output_name: rows}
+    code: str
+    
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    # Relationships
+    function: FunctionDef = Relationship()
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "name": "double_values",
+                "function_id": 1,
+                "code": "def run(inputs, parameters):\n    return {'result': [{'value': row['value'] * 2} for row in inputs['source']]}\n",
+            }
+        }
@@ -0,0 +1,15 @@
+from typing import Optional, Dict, Any, List
+from sqlmodel import SQLModel, Field
+from sqlalchemy import JSON, Index
+
+class TableChunk(SQLModel, table=True):
+    __tablename__ = "table_chunks"
+    __table_args__ = (
+        Index("ix_table_chunks_table_id_chunk_index", "table_id", "chunk_index", unique=True),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    table_id: int = Field(foreign_key="tables.id")
+    chunk_index: int  # Position of this chunk within the table (0-based)
+    row_count: int = 0
+    rows: List[Dict[str, Any]] = Field(default_factory=list, sa_type=JSON)  # Up to TableData.chunk_size rows
@@ -4,16 +4,41 @@ from datetime import datetime
 from sqlalchemy import JSON
 from .object_schema import ObjectSchema
 
-class TableData(SQLModel, table=True):
-    __tablename__ = "tables"
-    
-    id: Optional[int] = Field(default=None, primary_key=True)
+DEFAULT_CHUNK_SIZE = 1000
+
+class TableDataBase(SQLModel):
     name: str = Field(index=True)
     description: Optional[str] = None
     object_id: int = Field(foreign_key="objects.id")
-    data: List[Dict[str, Any]] = Field(default_factory=list, sa_type=JSON)  # List of rows conforming to object schema
+
+class TableData(TableDataBase, table=True):
+    __tablename__ = "tables"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Rows live in the table_chunks table (see app/crud/table_rows.py)
+    row_count: int = 0
+    columns: List[str] = Field(default_factory=list, sa_type=JSON)  # Field names seen in the rows, in first-seen order
+    chunk_size: int = DEFAULT_CHUNK_SIZE
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
     # Relationship to ObjectSchema
     object: ObjectSchema = Relationship()
+
+class TableDataCreate(TableDataBase):
+    data: List[Dict[str, Any]] = Field(default_factory=list)  # List of rows conforming to object schema
+
+class TableDataSummary(TableDataBase):
+    id: int
+    row_count: int = 0
+    columns: List[str] = Field(default_factory=list)
+    created_at: datetime
+    updated_at: datetime
+
+class TableDataRead(TableDataBase):
+    id: int
+    row_count: int = 0
+    columns: List[str] = Field(default_factory=list)
+    data: List[Dict[str, Any]] = Field(default_factory=list)
+    created_at: datetime
+    updated_at: datetime
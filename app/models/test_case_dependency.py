@@ -0,0 +1,20 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+
+# Kinds of entity a test case can depend on
+DEPENDS_ON_TABLE = "table"
+DEPENDS_ON_OBJECT = "object"
+DEPENDS_ON_FUNCTION = "function"
+
+class TestCaseDependency(SQLModel, table=True):
+    """Reverse index entry: test_case_id depends on the entity (kind, ref_id)"""
+    __tablename__ = "test_case_dependencies"
+    __table_args__ = (
+        Index("ix_test_case_dependencies_kind_ref_id", "kind", "ref_id"),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    test_case_id: int = Field(foreign_key="test_cases.id", index=True)
+    kind: str
+    ref_id: int
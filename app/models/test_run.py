@@ -0,0 +1,51 @@
+from typing import Optional, Dict, Any, List
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+from sqlalchemy import JSON
+
+# Run status values
+RUN_QUEUED = "queued"
+RUN_RUNNING = "running"
+RUN_PASSED = "passed"
+RUN_FAILED = "failed"
+RUN_ERROR = "error"
+RUN_TIMEOUT = "timeout"
+RUN_FINISHED_STATUSES = (RUN_PASSED, RUN_FAILED, RUN_ERROR, RUN_TIMEOUT)
+
+# A run is also a job in the execution queue: queued -> running -> one of
+# passed/failed/error/timeout. A running job whose lease has expired (its
+# worker died) is claimed again, up to a maximum number of attempts.
+class TestRun(SQLModel, table=True):
+    __tablename__ = "test_runs"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    test_case_id: int = Field(foreign_key="test_cases.id", index=True)
+    submission_id: int = Field(foreign_key="submissions.id", index=True)
+    status: str = Field(default=RUN_QUEUED, index=True)
+    
+    # Outcome: per-output differences from the expected tables, or the error raised
+    passed: Optional[bool] = None
+    diff: Dict[str, Any] = Field(default_factory=dict, sa_type=JSON)
+    error: Optional[str] = None
+    # True when the outcome was served from the result cache instead of executed
+    cached: bool = False
+    
+    # Queue bookkeeping
+    attempts: int = 0
+    claimed_by: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    
+    # Resource usage reported by the worker; rows_per_second is input rows over wall time
+    wall_time: Optional[float] = None
+    cpu_time: Optional[float] = None
+    peak_rss_mb: Optional[float] = None
+    input_rows: Optional[int] = None
+    output_rows: Optional[int] = None
+    rows_per_second: Optional[float] = None
+    # Functions with the most cumulative time, when the test case's parameters set "profile"
+    profile: Optional[List[Dict[str, Any]]] = Field(default=None, sa_type=JSON)
+    
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,139 @@
+"""Compare database engine profiles on the workloads their settings target.
+
+Usage: python -m benchmarks.db_profiles [--commits N] [--readers N] [--profiles default sqlite] [--dir PATH]
+
+Each profile gets a fresh SQLite file (in --dir, default the temp directory;
+it should be on a disk, since tmpfs makes fsync free). Three phases:
+
+- commit: appends one row per transaction, as the API does for small
+  appends. Each commit waits for the disk, which synchronous=NORMAL under WAL
+  reduces to one sync per checkpoint.
+- mixed: one writer appends batches while reader threads read tables back in
+  full. Under the rollback journal a write blocks readers and a reader blocks
+  the writer's commit; under WAL they proceed concurrently.
+- read: every table read back in full, one after another (mmap_size and
+  cache_size).
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.core.config import Settings, get_engine_profile, apply_pragmas
+from app.crud import table_rows
+from app.models.object_schema import ObjectSchema
+from app.models.table_data import TableData
+
+
+def _create_tables(engine, tables: int):
+    with Session(engine) as session:
+        object_schema = ObjectSchema(name="bench", attributes={"id": "integer", "name": "string"})
+        session.add(object_schema)
+        session.commit()
+        session.refresh(object_schema)
+        table_ids = []
+        for i in range(tables):
+            table = TableData(name=f"bench_{i}", object_id=object_schema.id, chunk_size=100)
+            session.add(table)
+            session.commit()
+            table_ids.append(table.id)
+    return table_ids
+
+
+def _append(engine, table_id: int, start: int, count: int):
+    with Session(engine) as session:
+        table = session.get(TableData, table_id)
+        table_rows.append_rows(session, table, [{"id": n, "name": f"row {n}"} for n in range(start, start + count)])
+        session.commit()
+
+
+def _read(engine, table_id: int) -> int:
+    with Session(engine) as session:
+        return len(table_rows.read_rows(session, session.get(TableData, table_id)))
+
+
+def run_workload(engine, tables: int, rows: int, commits: int, readers: int, batch_size: int):
+    results = {}
+    table_ids = _create_tables(engine, tables)
+    counts = dict.fromkeys(table_ids, 0)
+
+    start = time.perf_counter()
+    for n in range(commits):
+        table_id = table_ids[n % tables]
+        _append(engine, table_id, counts[table_id], 1)
+        counts[table_id] += 1
+    results["commit"] = time.perf_counter() - start
+
+    stop = threading.Event()
+    reads = [0] * readers
+    errors = [0]
+
+    def reader(index: int):
+        n = index
+        while not stop.is_set():
+            try:
+                _read(engine, table_ids[n % tables])
+                reads[index] += 1
+            except OperationalError:  # database is locked
+                errors[0] += 1
+            n += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    for table_id in table_ids:
+        while counts[table_id] < rows:
+            count = min(batch_size, rows - counts[table_id])
+            try:
+                _append(engine, table_id, counts[table_id], count)
+                counts[table_id] += count
+            except OperationalError:
+                errors[0] += 1
+    results["mixed"] = elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    results["reads/s"] = sum(reads) / elapsed
+    results["errors"] = errors[0]
+
+    start = time.perf_counter()
+    for table_id in table_ids:
+        assert _read(engine, table_id) == counts[table_id]
+    results["read"] = time.perf_counter() - start
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--commits", type=int, default=1000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--profiles", nargs="+", default=["default", "sqlite"])
+    parser.add_argument("--dir", help="Directory for the database files (default: the temp directory)")
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'commit':>9} {'mixed':>9} {'reads/s':>9} {'errors':>7} {'read':>9}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for name in args.profiles:
+            settings = Settings(database_url=f"sqlite:///{Path(tmp) / (name + '.db')}", db_echo=False)
+            profile = get_engine_profile(settings, name)
+            engine = create_engine(settings.database_url, **profile.engine_kwargs)
+            apply_pragmas(engine, profile)
+            SQLModel.metadata.create_all(engine)
+            results = run_workload(engine, args.tables, args.rows, args.commits, args.readers, args.batch_size)
+            engine.dispose()
+            print(
+                f"{name:<10} {results['commit']:>8.3f}s {results['mixed']:>8.3f}s "
+                f"{results['reads/s']:>9.1f} {results['errors']:>7} {results['read']:>8.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
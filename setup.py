@@ -8,9 +8,11 @@ setup(
         "fastapi",
         "uvicorn",
         "sqlmodel",
+        "aiosqlite",
         "python-multipart",
         "jinja2",
         "python-dotenv",
+        "orjson",
     ],
     extras_require={
         "test": [
@@ -19,5 +21,13 @@ setup(
             "pytest-cov",
             "httpx",
         ],
+        "postgres": [
+            "psycopg2-binary",
+            "asyncpg",
+        ],
+        "compression": [
+            "zstandard",
+            "brotli",
+        ],
     },
 )
@@ -1,28 +1,62 @@
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 
 from app.main import app
-from app.core.database import get_session
+from app.core.database import get_session, get_async_session, to_async_url
+from app.execution.cache import result_cache
+from app.crud.metadata_cache import metadata_cache
+from app.api.compression import compressed_bodies
+from app.execution.queue import drain
 
-@pytest.fixture(name="session")
-def session_fixture():
+# The sync and async engines must see the same data, so tests use a temporary
+# SQLite file rather than an in-memory database
+@pytest.fixture(name="engine")
+def engine_fixture(tmp_path):
     engine = create_engine(
-        "sqlite://",
+        f"sqlite:///{tmp_path / 'test.db'}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
     SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(name="session")
+def session_fixture(engine):
     with Session(engine) as session:
         yield session
 
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(engine):
+    # NullPool gives every request a fresh connection on the event loop that serves it
+    return create_async_engine(to_async_url(str(engine.url)), poolclass=NullPool)
+
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, async_engine):
     def get_session_override():
         return session
 
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    result_cache.clear()
+    metadata_cache.clear()
+    compressed_bodies.clear()
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
+
+@pytest.fixture(name="run_queue")
+def run_queue_fixture(async_engine):
+    """Execute every queued test run, as the queue consumers would"""
+    def run_queue() -> int:
+        return asyncio.run(drain(lambda: AsyncSession(async_engine, expire_on_commit=False)))
+    return run_queue
@@ -0,0 +1,194 @@
+import asyncio
+
+from app.core.config import settings
+from app.execution.compare import RowComparator
+from app.execution.pool import ExecutionPool
+import os
+import stat
+
+import pytest
+
+from app.execution import shared
+from app.execution.shared import SharedTableStore
+
+# Module-level state survives between runs only while the worker and its cached module do
+COUNTER_CODE = """
+calls = []
+
+def run(inputs, parameters):
+    calls.append(1)
+    return {"calls": [{"n": n} for n in range(len(calls))]}
+"""
+
+
+def run_counts(pool: ExecutionPool, runs: int):
+    async def run_all():
+        counts = []
+        for _ in range(runs):
+            result = await pool.run(COUNTER_CODE, "sqlite://", {}, {}, {}, {"wall_seconds": 10})
+            assert result["status"] == "completed"
+            counts.append(result["output_row_counts"]["calls"])
+        return counts
+
+    try:
+        return asyncio.run(run_all())
+    finally:
+        pool.shutdown()
+
+def test_workers_keep_submissions_loaded():
+    assert run_counts(ExecutionPool(max_workers=1), 3) == [1, 2, 3]
+
+def test_workers_recycled_after_max_runs():
+    assert run_counts(ExecutionPool(max_workers=1, max_runs_per_worker=2), 4) == [1, 2, 1, 2]
+
+def test_workers_recycled_over_rss_limit():
+    assert run_counts(ExecutionPool(max_workers=1, max_rss_mb=1), 3) == [1, 1, 1]
+
+def test_workers_map_inputs_from_shared_store(tmp_path):
+    # The table exists only in the store, so the worker cannot have read it from the database
+    store = SharedTableStore(str(tmp_path))
+    store.put("sqlite://", 7, "v1", [{"value": 1}, {"value": 2}]).close()
+    pool = ExecutionPool(max_workers=1, store=store)
+    code = "def run(inputs, parameters):\n    return {'out': inputs['source']}\n"
+    try:
+        result = asyncio.run(pool.run(code, "sqlite://", {"source": (7, "v1")}, {}, {}, {"wall_seconds": 10}))
+    finally:
+        pool.shutdown()
+    assert result["status"] == "completed"
+    assert result["output_row_counts"] == {"out": 2}
+
+SLEEP_CODE = """
+import time
+
+def run(inputs, parameters):
+    time.sleep(parameters["sleep"])
+    return {}
+"""
+
+# Swallows the wall-clock alarm, so only the pool can stop it
+STUCK_CODE = """
+import time
+
+def run(inputs, parameters):
+    while True:
+        try:
+            time.sleep(10)
+        except BaseException:
+            pass
+"""
+
+def test_deadline_starts_when_worker_picks_up_run(monkeypatch):
+    monkeypatch.setattr(settings, "execution_timeout_grace", 0.1)
+    pool = ExecutionPool(max_workers=1)
+    limits = {"wall_seconds": 1.2, "load_seconds": 0.1, "compare_seconds": 0.1}
+
+    async def run_all():
+        # The last run waits two seconds for the worker, longer than its deadline
+        return await asyncio.gather(*(pool.run(SLEEP_CODE, "sqlite://", {}, {}, {"sleep": 1}, limits) for _ in range(3)))
+
+    try:
+        results = asyncio.run(run_all())
+    finally:
+        pool.shutdown()
+    assert [result["status"] for result in results] == ["completed"] * 3
+
+def test_stuck_worker_killed_and_other_runs_requeued(monkeypatch):
+    monkeypatch.setattr(settings, "execution_timeout_grace", 0.1)
+    pool = ExecutionPool(max_workers=2)
+    stuck_limits = {"wall_seconds": 0.5, "load_seconds": 0.1, "compare_seconds": 0.1}
+
+    async def run_both():
+        return await asyncio.gather(
+            pool.run(STUCK_CODE, "sqlite://", {}, {}, {}, stuck_limits),
+            pool.run(SLEEP_CODE, "sqlite://", {}, {}, {"sleep": 1.5}, {"wall_seconds": 10}),
+        )
+
+    try:
+        stuck, other = asyncio.run(run_both())
+    finally:
+        pool.shutdown()
+    assert stuck["status"] == "timeout"
+    assert "did not respond" in stuck["error"]
+    assert other["status"] == "completed"
+
+def test_shared_tables_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared, "BATCH_ROWS", 4)
+    store = SharedTableStore(str(tmp_path))
+    uniform = [{"id": i, "name": f"row {i}", "tags": [i]} for i in range(10)]
+    mixed = [{"id": 1}, {"id": 2, "extra": None}, {}]
+    for table_id, rows in enumerate((uniform, mixed, [], [{}, {}])):
+        store.put("sqlite://", table_id, "v1", rows).close()
+        table = store.open("sqlite://", table_id, "v1")
+        assert list(table) == rows
+        assert len(table) == len(rows)
+        table.close()
+    
+    # Rows are decoded from the mapping a batch at a time, by index or column
+    table = store.open("sqlite://", 0, "v1")
+    assert table[5] == uniform[5]
+    assert table[-1] == uniform[-1]
+    assert table[3:6] == uniform[3:6]
+    assert table.column("id") == list(range(10))
+    assert table.column("missing") == [None] * 10
+    with pytest.raises(IndexError):
+        table[10]
+    # Every read of the file decodes rows of its own
+    next(iter(table))["id"] = -1
+    assert list(table) == uniform
+    table.close()
+
+def test_shared_store_directory_is_private(tmp_path):
+    store = SharedTableStore(str(tmp_path / "tables"))
+    store.put("sqlite://", 1, "v1", [{"value": 1}]).close()
+    assert stat.S_IMODE(os.stat(tmp_path / "tables").st_mode) == 0o700
+    
+    # A directory others can write to, where anyone could plant files, is refused
+    shared_directory = tmp_path / "shared"
+    shared_directory.mkdir()
+    shared_directory.chmod(0o777)
+    with pytest.raises(PermissionError):
+        SharedTableStore(str(shared_directory)).open("sqlite://", 1, "v1")
+
+def test_shared_store_keeps_latest_version_within_budget(tmp_path):
+    store = SharedTableStore(str(tmp_path), max_bytes=10_000)
+    rows = [{"value": i} for i in range(1000)]
+    store.put("sqlite://", 1, "v1", rows).close()
+    store.put("sqlite://", 1, "v2", rows).close()
+    assert store.open("sqlite://", 1, "v1") is None
+    assert list(store.open("sqlite://", 1, "v2")) == rows
+    # Past the budget, the least recently written tables are removed
+    for table_id in range(2, 6):
+        store.put("sqlite://", table_id, "v1", rows).close()
+    assert not store.contains("sqlite://", 1, "v2")
+    assert store.contains("sqlite://", 5, "v1")
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 10_000
+
+def test_compare_ignores_row_order():
+    rows = [{"id": i, "name": f"row {i}"} for i in range(100)]
+    assert RowComparator().compare(rows, lambda: list(reversed(rows))) is None
+
+def test_compare_counts_duplicates():
+    diff = RowComparator().compare([{"a": 1}, {"a": 2}, {"a": 2}], lambda: [{"a": 2}, {"a": 1}, {"a": 1}])
+    assert (diff["matched"], diff["missing"], diff["unexpected"]) == (2, 1, 1)
+    assert diff["samples"] == {"missing": [{"a": 1}], "unexpected": [{"a": 2}]}
+
+def test_compare_with_key_columns_and_tolerance():
+    comparator = RowComparator(key_columns=["id"], tolerances={"price": 0.01})
+    actual = [{"id": 1, "price": 10.004}, {"id": 2, "price": 5.0}, {"id": 4, "price": 1.0}]
+    expected = [{"id": 1, "price": 10.0}, {"id": 2, "price": 6.0}, {"id": 3, "price": 2.0}]
+    diff = comparator.compare(actual, lambda: expected)
+    assert (diff["matched"], diff["changed"], diff["missing"], diff["unexpected"]) == (1, 1, 1, 1)
+    assert diff["samples"]["changed"] == [{"key": {"id": 2}, "columns": {"price": {"expected": 6.0, "actual": 5.0}}}]
+
+def test_compare_in_partitions():
+    actual = [{"id": i} for i in range(1000)]
+    expected = [{"id": i} for i in range(1, 1001)]
+    diff = RowComparator().compare(actual, lambda: iter(expected), partition_rows=100)
+    assert (diff["matched"], diff["missing"], diff["unexpected"]) == (999, 1, 1)
+    assert diff["samples"] == {"missing": [{"id": 1000}], "unexpected": [{"id": 0}]}
+
+def test_compare_reports_progress():
+    rows = [{"id": i} for i in range(250)]
+    reported = []
+    assert RowComparator().compare(rows, lambda: rows, progress=reported.append, progress_rows=100) is None
+    assert reported == [100, 200]
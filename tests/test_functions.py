@@ -241,3 +241,128 @@ def test_delete_function(client: TestClient):
     assert response.status_code == 404
 
 
+
+def test_create_functions_batch(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "input_data", "attributes": {"value": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/functions:batch",
+        json=[
+            {"name": "f1", "input_schemas": {"x": object_id}, "output_schemas": {}},
+            {"name": "f2", "input_schemas": {}, "output_schemas": {"y": 999}},
+        ],
+    )
+    assert response.status_code == 400
+    errors = response.json()["detail"]["errors"]
+    assert errors == [{"index": 1, "status_code": 404, "detail": "Output object schema with id 999 not found"}]
+    
+    response = client.post(
+        "/api/v1/functions:batch",
+        json=[
+            {"name": "f1", "input_schemas": {"x": object_id}, "output_schemas": {}},
+            {"name": "f2", "input_schemas": {}, "output_schemas": {"y": object_id}},
+        ],
+    )
+    assert response.status_code == 200
+    assert [function["name"] for function in response.json()] == ["f1", "f2"]
+
+def test_create_function_resolves_schemas_in_one_query(client: TestClient, async_engine):
+    from sqlalchemy import event
+    
+    object_ids = []
+    for i in range(6):
+        response = client.post("/api/v1/objects/", json={"name": f"schema_{i}", "attributes": {}})
+        assert response.status_code == 200
+        object_ids.append(response.json()["id"])
+    
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.post(
+            "/api/v1/functions/",
+            json={
+                "name": "many_ports",
+                "input_schemas": {f"in_{i}": object_id for i, object_id in enumerate(object_ids[:3])},
+                "output_schemas": {f"out_{i}": object_id for i, object_id in enumerate(object_ids[3:])},
+            },
+        )
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT") and "FROM objects" in s]) == 1
+
+def test_run_all_test_cases(client: TestClient):
+    object_id = client.post(
+        "/api/v1/objects/", json={"name": "number", "attributes": {"value": "integer"}}
+    ).json()["id"]
+    table_ids = {}
+    for name, values in [("source", [1, 2]), ("doubled", [2, 4]), ("tripled", [3, 6])]:
+        table_ids[name] = client.post(
+            "/api/v1/tables/",
+            json={"name": name, "object_id": object_id, "data": [{"value": v} for v in values]},
+        ).json()["id"]
+    function_id = client.post(
+        "/api/v1/functions/",
+        json={"name": "scale", "input_schemas": {"source": object_id}, "output_schemas": {"result": object_id}},
+    ).json()["id"]
+    
+    # Both test cases share the same input table
+    test_case_ids = [
+        client.post(
+            "/api/v1/test-cases/",
+            json={
+                "name": f"scale_{factor}",
+                "function_id": function_id,
+                "input_tables": {"source": table_ids["source"]},
+                "expected_output_tables": {"result": table_ids[expected]},
+                "parameters": {"factor": factor},
+            },
+        ).json()["id"]
+        for factor, expected in [(2, "doubled"), (3, "tripled")]
+    ]
+    code = "def run(inputs, parameters):\n    return {'result': [{'value': row['value'] * %s} for row in inputs['source']]}\n"
+    submission_ids = [
+        client.post(
+            "/api/v1/submissions/",
+            json={"name": name, "function_id": function_id, "code": code % factor},
+        ).json()["id"]
+        for name, factor in [("uses_factor", "parameters['factor']"), ("always_doubles", "2")]
+    ]
+    
+    response = client.post(f"/api/v1/functions/{function_id}/run-all")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["test_case_ids"] == test_case_ids
+    matrix = data["matrix"]
+    assert [matrix[str(submission_ids[0])][str(t)]["status"] for t in test_case_ids] == ["passed", "passed"]
+    assert [matrix[str(submission_ids[1])][str(t)]["status"] for t in test_case_ids] == ["passed", "failed"]
+    assert data["summary"] == {"passed": 3, "failed": 1}
+    assert data["all_passed"] is False
+    
+    # Nothing changed, so every cell is served from the result cache
+    data = client.post(f"/api/v1/functions/{function_id}/run-all").json()
+    assert all(cell["cached"] for row in data["matrix"].values() for cell in row.values())
+    
+    response = client.post("/api/v1/functions/999/run-all")
+    assert response.status_code == 404
+
+def test_update_function_bumps_version(client: TestClient):
+    function = client.post(
+        "/api/v1/functions/", json={"name": "versioned", "input_schemas": {}, "output_schemas": {}}
+    ).json()
+    response = client.get(f"/api/v1/functions/{function['id']}")
+    etag = response.headers["etag"]
+    assert client.get(f"/api/v1/functions/{function['id']}", headers={"If-None-Match": etag}).status_code == 304
+    
+    updated = client.put(f"/api/v1/functions/{function['id']}", json={**function, "description": "changed"}).json()
+    assert updated["updated_at"] > function["updated_at"]
+    response = client.get(f"/api/v1/functions/{function['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["description"] == "changed"
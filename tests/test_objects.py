@@ -178,3 +178,100 @@ def test_delete_nonexistent_object(client: TestClient):
     response = client.delete("/api/v1/objects/999")
     assert response.status_code == 404
     assert "Object not found" in response.json()["detail"]
+
+def test_read_objects_cursor_pagination(client: TestClient):
+    # Create test objects
+    for i in range(5):
+        response = client.post(
+            "/api/v1/objects/",
+            json={"name": f"test_object_{i}", "attributes": {"field": "string"}},
+        )
+        assert response.status_code == 200
+    
+    # Walk every page by following the cursor
+    names = []
+    cursor = ""
+    while True:
+        response = client.get(f"/api/v1/objects/?limit=2&cursor={cursor}")
+        assert response.status_code == 200
+        names.extend(obj["name"] for obj in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert names == [f"test_object_{i}" for i in range(5)]
+    
+    # Rows deleted after a page was read do not shift the next page
+    response = client.get("/api/v1/objects/?limit=2")
+    cursor = response.headers["X-Next-Cursor"]
+    client.delete(f"/api/v1/objects/{response.json()[0]['id']}")
+    response = client.get(f"/api/v1/objects/?limit=2&cursor={cursor}")
+    assert [obj["name"] for obj in response.json()] == ["test_object_2", "test_object_3"]
+
+def test_read_objects_invalid_cursor(client: TestClient):
+    response = client.get("/api/v1/objects/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert "Invalid pagination cursor" in response.json()["detail"]
+
+def test_create_objects_batch(client: TestClient):
+    response = client.post(
+        "/api/v1/objects:batch",
+        json=[
+            {"name": "batch_object_1", "attributes": {"field1": "string"}},
+            {"name": "batch_object_2", "attributes": {"field2": "integer"}},
+        ],
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [obj["name"] for obj in data] == ["batch_object_1", "batch_object_2"]
+    assert all("id" in obj for obj in data)
+    
+    response = client.get("/api/v1/objects/")
+    assert len(response.json()) == 2
+
+def test_create_object_comparison_settings(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={
+            "name": "priced",
+            "attributes": {"sku": "string", "price": "number"},
+            "key_columns": ["sku"],
+            "tolerances": {"price": 0.01},
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["key_columns"] == ["sku"]
+    
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "bad_key", "attributes": {"sku": "string"}, "key_columns": ["id"]},
+    )
+    assert response.status_code == 400
+    
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "bad_tolerance", "attributes": {"price": "number"}, "tolerances": {"price": -1}},
+    )
+    assert response.status_code == 400
+
+def test_read_object_conditional(client: TestClient):
+    object_id = client.post("/api/v1/objects/", json={"name": "etag_object", "attributes": {"a": "string"}}).json()["id"]
+    response = client.get(f"/api/v1/objects/{object_id}")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+    
+    response = client.get(f"/api/v1/objects/{object_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    response = client.get(
+        f"/api/v1/objects/{object_id}", headers={"If-Modified-Since": response.headers["last-modified"]}
+    )
+    assert response.status_code == 304
+    
+    # Updating the object changes its version
+    client.put(f"/api/v1/objects/{object_id}", json={"name": "etag_object", "attributes": {"a": "integer"}})
+    response = client.get(f"/api/v1/objects/{object_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["attributes"] == {"a": "integer"}
+    assert client.get("/api/v1/objects/999", headers={"If-None-Match": etag}).status_code == 404
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.v1.endpoints import runs as runs_endpoints
+from app.execution import queue
+from app.execution.events import RunEvents, run_events
+from app.models.test_run import TestRun
+
+
+def queue_runs(client: TestClient, count: int):
+    """Queue count runs of a trivial submission against a test case with no tables"""
+    function_id = client.post(
+        "/api/v1/functions/", json={"name": "noop", "input_schemas": {}, "output_schemas": {}}
+    ).json()["id"]
+    test_case_id = client.post(
+        "/api/v1/test-cases/", json={"name": "noop_test", "function_id": function_id}
+    ).json()["id"]
+    client.post(
+        "/api/v1/submissions/",
+        json={"name": "noop_impl", "function_id": function_id, "code": "def run(inputs, parameters):\n    return {}\n"},
+    )
+    run_ids = []
+    for _ in range(count):
+        response = client.post(f"/api/v1/test-cases/{test_case_id}/run")
+        assert response.status_code == 200
+        run_ids.append(response.json()["run_id"])
+    return test_case_id, run_ids
+
+def test_claims_are_exclusive(client: TestClient, async_engine):
+    _, run_ids = queue_runs(client, 2)
+    
+    async def claim_all():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            return [await queue.claim_next(session, f"worker-{i}") for i in range(3)]
+    
+    first, second, third = asyncio.run(claim_all())
+    assert [first.id, second.id] == run_ids
+    assert (first.claimed_by, first.status, first.attempts) == ("worker-0", "running", 1)
+    assert third is None
+    
+    stats = client.get("/api/v1/runs/queue").json()
+    assert (stats["queued"], stats["running"]) == (0, 2)
+
+def test_abandoned_runs_are_reclaimed(client: TestClient, async_engine, run_queue, monkeypatch):
+    _, [run_id] = queue_runs(client, 1)
+    monkeypatch.setattr(queue.settings, "execution_job_max_attempts", 2)
+    
+    async def claim_and_expire(worker_id):
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            run = await queue.claim_next(session, worker_id)
+            if run is not None:
+                # The worker dies without finishing the run
+                run.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+                session.add(run)
+                await session.commit()
+            return run
+    
+    assert asyncio.run(claim_and_expire("first")).attempts == 1
+    assert asyncio.run(claim_and_expire("second")).attempts == 2
+    # Out of attempts: the run is given up on rather than claimed again
+    assert asyncio.run(claim_and_expire("third")) is None
+    run = client.get(f"/api/v1/runs/{run_id}").json()
+    assert run["status"] == "error"
+    assert "Abandoned" in run["error"]
+    assert run_queue() == 0
+
+def test_queue_stats_and_status_filter(client: TestClient, run_queue):
+    test_case_id, _ = queue_runs(client, 2)
+    
+    stats = client.get("/api/v1/runs/queue").json()
+    assert stats["queued"] == 2
+    assert stats["oldest_queued_seconds"] >= 0
+    response = client.get("/api/v1/test-cases/", params={"status": "queued"})
+    assert [t["id"] for t in response.json()] == [test_case_id]
+    
+    assert run_queue() == 2
+    stats = client.get("/api/v1/runs/queue").json()
+    assert stats["queued"] == 0
+    assert stats["by_status"] == {"passed": 2}
+    # The second, identical run reused the first one's cached outcome
+    assert stats["sample_size"] == 1
+    assert stats["wait_seconds"]["max"] >= 0
+    assert client.get("/api/v1/test-cases/", params={"status": "queued"}).json() == []
+    response = client.get("/api/v1/test-cases/", params={"status": "passed"})
+    assert [t["id"] for t in response.json()] == [test_case_id]
+
+def test_run_events(client: TestClient, async_engine):
+    _, [run_id] = queue_runs(client, 1)
+    
+    async def follow_run():
+        async with run_events.subscribe(run_ids=[run_id]) as subscription:
+            await queue.drain(lambda: AsyncSession(async_engine, expire_on_commit=False))
+            events = []
+            while (event := await subscription.get(timeout=2)) is not None:
+                events.append(event)
+            return events
+    
+    # Worker progress is relayed from another process, so only the lifecycle events are ordered
+    events = asyncio.run(follow_run())
+    assert [e["event"] for e in events if e["event"] != "progress"] == ["started", "finished"]
+    assert {e["stage"] for e in events if e["event"] == "progress"} == {"loaded", "ran"}
+    assert all(e["run_id"] == run_id for e in events)
+    [finished] = [e for e in events if e["event"] == "finished"]
+    assert finished["status"] == "passed"
+    assert finished["wall_time"] is not None
+    
+    # A stream following a finished run sends its outcome and ends
+    with client.stream("GET", "/api/v1/runs/events", params={"run_id": run_id}) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = response.read().decode()
+    assert "event: finished" in body
+    [data] = [line[len("data: "):] for line in body.splitlines() if line.startswith("data: ")]
+    assert json.loads(data)["status"] == "passed"
+    assert client.get("/api/v1/runs/events", params={"run_id": 999}).status_code == 404
+
+def test_run_events_follow_run_finished_elsewhere(client: TestClient, engine, monkeypatch):
+    monkeypatch.setattr(runs_endpoints, "RUN_POLL_SECONDS", 0.1)
+    _, [run_id] = queue_runs(client, 1)
+    
+    def finish_in_another_process():
+        # No event is published here, as for a run executed by a separate queue worker
+        with Session(engine) as session:
+            run = session.get(TestRun, run_id)
+            run.status, run.passed, run.finished_at = "passed", True, datetime.utcnow()
+            session.add(run)
+            session.commit()
+    
+    timer = threading.Timer(0.3, finish_in_another_process)
+    timer.start()
+    try:
+        with client.stream("GET", "/api/v1/runs/events", params={"run_id": run_id}) as response:
+            body = response.read().decode()
+    finally:
+        timer.join()
+    assert "event: snapshot" in body
+    data = [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+    assert data[-1]["event"] == "finished"
+    assert data[-1]["status"] == "passed"
+
+def test_slow_subscribers_drop_oldest_events():
+    async def publish_to_slow_subscriber():
+        broker = RunEvents()
+        async with broker.subscribe(max_pending=2) as subscription:
+            for run_id in range(3):
+                broker.publish({"event": "queued", "run_id": run_id})
+            await asyncio.sleep(0)
+            received = [(await subscription.get())["run_id"] for _ in range(2)]
+            assert await subscription.get(timeout=0.01) is None
+            return received, broker.stats()
+    
+    received, stats = asyncio.run(publish_to_slow_subscriber())
+    assert received == [1, 2]
+    assert stats == {"subscribers": 1, "published": 3, "dropped": 1}
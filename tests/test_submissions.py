@@ -0,0 +1,81 @@
+from fastapi.testclient import TestClient
+
+CODE = "def run(inputs, parameters):\n    return {}\n"
+
+
+def create_function(client: TestClient):
+    response = client.post(
+        "/api/v1/functions/",
+        json={"name": "noop", "input_schemas": {}, "output_schemas": {}},
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def test_create_submission(client: TestClient):
+    function_id = create_function(client)
+    response = client.post(
+        "/api/v1/submissions/",
+        json={"name": "noop_impl", "function_id": function_id, "code": CODE},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["function_id"] == function_id
+    assert data["code"] == CODE
+    
+    response = client.get(f"/api/v1/submissions/{data['id']}")
+    assert response.status_code == 200
+    assert response.json()["name"] == "noop_impl"
+
+def test_create_submission_invalid_function(client: TestClient):
+    response = client.post(
+        "/api/v1/submissions/",
+        json={"name": "orphan", "function_id": 999, "code": CODE},
+    )
+    assert response.status_code == 404
+
+def test_update_submission_function(client: TestClient):
+    function_id = create_function(client)
+    other_id = create_function(client)
+    submission_id = client.post(
+        "/api/v1/submissions/",
+        json={"name": "noop_impl", "function_id": function_id, "code": CODE},
+    ).json()["id"]
+    
+    response = client.put(
+        f"/api/v1/submissions/{submission_id}",
+        json={"name": "noop_impl", "function_id": 999, "code": CODE},
+    )
+    assert response.status_code == 404
+    assert client.get(f"/api/v1/submissions/{submission_id}").json()["function_id"] == function_id
+    
+    response = client.put(
+        f"/api/v1/submissions/{submission_id}",
+        json={"name": "noop_impl", "function_id": other_id, "code": CODE},
+    )
+    assert response.status_code == 200
+    assert response.json()["function_id"] == other_id
+
+def test_create_submission_syntax_error(client: TestClient):
+    function_id = create_function(client)
+    response = client.post(
+        "/api/v1/submissions/",
+        json={"name": "broken", "function_id": function_id, "code": "def run(:\n"},
+    )
+    assert response.status_code == 400
+    assert "does not compile" in response.json()["detail"]
+
+def test_list_and_delete_submissions(client: TestClient):
+    function_id = create_function(client)
+    ids = [
+        client.post(
+            "/api/v1/submissions/",
+            json={"name": f"impl_{i}", "function_id": function_id, "code": CODE},
+        ).json()["id"]
+        for i in range(2)
+    ]
+    response = client.get("/api/v1/submissions/", params={"function_id": function_id})
+    assert [s["id"] for s in response.json()] == ids
+    
+    response = client.delete(f"/api/v1/submissions/{ids[0]}")
+    assert response.status_code == 200
+    assert client.get(f"/api/v1/submissions/{ids[0]}").status_code == 404
@@ -1,3 +1,8 @@
+import json
+import gzip
+import time
+import pytest
+from datetime import datetime
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
@@ -240,3 +245,656 @@ def test_delete_nonexistent_table(client: TestClient):
     response = client.delete("/api/v1/tables/999")
     assert response.status_code == 404
     assert "Table not found" in response.json()["detail"]
+
+def test_read_and_update_row_range(client: TestClient):
+    # First create an object schema
+    response = client.post(
+        "/api/v1/objects/",
+        json={
+            "name": "simple_data",
+            "description": "Simple data schema",
+            "attributes": {"value": "integer"}
+        },
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    # Create a table with a few rows
+    response = client.post(
+        "/api/v1/tables/",
+        json={
+            "name": "numbers",
+            "object_id": object_id,
+            "data": [{"value": i} for i in range(5)]
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["row_count"] == 5
+    table_id = response.json()["id"]
+    
+    # Read a slice of rows
+    response = client.get(f"/api/v1/tables/{table_id}/rows?start=1&stop=3")
+    assert response.status_code == 200
+    assert response.json() == [{"value": 1}, {"value": 2}]
+    
+    # Overwrite part of the table
+    response = client.patch(
+        f"/api/v1/tables/{table_id}/rows?start=3",
+        json=[{"value": 30}, {"value": 40}],
+    )
+    assert response.status_code == 200
+    assert response.json()["updated"] == 2
+    
+    response = client.get(f"/api/v1/tables/{table_id}")
+    assert [row["value"] for row in response.json()["data"]] == [0, 1, 2, 30, 40]
+    
+    # Writing past the end of the table is rejected
+    response = client.patch(f"/api/v1/tables/{table_id}/rows?start=4", json=[{"value": 1}, {"value": 2}])
+    assert response.status_code == 400
+
+def test_chunked_row_storage(session: Session):
+    from app.crud import table_rows
+    from app.models.object_schema import ObjectSchema
+    from app.models.table_data import TableData
+    
+    object_schema = ObjectSchema(name="simple_data", attributes={"value": "integer"})
+    session.add(object_schema)
+    session.flush()
+    table = TableData(name="chunked", object_id=object_schema.id, chunk_size=3)
+    session.add(table)
+    session.flush()
+    
+    # 7 rows are split into chunks of 3, 3 and 1
+    table_rows.replace_rows(session, table, [{"value": i} for i in range(7)])
+    assert table.row_count == 7
+    assert table_rows.read_rows(session, table, 2, 5) == [{"value": 2}, {"value": 3}, {"value": 4}]
+    
+    # Appending tops up the last partial chunk first
+    table_rows.append_rows(session, table, [{"value": i} for i in range(7, 11)])
+    assert table.row_count == 11
+    assert [row["value"] for row in table_rows.read_rows(session, table)] == list(range(11))
+    
+    # Updates spanning a chunk boundary
+    table_rows.update_rows(session, table, 5, [{"value": -5}, {"value": -6}, {"value": -7}])
+    session.commit()
+    assert [row["value"] for row in table_rows.read_rows(session, table, 4, 9)] == [4, -5, -6, -7, 8]
+
+def test_migrate_inline_rows_into_chunks(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+    from sqlmodel import SQLModel
+    from app.crud import table_rows
+    from app.crud.migrations import migrate_inline_rows
+    from app.models.table_data import TableData
+    
+    # A database from before chunked storage, with rows in tables.data
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE tables (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, description VARCHAR, "
+            "object_id INTEGER NOT NULL, data JSON NOT NULL, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)"
+        ))
+        connection.execute(text(
+            "INSERT INTO tables VALUES (1, 'old', NULL, 1, :data, '2024-01-01 00:00:00', '2024-01-02 00:00:00'), "
+            "(2, 'empty', NULL, 1, '[]', '2024-01-01 00:00:00', '2024-01-01 00:00:00')"
+        ), {"data": json.dumps([{"value": i, "name": f"n{i}"} for i in range(2500)])})
+    SQLModel.metadata.create_all(engine)
+    
+    assert migrate_inline_rows(engine) == 2
+    assert "data" not in {column["name"] for column in inspect(engine).get_columns("tables")}
+    assert migrate_inline_rows(engine) == 0
+    with Session(engine) as session:
+        table = session.get(TableData, 1)
+        assert table.row_count == 2500
+        assert table.columns == ["value", "name"]
+        assert table.updated_at.isoformat() == "2024-01-02T00:00:00"
+        assert table_rows.read_rows(session, table, 1999, 2001) == [{"value": 1999, "name": "n1999"}, {"value": 2000, "name": "n2000"}]
+        assert session.get(TableData, 2).row_count == 0
+        # New tables can be written without the old column
+        session.add(TableData(name="new", object_id=1))
+        session.commit()
+    engine.dispose()
+
+def test_add_comparison_columns(tmp_path):
+    from sqlalchemy import create_engine, text
+    from sqlmodel import SQLModel
+    from app.crud.migrations import add_comparison_columns
+    from app.models.object_schema import ObjectSchema
+    
+    # A database from before objects had key columns and tolerances
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE objects (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, description VARCHAR, "
+            "attributes JSON NOT NULL, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)"
+        ))
+        connection.execute(text(
+            "INSERT INTO objects VALUES (1, 'old', NULL, '{\"value\": \"integer\"}', '2024-01-01 00:00:00', '2024-01-01 00:00:00')"
+        ))
+    SQLModel.metadata.create_all(engine)
+    
+    assert add_comparison_columns(engine) == 2
+    assert add_comparison_columns(engine) == 0
+    with Session(engine) as session:
+        old = session.get(ObjectSchema, 1)
+        assert (old.key_columns, old.tolerances) == ([], {})
+        session.add(ObjectSchema(name="new", attributes={}, key_columns=["id"], tolerances={"price": 0.01}))
+        session.commit()
+    engine.dispose()
+
+def test_append_rows_ndjson(client: TestClient):
+    # First create an object schema
+    response = client.post(
+        "/api/v1/objects/",
+        json={
+            "name": "user_data",
+            "description": "User information schema",
+            "attributes": {"name": "string", "age": "integer"}
+        },
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/tables/",
+        json={"name": "users", "object_id": object_id, "data": [{"name": "John Doe", "age": 30}]},
+    )
+    assert response.status_code == 200
+    table_id = response.json()["id"]
+    
+    # Stream rows in, including an invalid field, broken JSON and a blank line
+    body = "\n".join([
+        '{"name": "Jane Doe", "age": 25}',
+        '{"name": "Bad Row", "invalid_field": 1}',
+        '{"name": ',
+        '',
+        '{"name": "Max", "age": 41}',
+    ])
+    response = client.post(
+        f"/api/v1/tables/{table_id}/rows",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["accepted"] == 2
+    assert result["rejected"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert result["row_count"] == 3
+    
+    response = client.get(f"/api/v1/tables/{table_id}/rows")
+    assert [row["name"] for row in response.json()] == ["John Doe", "Jane Doe", "Max"]
+
+def test_append_rows_nonexistent_table(client: TestClient):
+    response = client.post("/api/v1/tables/999/rows", content='{"value": 1}')
+    assert response.status_code == 404
+    assert "Table not found" in response.json()["detail"]
+
+def test_read_table_ndjson(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "simple_data", "attributes": {"value": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/tables/",
+        json={"name": "numbers", "object_id": object_id, "data": [{"value": i} for i in range(3)]},
+    )
+    assert response.status_code == 200
+    table_id = response.json()["id"]
+    
+    # Rows only, one JSON object per line
+    response = client.get(f"/api/v1/tables/{table_id}", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["x-row-count"] == "3"
+    assert [json.loads(line) for line in response.text.splitlines()] == [{"value": i} for i in range(3)]
+    
+    # Table listing, one table per line
+    response = client.get("/api/v1/tables/", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    tables = [json.loads(line) for line in response.text.splitlines()]
+    assert len(tables) == 1
+    assert tables[0]["name"] == "numbers"
+    assert len(tables[0]["data"]) == 3
+
+def test_create_table_invalid_value_type(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "user_data", "attributes": {"name": "string", "age": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/tables/",
+        json={
+            "name": "users",
+            "object_id": object_id,
+            "data": [{"name": "John Doe", "age": 30}, {"name": "Jane Doe", "age": "old"}]
+        },
+    )
+    assert response.status_code == 400
+    assert "Field age expected integer" in response.json()["detail"]
+
+def test_validator_cache_follows_object_updates(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "simple_data", "attributes": {"value": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/tables/",
+        json={"name": "values", "object_id": object_id, "data": [{"value": "text"}]},
+    )
+    assert response.status_code == 400
+    
+    # Changing the schema must not reuse the previously compiled validator
+    response = client.put(
+        f"/api/v1/objects/{object_id}",
+        json={"name": "simple_data", "attributes": {"value": "string"}},
+    )
+    assert response.status_code == 200
+    
+    response = client.post(
+        "/api/v1/tables/",
+        json={"name": "values", "object_id": object_id, "data": [{"value": "text"}]},
+    )
+    assert response.status_code == 200
+
+def test_validator_infers_types_from_example_values():
+    from app.core.validators import compile_validator
+    
+    validator = compile_validator({"sku": "PROD-XXX", "price": 0.00, "in_stock": False, "note": None})
+    rows = [
+        {"sku": "BOOK-001", "price": 19, "in_stock": True, "note": [1]},
+        {"sku": 1, "price": 1.5},
+        {"price": "free"},
+        {"in_stock": None},
+    ]
+    errors = validator.errors(rows)
+    assert sorted(errors) == [1, 2]
+    assert "Field sku expected string" in errors[1]
+    assert "Field price expected number" in errors[2]
+
+def test_validator_type_name_aliases():
+    from app.core.validators import compile_validator
+    
+    validator = compile_validator({
+        "price": "decimal", "ratio": "Double", "at": "timestamp", "id": "uuid",
+        "tags": "list", "code": "varchar(8)", "tier": "Gold", "shape": "geometry",
+    })
+    assert validator.types == {
+        "price": "number", "ratio": "number", "at": "datetime", "id": "string",
+        "tags": "array", "code": "string", "tier": "string", "shape": "string",
+    }
+    rows = [
+        {"price": 9.5, "ratio": 1, "at": "2024-01-01T00:00:00", "id": "a1", "tags": [], "code": "X", "tier": "Silver", "shape": "POINT(1 2)"},
+        {"tier": 1},
+        {"price": "9.50"},
+        {"shape": {"x": 1}},
+    ]
+    assert sorted(validator.errors(rows)) == [1, 2, 3]
+
+def test_read_tables_summary_and_fields(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "user_data", "attributes": {"name": "string", "age": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/tables/",
+        json={
+            "name": "users",
+            "description": "Sample user data",
+            "object_id": object_id,
+            "data": [{"name": "John Doe"}, {"name": "Jane Doe", "age": 25}]
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["columns"] == ["name", "age"]
+    
+    # Summary mode returns stored metadata and no rows
+    response = client.get("/api/v1/tables/?summary=true")
+    assert response.status_code == 200
+    summary = response.json()[0]
+    assert "data" not in summary
+    assert summary["name"] == "users"
+    assert summary["row_count"] == 2
+    assert summary["columns"] == ["name", "age"]
+    
+    # Projection onto selected fields
+    response = client.get("/api/v1/tables/?fields=name,row_count")
+    assert response.status_code == 200
+    assert response.json() == [{"id": summary["id"], "name": "users", "row_count": 2}]
+    
+    # Rows are only included when explicitly requested
+    response = client.get("/api/v1/tables/?fields=name,data")
+    assert response.status_code == 200
+    assert response.json()[0]["data"] == [{"name": "John Doe"}, {"name": "Jane Doe", "age": 25}]
+    
+    response = client.get("/api/v1/tables/?fields=name,secret")
+    assert response.status_code == 400
+    assert "Unknown table fields: secret" in response.json()["detail"]
+
+def test_create_tables_batch(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "simple_data", "attributes": {"value": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/tables:batch",
+        json=[
+            {"name": "first", "object_id": object_id, "data": [{"value": 1}]},
+            {"name": "second", "object_id": object_id, "data": [{"value": 2}, {"value": 3}]},
+        ],
+    )
+    assert response.status_code == 200
+    assert [(table["name"], table["row_count"]) for table in response.json()] == [("first", 1), ("second", 2)]
+    
+    # One bad item rejects the whole batch, and every failure is reported
+    response = client.post(
+        "/api/v1/tables:batch",
+        json=[
+            {"name": "ok", "object_id": object_id, "data": [{"value": 1}]},
+            {"name": "bad_rows", "object_id": object_id, "data": [{"other": 1}]},
+            {"name": "bad_object", "object_id": 999, "data": []},
+        ],
+    )
+    assert response.status_code == 400
+    errors = response.json()["detail"]["errors"]
+    assert [(error["index"], error["status_code"]) for error in errors] == [(1, 400), (2, 404)]
+    
+    response = client.get("/api/v1/tables/?summary=true")
+    assert [table["name"] for table in response.json()] == ["first", "second"]
+
+def test_read_table_conditional(client: TestClient):
+    object_id = client.post("/api/v1/objects/", json={"name": "etag_rows", "attributes": {"value": "integer"}}).json()["id"]
+    table_id = client.post(
+        "/api/v1/tables/", json={"name": "etag_table", "object_id": object_id, "data": [{"value": 1}]}
+    ).json()["id"]
+    etag = client.get(f"/api/v1/tables/{table_id}").headers["etag"]
+    ndjson = {"Accept": "application/x-ndjson"}
+    ndjson_etag = client.get(f"/api/v1/tables/{table_id}", headers=ndjson).headers["etag"]
+    assert etag != ndjson_etag
+    
+    assert client.get(f"/api/v1/tables/{table_id}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/api/v1/tables/{table_id}", headers={**ndjson, "If-None-Match": etag}).status_code == 200
+    assert client.get(f"/api/v1/tables/{table_id}", headers={"If-None-Match": f"W/{etag}, \"other\""}).status_code == 304
+    
+    # Every write is a new version
+    client.patch(f"/api/v1/tables/{table_id}/rows", json=[{"value": 2}])
+    response = client.get(f"/api/v1/tables/{table_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["data"] == [{"value": 2}]
+    etag = response.headers["etag"]
+    client.put(f"/api/v1/tables/{table_id}", json={"name": "renamed", "object_id": object_id})
+    assert client.get(f"/api/v1/tables/{table_id}", headers={"If-None-Match": etag}).status_code == 200
+
+def test_metadata_cache_serves_repeated_writes(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "simple_data", "attributes": {"value": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/tables/",
+        json={"name": "numbers", "object_id": object_id, "data": [{"value": 0}]},
+    )
+    assert response.status_code == 200
+    table_id = response.json()["id"]
+    
+    # Every append validates against the object schema; only the first one queries it
+    before = client.get("/api/v1/cache/").json()["metadata"]
+    for i in range(1, 6):
+        response = client.post(f"/api/v1/tables/{table_id}/rows", content=json.dumps({"value": i}))
+        assert response.status_code == 200
+    stats = client.get("/api/v1/cache/").json()["metadata"]
+    assert stats["hits"] - before["hits"] >= 4
+    assert stats["hit_ratio"] > 0
+    
+    # Updating the object invalidates the cached copy, so appends see the new attributes
+    response = client.put(
+        f"/api/v1/objects/{object_id}",
+        json={"name": "simple_data", "attributes": {"value": "string"}},
+    )
+    assert response.status_code == 200
+    assert client.get("/api/v1/cache/").json()["metadata"]["invalidations"] > stats["invalidations"]
+    response = client.post(f"/api/v1/tables/{table_id}/rows", content='{"value": "text"}')
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 1
+
+def test_metadata_cache_broadcasts_invalidations(tmp_path):
+    from app.crud.metadata_cache import MetadataCache
+    from app.models.object_schema import ObjectSchema
+    
+    first, second = MetadataCache(16, 60), MetadataCache(16, 60)
+    first.start_broadcast(str(tmp_path))
+    second.start_broadcast(str(tmp_path))
+    try:
+        second._put(("objects", 1), ObjectSchema(id=1, name="simple_data", attributes={}), time.monotonic())
+        first.invalidate([("objects", 1)])
+        deadline = time.monotonic() + 5
+        while second.stats()["size"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert second.stats()["size"] == 0
+        assert second.stats()["invalidations"] == 1
+    finally:
+        first.stop_broadcast()
+        second.stop_broadcast()
+    assert not list(tmp_path.glob("*.sock"))
+
+def test_table_responses_encode_rows_directly(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "notes", "attributes": {"text": "string", "count": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    rows = [{"text": "</script><b>", "count": 2 ** 70}, {"text": "é & 'quoted'", "count": 1}]
+    response = client.post("/api/v1/tables/", json={"name": "notes", "object_id": object_id, "data": rows})
+    assert response.status_code == 200
+    table = response.json()
+    assert table["data"] == rows
+    assert datetime.fromisoformat(table["created_at"])
+    table_id = table["id"]
+    assert client.get(f"/api/v1/tables/{table_id}").json()["data"] == rows
+    
+    # The edit page embeds the table as JSON that cannot close its <script> element
+    response = client.get(f"/table/edit/{table_id}")
+    assert response.status_code == 200
+    assert "</script><b>" not in response.text
+    embedded = response.text.split('id="table-data-json">')[1].split("</script>")[0]
+    assert json.loads(embedded)["data"] == rows
+
+def test_table_responses_are_compressed_and_cached(client: TestClient):
+    from app.api.compression import negotiate
+    
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0, identity") is None
+    assert negotiate("*") is not None
+    assert negotiate(None) is None
+    
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "simple_data", "attributes": {"name": "string", "value": "integer"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    rows = [{"name": "repeated name", "value": i % 10} for i in range(2000)]
+    response = client.post("/api/v1/tables/", json={"name": "big", "object_id": object_id, "data": rows})
+    assert response.status_code == 200
+    table_id = response.json()["id"]
+    response = client.post("/api/v1/tables/", json={"name": "small", "object_id": object_id, "data": rows[:1]})
+    assert response.status_code == 200
+    small_id = response.json()["id"]
+    
+    def read(table_id: int, encoding: str):
+        # Undecoded, to see what was sent
+        with client.stream("GET", f"/api/v1/tables/{table_id}", headers={"Accept-Encoding": encoding}) as response:
+            assert response.status_code == 200
+            return response, b"".join(response.iter_raw())
+    
+    first, body = read(table_id, "gzip")
+    assert first.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in first.headers["vary"]
+    assert json.loads(gzip.decompress(body))["data"] == rows
+    plain, plain_body = read(table_id, "identity")
+    assert "content-encoding" not in plain.headers
+    assert len(body) * 10 < len(plain_body)
+    assert plain.headers["etag"] != first.headers["etag"]
+    
+    # The second read is served from the cache of compressed bodies
+    second, cached_body = read(table_id, "gzip")
+    assert cached_body == body
+    stats = client.get("/api/v1/cache/").json()["compressed_tables"]
+    assert stats["hits"] == 1
+    assert stats["entries"] == 1
+    
+    # A change is a new version, compressed again; the old one is dropped
+    response = client.post(f"/api/v1/tables/{table_id}/rows", content='{"name": "new", "value": 1}')
+    assert response.status_code == 200
+    _, body = read(table_id, "gzip")
+    assert len(json.loads(gzip.decompress(body))["data"]) == 2001
+    assert client.get("/api/v1/cache/").json()["compressed_tables"]["entries"] == 1
+    
+    # Small tables are not worth compressing, so their ETag and Vary are those of identity
+    response, body = read(small_id, "gzip")
+    assert "content-encoding" not in response.headers
+    assert json.loads(body)["data"] == rows[:1]
+    assert response.headers["vary"] == "Accept"
+    identity, _ = read(small_id, "identity")
+    assert response.headers["etag"] == identity.headers["etag"]
+    revalidated = client.get(
+        f"/api/v1/tables/{small_id}", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+
+@pytest.mark.parametrize("encoding, module", [("zstd", "zstandard"), ("br", "brotli")])
+def test_table_responses_use_optional_codecs(client: TestClient, encoding: str, module: str):
+    codec = pytest.importorskip(module)
+    
+    object_id = client.post("/api/v1/objects/", json={"name": "simple_data", "attributes": {"name": "string", "value": "integer"}}).json()["id"]
+    rows = [{"name": "repeated name", "value": i % 10} for i in range(2000)]
+    table_id = client.post("/api/v1/tables/", json={"name": "big", "object_id": object_id, "data": rows}).json()["id"]
+    
+    with client.stream("GET", f"/api/v1/tables/{table_id}", headers={"Accept-Encoding": f"{encoding}, gzip;q=0.5"}) as response:
+        assert response.status_code == 200
+        body = b"".join(response.iter_raw())
+    assert response.headers["content-encoding"] == encoding
+    if encoding == "zstd":
+        # Streamed frames do not record their content size
+        body = codec.ZstdDecompressor().decompressobj().decompress(body)
+    else:
+        body = codec.decompress(body)
+    assert json.loads(body)["data"] == rows
+
+def test_csv_export_and_import(client: TestClient):
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "people", "attributes": {"name": "string", "age": "integer", "score": "number", "active": "boolean", "tags": "array"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    rows = [
+        {"name": "Ann, \"the\"\nfirst", "age": 30, "score": 1.5, "active": True, "tags": ["a"]},
+        {"name": "Bob", "age": None, "score": 2, "active": False, "tags": []},
+    ]
+    response = client.post("/api/v1/tables/", json={"name": "people", "object_id": object_id, "data": rows})
+    assert response.status_code == 200
+    table_id = response.json()["id"]
+    
+    response = client.get(f"/api/v1/tables/{table_id}/rows", headers={"Accept": "text/csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[0] == "name,age,score,active,tags"
+    exported = response.content
+    
+    # Importing the export into an empty table gives the same rows back
+    response = client.post("/api/v1/tables/", json={"name": "copy", "object_id": object_id, "data": []})
+    assert response.status_code == 200
+    copy_id = response.json()["id"]
+    response = client.post(f"/api/v1/tables/{copy_id}/rows", content=exported, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 2
+    assert client.get(f"/api/v1/tables/{copy_id}/rows").json() == rows
+    
+    # Values that do not fit the schema are rejected by line
+    body = "name,age\nCid,41\nDee,old\nEve,1,extra\n"
+    response = client.post(f"/api/v1/tables/{copy_id}/rows", content=body, headers={"Content-Type": "text/csv"})
+    result = response.json()
+    assert result["accepted"] == 1
+    assert [error["line"] for error in result["errors"]] == [3, 4]
+    assert result["row_count"] == 3
+
+def test_columnar_snapshot_export_and_import(client: TestClient):
+    from app.core.table_formats import COLUMNAR_MEDIA_TYPE, SnapshotReader
+    
+    response = client.post(
+        "/api/v1/objects/",
+        json={"name": "measurements", "attributes": {"name": "string", "value": "integer", "weight": "number", "extra": "any"}},
+    )
+    assert response.status_code == 200
+    object_id = response.json()["id"]
+    
+    rows = [{"name": f"m{i}", "value": i, "weight": i / 2, "extra": {"i": i} if i % 3 else None} for i in range(2500)]
+    rows[5] = {"name": "sparse"}
+    response = client.post("/api/v1/tables/", json={"name": "measurements", "object_id": object_id, "data": rows})
+    assert response.status_code == 200
+    table_id = response.json()["id"]
+    
+    response = client.get(f"/api/v1/tables/{table_id}/rows", headers={"Accept": COLUMNAR_MEDIA_TYPE})
+    assert response.status_code == 200
+    snapshot = response.content
+    reader = SnapshotReader(snapshot)
+    assert reader.row_count == 2500
+    assert len(reader) == 3  # One batch per storage chunk
+    assert [row for batch in reader for row in batch] == rows
+    
+    response = client.post("/api/v1/tables/", json={"name": "copy", "object_id": object_id, "data": []})
+    assert response.status_code == 200
+    copy_id = response.json()["id"]
+    response = client.post(f"/api/v1/tables/{copy_id}/rows", content=snapshot, headers={"Content-Type": COLUMNAR_MEDIA_TYPE})
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 2500
+    assert client.get(f"/api/v1/tables/{copy_id}/rows").json() == rows
+    
+    # A truncated snapshot is rejected
+    response = client.post(f"/api/v1/tables/{copy_id}/rows", content=snapshot[:-20], headers={"Content-Type": COLUMNAR_MEDIA_TYPE})
+    assert response.status_code == 400
+
+def test_corrupt_columnar_snapshot_rejected(client: TestClient):
+    import struct
+    from app.core.table_formats import COLUMNAR_MEDIA_TYPE, MAGIC
+    
+    object_id = client.post("/api/v1/objects/", json={"name": "numbers", "attributes": {"value": "integer"}}).json()["id"]
+    table_id = client.post("/api/v1/tables/", json={"name": "numbers", "object_id": object_id, "data": []}).json()["id"]
+    
+    def batch(meta, buffers=b""):
+        data = json.dumps(meta).encode()
+        header = struct.pack("<4sI", b"BTCH", len(data)) + data
+        return MAGIC + header + b"\0" * (-len(header) % 8) + buffers
+    
+    corrupt = [
+        batch({"rows": 1, "length": 0}),  # No columns
+        batch([1, 2]),  # Meta is not an object
+        # An int64 buffer whose length is not a multiple of 8
+        batch({"rows": 1, "length": 16, "columns": [{"name": "value", "type": "int64", "buffers": [[0, 1], [8, 5]]}]}, b"\1" + b"\0" * 15),
+    ]
+    for body in corrupt:
+        response = client.post(f"/api/v1/tables/{table_id}/rows", content=body, headers={"Content-Type": COLUMNAR_MEDIA_TYPE})
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Invalid columnar snapshot")
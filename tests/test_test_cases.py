@@ -224,3 +224,244 @@ def test_delete_nonexistent_test_case(client: TestClient):
     response = client.delete("/api/v1/test-cases/999")
     assert response.status_code == 404
     assert "Test case not found" in response.json()["detail"]
+
+def test_create_test_cases_batch(client: TestClient):
+    function_response = client.post(
+        "/api/v1/functions/",
+        json={"name": "batch_function", "input_schemas": {}, "output_schemas": {}},
+    )
+    assert function_response.status_code == 200
+    function_id = function_response.json()["id"]
+    
+    response = client.post(
+        "/api/v1/test-cases:batch",
+        json=[
+            {"name": "first", "function_id": function_id},
+            {"name": "missing_function", "function_id": 999},
+        ],
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"][0]["index"] == 1
+    
+    response = client.post(
+        "/api/v1/test-cases:batch",
+        json=[{"name": f"case_{i}", "function_id": function_id} for i in range(3)],
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+def create_doubling_test_case(client: TestClient, expected_values, parameters=None):
+    object_response = client.post(
+        "/api/v1/objects/",
+        json={"name": "number", "attributes": {"value": "integer"}},
+    )
+    object_id = object_response.json()["id"]
+    tables = {}
+    for name, values in [("source", [1, 2, 3]), ("expected", expected_values)]:
+        table_response = client.post(
+            "/api/v1/tables/",
+            json={"name": name, "object_id": object_id, "data": [{"value": v} for v in values]},
+        )
+        assert table_response.status_code == 200
+        tables[name] = table_response.json()["id"]
+    function_response = client.post(
+        "/api/v1/functions/",
+        json={"name": "double", "input_schemas": {"source": object_id}, "output_schemas": {"result": object_id}},
+    )
+    function_id = function_response.json()["id"]
+    test_case_response = client.post(
+        "/api/v1/test-cases/",
+        json={
+            "name": "double_test",
+            "function_id": function_id,
+            "input_tables": {"source": tables["source"]},
+            "expected_output_tables": {"result": tables["expected"]},
+            "parameters": parameters or {},
+        },
+    )
+    assert test_case_response.status_code == 200
+    return function_id, test_case_response.json()["id"]
+
+def test_run_test_case(client: TestClient, run_queue):
+    function_id, test_case_id = create_doubling_test_case(client, [2, 4, 6])
+    
+    # No implementation has been submitted yet
+    response = client.post(f"/api/v1/test-cases/{test_case_id}/run")
+    assert response.status_code == 400
+    
+    submission_response = client.post(
+        "/api/v1/submissions/",
+        json={
+            "name": "double_values",
+            "function_id": function_id,
+            "code": "def run(inputs, parameters):\n    return {'result': [{'value': row['value'] * 2} for row in inputs['source']]}\n",
+        },
+    )
+    assert submission_response.status_code == 200
+    
+    response = client.post(f"/api/v1/test-cases/{test_case_id}/run")
+    assert response.status_code == 200
+    run = client.get(f"/api/v1/runs/{response.json()['run_id']}").json()
+    assert run["status"] == "queued"
+    assert run_queue() == 1
+    run = client.get(f"/api/v1/runs/{response.json()['run_id']}").json()
+    assert run["status"] == "passed"
+    assert run["passed"] is True
+    assert run["wall_time"] is not None
+    assert run["cached"] is False
+    assert (run["input_rows"], run["output_rows"]) == (3, 3)
+    assert run["rows_per_second"] > 0
+    assert run["peak_rss_mb"] > 0
+    assert run["profile"] is None
+    
+    # Re-running unchanged code against unchanged tables is served from the result cache
+    response = client.post(f"/api/v1/test-cases/{test_case_id}/run")
+    assert response.json()["cached"] is True
+    assert response.json()["status"] == "passed"
+    run = client.get(f"/api/v1/runs/{response.json()['run_id']}").json()
+    assert run["cached"] is True
+    assert run["passed"] is True
+    stats = client.get("/api/v1/cache/").json()["results"]
+    assert stats["hits"] == 1
+    assert stats["size"] == 1
+    
+    # Workers cache input tables by version, so appended rows are picked up
+    source_id = client.get(f"/api/v1/test-cases/{test_case_id}").json()["input_tables"]["source"]
+    response = client.post(
+        f"/api/v1/tables/{source_id}/rows",
+        content='{"value": 4}\n',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    response = client.post(f"/api/v1/test-cases/{test_case_id}/run")
+    assert response.json()["cached"] is False
+    run_queue()
+    run = client.get(f"/api/v1/runs/{response.json()['run_id']}").json()
+    assert run["status"] == "failed"
+    assert run["diff"]["result"]["actual_row_count"] == 4
+
+def test_run_test_case_failures(client: TestClient, run_queue):
+    function_id, test_case_id = create_doubling_test_case(client, [2, 4, 7], parameters={"timeout": 1})
+    codes = {
+        "wrong": "def run(inputs, parameters):\n    return {'result': [{'value': row['value'] * 2} for row in inputs['source']]}\n",
+        "raises": "def run(inputs, parameters):\n    raise ValueError('boom')\n",
+        "slow": "def run(inputs, parameters):\n    while True:\n        pass\n",
+    }
+    run_ids = {}
+    for name, code in codes.items():
+        submission_id = client.post(
+            "/api/v1/submissions/", json={"name": name, "function_id": function_id, "code": code}
+        ).json()["id"]
+        response = client.post(f"/api/v1/test-cases/{test_case_id}/run", params={"submission_id": submission_id})
+        assert response.status_code == 200
+        run_ids[name] = response.json()["run_id"]
+    assert run_queue() == 3
+    statuses = {name: client.get(f"/api/v1/runs/{run_id}").json() for name, run_id in run_ids.items()}
+    
+    assert statuses["wrong"]["status"] == "failed"
+    assert statuses["wrong"]["diff"]["result"]["missing"] == 1
+    assert statuses["wrong"]["diff"]["result"]["samples"]["unexpected"] == [{"value": 6}]
+    assert statuses["raises"]["status"] == "error"
+    assert "boom" in statuses["raises"]["error"]
+    assert statuses["slow"]["status"] == "timeout"
+    
+    runs = client.get("/api/v1/runs/", params={"test_case_id": test_case_id}).json()
+    assert len(runs) == 3
+
+def test_changes_revalidate_dependent_test_cases(client: TestClient, run_queue):
+    doubling_code = "def run(inputs, parameters):\n    return {'result': [{'value': row['value'] * 2} for row in inputs['source']]}\n"
+    test_case_ids = []
+    for _ in range(2):
+        function_id, test_case_id = create_doubling_test_case(client, [2, 4, 6])
+        client.post("/api/v1/submissions/", json={"name": "double_values", "function_id": function_id, "code": doubling_code})
+        test_case_ids.append(test_case_id)
+    changed, unchanged = test_case_ids
+    source_id = client.get(f"/api/v1/test-cases/{changed}").json()["input_tables"]["source"]
+    
+    response = client.get("/api/v1/test-cases/affected", params={"table_id": source_id})
+    assert [t["id"] for t in response.json()] == [changed]
+    
+    # Editing a table queues runs only for the test cases reading it
+    response = client.patch(f"/api/v1/tables/{source_id}/rows", params={"start": 0}, json=[{"value": 5}])
+    assert response.status_code == 200
+    queued = client.get("/api/v1/runs/", params={"status": "queued"}).json()
+    assert [run["test_case_id"] for run in queued] == [changed]
+    assert run_queue() == 1
+    runs = client.get("/api/v1/runs/", params={"test_case_id": changed}).json()
+    assert runs[-1]["status"] == "failed"
+    
+    # Changes made while a run is waiting are covered by that run
+    client.patch(f"/api/v1/tables/{source_id}/rows", params={"start": 0}, json=[{"value": 1}])
+    client.patch(f"/api/v1/tables/{source_id}/rows", params={"start": 1}, json=[{"value": 2}])
+    assert run_queue() == 1
+    runs = client.get("/api/v1/runs/", params={"test_case_id": changed}).json()
+    assert runs[-1]["status"] == "passed"
+    
+    # A change that does not affect the outcome re-runs from the result cache
+    function_id = client.get(f"/api/v1/test-cases/{changed}").json()["function_id"]
+    function = client.get(f"/api/v1/functions/{function_id}").json()
+    client.put(f"/api/v1/functions/{function_id}", json={**function, "description": "Doubles values"})
+    assert run_queue() == 1
+    runs = client.get("/api/v1/runs/", params={"test_case_id": changed}).json()
+    assert runs[-1]["status"] == "passed"
+    assert runs[-1]["cached"] is True
+    
+    # Object and function changes reach their test cases through the index too
+    object_id = client.get(f"/api/v1/tables/{source_id}").json()["object_id"]
+    response = client.get("/api/v1/test-cases/affected", params={"object_id": object_id})
+    assert [t["id"] for t in response.json()] == [changed]
+    client.put(f"/api/v1/objects/{object_id}", json={"name": "number", "attributes": {"value": "integer"}})
+    queued = client.get("/api/v1/runs/", params={"status": "queued"}).json()
+    assert [run["test_case_id"] for run in queued] == [changed]
+    assert client.get("/api/v1/runs/", params={"test_case_id": unchanged}).json() == []
+    
+    client.delete(f"/api/v1/test-cases/{changed}")
+    assert client.get("/api/v1/test-cases/affected", params={"table_id": source_id}).json() == []
+
+def test_profile_and_resource_usage(client: TestClient, run_queue):
+    function_id, test_case_id = create_doubling_test_case(client, [2, 4, 6], parameters={"profile": True})
+    submission_id = client.post(
+        "/api/v1/submissions/",
+        json={
+            "name": "double_values",
+            "function_id": function_id,
+            # Sleeps so it outweighs the loading and decoding of its three rows in the profile
+            "code": "import time\n\ndef double(value):\n    time.sleep(0.001)\n    return value * 2\n\ndef run(inputs, parameters):\n    return {'result': [{'value': double(row['value'])} for row in inputs['source']]}\n",
+        },
+    ).json()["id"]
+    run_id = client.post(f"/api/v1/test-cases/{test_case_id}/run").json()["run_id"]
+    run_queue()
+    
+    run = client.get(f"/api/v1/runs/{run_id}").json()
+    assert run["status"] == "passed"
+    profiled = {entry["function"]: entry for entry in run["profile"] if entry["file"] == "<submission>"}
+    assert profiled["double"]["calls"] == 3
+    assert profiled["run"]["cumulative_time"] >= profiled["double"]["cumulative_time"]
+    
+    [usage] = client.get("/api/v1/runs/usage", params={"function_id": function_id}).json()
+    assert usage["submission_id"] == submission_id
+    assert usage["runs"] == 1
+    assert usage["max_peak_rss_mb"] == run["peak_rss_mb"]
+    assert usage["min_rows_per_second"] == run["rows_per_second"]
+
+def test_delete_after_runs(client: TestClient, run_queue):
+    function_id, test_case_id = create_doubling_test_case(client, [2, 4])
+    code = "def run(inputs, parameters):\n    return {'result': [{'value': row['value'] * 2} for row in inputs['source']]}\n"
+    submission_ids = [
+        client.post(
+            "/api/v1/submissions/", json={"name": f"double_{i}", "function_id": function_id, "code": code}
+        ).json()["id"]
+        for i in range(2)
+    ]
+    for submission_id in submission_ids:
+        client.post(f"/api/v1/test-cases/{test_case_id}/run", params={"submission_id": submission_id})
+    run_queue()
+    assert len(client.get("/api/v1/runs/", params={"test_case_id": test_case_id}).json()) == 2
+    
+    # Deleting a submission deletes its runs along with it
+    assert client.delete(f"/api/v1/submissions/{submission_ids[0]}").status_code == 200
+    assert client.get("/api/v1/runs/", params={"submission_id": submission_ids[0]}).json() == []
+    [run] = client.get("/api/v1/runs/", params={"test_case_id": test_case_id}).json()
+    
+    assert client.delete(f"/api/v1/test-cases/{test_case_id}").status_code == 200
+    assert client.get(f"/api/v1/runs/{run['id']}").status_code == 404